@@ -1,3 +1,23 @@
 from django.contrib import admin
+from ecommerce_api.admin import LargeTableAdmin
+from .models import IdempotencyKey, ProductDocument
 
-# Register your models here. 
\ No newline at end of file
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(LargeTableAdmin):
+    list_display = ('key', 'endpoint', 'user', 'status', 'response_status', 'expires_at')
+    list_filter = ('status', 'endpoint')
+    list_select_related = ('user',)
+    search_fields = ('key__exact', 'user__email__exact')
+    raw_id_fields = ('user',)
+    readonly_fields = ('key', 'endpoint', 'user', 'request_hash', 'status', 'response_status',
+                       'response_body', 'created_at', 'expires_at')
+
+
+@admin.register(ProductDocument)
+class ProductDocumentAdmin(LargeTableAdmin):
+    list_display = ('product', 'slug', 'stale', 'built_at')
+    list_filter = ('stale',)
+    search_fields = ('slug__exact',)
+    raw_id_fields = ('product',)
+    readonly_fields = ('product', 'slug', 'body', 'stale', 'built_at')
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'api' 
\ No newline at end of file
+    name = 'api'
+    
+    def ready(self):
+        from ecommerce_api import sharding
+        from products.models import Category, Product, ProductImage, Review, products_changed
+        from . import product_documents, review_cache
+        
+        post_save.connect(review_cache.invalidate_review, sender=Review, dispatch_uid='review-cache-save')
+        post_delete.connect(review_cache.invalidate_review, sender=Review, dispatch_uid='review-cache-delete')
+        post_save.connect(product_documents.product_saved, sender=Product, dispatch_uid='product-document-save')
+        products_changed.connect(product_documents.products_changed, dispatch_uid='product-document-update')
+        post_save.connect(product_documents.category_saved, sender=Category, dispatch_uid='product-document-category')
+        for model in (ProductImage, Review):
+            post_save.connect(
+                product_documents.product_part_changed, sender=model, dispatch_uid=f'product-document-{model.__name__}-save'
+            )
+            post_delete.connect(
+                product_documents.product_part_changed, sender=model, dispatch_uid=f'product-document-{model.__name__}-delete'
+            )
+        post_migrate.connect(sharding.reserve_id_ranges, dispatch_uid='shard-id-ranges')
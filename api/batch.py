@@ -0,0 +1,156 @@
+"""
+Running several API requests in one round trip: POST /api/batch/.
+
+Each sub-request names a method, a path under /api/ and optionally a JSON
+body and extra headers. It is resolved against the URLconf and handed to
+its view directly, skipping the middleware. The caller authenticated once
+for the batch; the sub-requests run as that user without checking the
+token again.
+
+Reads (GET and HEAD) next to each other in the batch run concurrently on
+a shared thread pool of BATCH_MAX_WORKERS threads. Writes run one at a
+time in batch order and wait for the reads before them, so a read listed
+after a write sees its effect. Every sub-request gets its own status and
+body in the response, in the order they were sent; one failing does not
+stop the others.
+"""
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+PATH_PREFIX = '/api/'
+
+# Headers of the batch request that are not passed on to its sub-requests;
+# an Idempotency-Key belongs to the batch, sub-requests send their own
+_REQUEST_ONLY = {
+    'CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_CONTENT_ENCODING', 'HTTP_IDEMPOTENCY_KEY', 'wsgi.input',
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BATCH_MAX_WORKERS', 4), thread_name_prefix='api-batch'
+            )
+        return _executor
+
+
+def run(request, items):
+    """
+    Run the sub-requests `items` for the DRF `request`; returns one result
+    dict per item, in order, with `status`, `headers` and `body`.
+    """
+    results = [None] * len(items)
+    reads = []
+    for index, item in enumerate(items):
+        if item['method'] in READ_METHODS:
+            reads.append(index)
+            continue
+        _run_reads(request, items, reads, results)
+        reads = []
+        results[index] = _result(item, _dispatch(request, item))
+    _run_reads(request, items, reads, results)
+    return results
+
+
+def _run_reads(request, items, indexes, results):
+    if len(indexes) == 1:
+        results[indexes[0]] = _result(items[indexes[0]], _dispatch(request, items[indexes[0]]))
+        return
+    futures = {index: _pool().submit(_threaded_dispatch, request, items[index]) for index in indexes}
+    for index, future in futures.items():
+        results[index] = _result(items[index], future.result())
+
+
+def _threaded_dispatch(request, item):
+    # Pool threads keep their own connections; close them as a request would
+    close_old_connections()
+    try:
+        return _dispatch(request, item)
+    finally:
+        close_old_connections()
+
+
+def _dispatch(request, item):
+    """Run one sub-request; returns the rendered response."""
+    url = urlsplit(item['path'])
+    if not url.path.startswith(PATH_PREFIX) or url.scheme or url.netloc:
+        return _error(400, f"Path must start with {PATH_PREFIX}")
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return _error(404, "Not found")
+    if match.url_name == 'batch':
+        return _error(400, "Batches cannot be nested")
+
+    sub_request = _sub_request(request, item, url)
+    sub_request.resolver_match = match
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        # The views' own errors are already responses; this is a bug in one
+        logger.exception("Batch sub-request %s %s failed", item['method'], item['path'])
+        return _error(500, "Internal server error")
+    return response
+
+
+def _sub_request(request, item, url):
+    """A WSGIRequest for `item`, with the batch's headers and its authenticated user."""
+    body = b'' if item.get('body') is None else json.dumps(item['body']).encode()
+    environ = {key: value for key, value in request.META.items() if key not in _REQUEST_ONLY}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    })
+    for name, value in item.get('headers', {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    sub_request = WSGIRequest(environ)
+    # Read by rest_framework.request.Request in place of authenticating again;
+    # anonymous callers go through the authenticators so they get the same 401s
+    if request.user.is_authenticated:
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def _result(item, response):
+    result = {'status': response.status_code, 'headers': {}, 'body': None}
+    if item.get('id') is not None:
+        result = {'id': item['id'], **result}
+    for name in ('Location', 'Retry-After', 'Idempotent-Replayed'):
+        if response.has_header(name):
+            result['headers'][name] = response[name]
+    content = getattr(response, 'content', b'')
+    if content:
+        try:
+            result['body'] = json.loads(content)
+        except ValueError:
+            result['body'] = content.decode(response.charset or 'utf-8', 'replace')
+    return result
+
+
+def _error(status_code, message):
+    return JsonResponse({'error': message}, status=status_code)
@@ -0,0 +1,181 @@
+"""
+Deleting categories and users without one huge transaction.
+
+A category's products cascade from it, and so do a user's orders,
+payments, reviews, cart and addresses. Django's delete() collects all of
+them in Python and removes them in a single transaction. For a large
+category or a long-time customer that locks hot tables for a long time.
+
+delete_category() and delete_user() instead mark the root as deleted. The
+`live()` querysets the API reads from then hide it at once. They also queue
+a job that removes the descendants bottom-up, one table at a time, in
+batches of DELETION_BATCH_SIZE rows that each commit on their own. The root
+goes last. Rows are deleted through the ORM, so post_delete receivers still
+run. A job that fails is retried and carries on where it stopped. Each
+batch reports the job's progress, which also renews its lock, so a purge
+running longer than JOB_LOCK_TIMEOUT is not handed to a second worker.
+
+A user's carts, orders and addresses are removed from the user's shard
+(see ecommerce_api.sharding). Cart and order lines of a category's
+products are looked for on every shard, by product id.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from ecommerce_api import sharding
+from jobs.models import Job
+from jobs.queue import enqueue
+from orders.models import Order, OrderItem
+from payments.models import Payment, Refund
+from products import facets
+from products.models import Category, Product, ProductImage, RelatedProduct, Review, StockShard
+from promotions.models import Promotion, PromotionPrice
+from users.models import Address
+from . import review_cache
+from .models import IdempotencyKey, ProductDocument
+
+User = get_user_model()
+
+# Rows of `model` matching `lookup`, deleted or, with `set_null`, detached.
+# With `keys`, a `(model, lookup)` pair, `lookup` is matched against the
+# ids of the `keys` rows instead, for rows that cannot be joined to them.
+Step = namedtuple('Step', 'model lookup set_null order_by keys', defaults=(None, ('pk',), None))
+
+# Children before parents; every lookup is matched against the root category's path
+CATEGORY_STEPS = (
+    Step(CartItem, 'product__in', keys=(Product, 'category__path__startswith')),
+    Step(StockShard, 'product__category__path__startswith'),
+    Step(RelatedProduct, 'product__category__path__startswith'),
+    Step(RelatedProduct, 'related__category__path__startswith'),
+    Step(ProductImage, 'product__category__path__startswith'),
+    Step(Review, 'product__category__path__startswith'),
+    Step(PromotionPrice, 'product__category__path__startswith'),
+    Step(PromotionPrice, 'promotion__category__path__startswith'),
+    Step(Promotion, 'product__category__path__startswith'),
+    Step(Promotion, 'category__path__startswith'),
+    Step(OrderItem, 'product__in', set_null='product', keys=(Product, 'category__path__startswith')),
+    Step(Product, 'category__path__startswith'),
+    Step(Category, 'path__startswith', order_by=('-depth', 'pk')),
+)
+
+# Children before parents; every lookup is matched against the user's id
+USER_STEPS = (
+    Step(CartItem, 'cart__user'),
+    Step(Cart, 'user'),
+    Step(Refund, 'order__user'),
+    Step(Refund, 'payment__user'),
+    Step(Payment, 'order__user'),
+    Step(Payment, 'user'),
+    Step(OrderItem, 'order__user'),
+    Step(Order, 'user'),
+    Step(Address, 'user'),
+    Step(Review, 'user'),
+    Step(IdempotencyKey, 'user'),
+    Step(Job, 'user', set_null='user'),
+    Step(User, 'pk'),
+)
+
+
+def delete_category(category, user=None):
+    """Hide `category` and its subtree and queue their removal; returns the Job."""
+    with transaction.atomic():
+        # The products leave the stored catalog-wide facet counts with the category
+        subtree = Product.objects.live().filter(category__path__startswith=category.path)
+        facets.apply_counts(facets.compute_facets(subtree), {})
+        Category.objects.live().filter(path__startswith=category.path).update(deleted_at=timezone.now())
+        # The products are no longer served, from their documents either
+        ProductDocument.objects.filter(product__category__path__startswith=category.path).delete()
+        job = enqueue('api.delete_category', {'category_id': category.pk}, user=user)
+    return job
+
+
+def delete_user(account, user=None):
+    """Deactivate and hide `account` and queue the removal of its data; returns the Job."""
+    now = timezone.now()
+    with sharding.atomic(sharding.shard_for_user(account)):
+        User.objects.filter(pk=account.pk).update(deleted_at=now, is_active=False)
+        # Orders are listed from their shard, where they cannot be joined to the user
+        Order.objects.for_user(account).update(user_deleted_at=now)
+        job = enqueue('api.delete_user', {'user_id': account.pk}, user=user)
+        # Their reviews drop out of the cached review pages
+        for product_id in Review.objects.filter(user=account).values_list('product_id', flat=True):
+            transaction.on_commit(lambda product_id=product_id: review_cache.invalidate(product_id))
+    return job
+
+
+def purge_category(category_id, progress=None):
+    """Remove a category marked by delete_category(), with its subtree and their products."""
+    category = Category.objects.filter(pk=category_id).only('path', 'deleted_at').first()
+    if category is None:
+        return {'status': 'deleted'}
+    if category.deleted_at is None:
+        return {'status': 'not marked for deletion'}
+    return {'status': 'deleted', 'rows': purge(CATEGORY_STEPS, category.path, progress=progress)}
+
+
+def purge_user(user_id, progress=None):
+    """Remove a user marked by delete_user(), with everything they own."""
+    account = User.objects.filter(pk=user_id).only('deleted_at').first()
+    if account is None:
+        return {'status': 'deleted'}
+    if account.deleted_at is None:
+        return {'status': 'not marked for deletion'}
+    rows = purge(USER_STEPS, user_id, progress=progress, shard=sharding.shard_for_user(user_id))
+    return {'status': 'deleted', 'rows': rows}
+
+
+def purge(steps, value, batch_size=None, delay=None, progress=None, shard=None):
+    """
+    Run `steps` against `value` in batches; returns the rows deleted or detached per model.
+
+    Steps of sharded models run on `shard`, or on every shard when it is
+    None. Sleeps `delay` seconds between batches. `progress({'rows': ...,
+    'step': ...})` is called after every batch.
+    """
+    batch_size = batch_size or getattr(settings, 'DELETION_BATCH_SIZE', 500)
+    delay = getattr(settings, 'DELETION_BATCH_DELAY', 0.05) if delay is None else delay
+    rows = {}
+    for step in steps:
+        if step.keys:
+            key_model, key_lookup = step.keys
+            keys = list(key_model._default_manager.filter(**{key_lookup: value}).values_list('pk', flat=True))
+            values = [keys[start:start + batch_size] for start in range(0, len(keys), batch_size)]
+        else:
+            values = [value]
+        if sharding.is_sharded(step.model):
+            aliases = [shard] if shard else sharding.shards()
+        else:
+            aliases = [step.model._default_manager.db]
+        for alias in aliases:
+            for matched in values:
+                _run(step, alias, matched, rows, batch_size, delay, progress)
+    return rows
+
+
+def _run(step, alias, value, rows, batch_size, delay, progress):
+    """Run one step against `value` on database `alias`, adding to `rows`."""
+    manager = step.model._default_manager.db_manager(alias)
+    label = step.model._meta.label
+    due = manager.filter(**{step.lookup: value}).order_by(*step.order_by)
+    while True:
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        batch = manager.filter(pk__in=ids)
+        if step.set_null:
+            rows[label] = rows.get(label, 0) + batch.update(**{step.set_null: None})
+        else:
+            for deleted_label, count in batch.delete()[1].items():
+                rows[deleted_label] = rows.get(deleted_label, 0) + count
+        if progress:
+            progress({'rows': rows, 'step': label})
+        if len(ids) < batch_size:
+            break
+        if delay:
+            time.sleep(delay)
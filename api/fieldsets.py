@@ -0,0 +1,171 @@
+"""
+Sparse fieldsets: `?fields=` and `?expand=` on read requests.
+
+`?fields=id,name,price` trims the representation to the listed fields and
+`?expand=category` replaces a relation id with the nested object, for the
+relations a serializer lists in `Meta.expandable_fields`; listed reverse
+relations such as an order's `payments` are added as nested lists. Views
+using SparseFieldsetViewMixin join or prefetch expanded relations and
+narrow their queryset with only() to the columns the kept fields read, so
+the others are never fetched. Relations of user-owned rows to users and
+products are on another database (see ecommerce_api.sharding) and are
+prefetched instead of joined.
+
+Serializer fields that are not plain model fields declare the columns they
+read in `Meta.field_dependencies`; "category__name" style entries also
+select the related row. Without a declaration for such a field, the
+queryset is left unrestricted.
+"""
+import sys
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+from ecommerce_api.sharding import is_sharded
+
+
+def _param(request, name):
+    value = request.query_params.get(name, '') if request is not None else ''
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def _is_read(request):
+    return request is not None and request.method in permissions.SAFE_METHODS
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin applying `?fields=` and `?expand=` to the top-level serializer."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if not _is_read(request) or not self._is_root():
+            return fields
+        for name in _param(request, 'expand'):
+            serializer_class = self.expandable_serializer(name)
+            if serializer_class is None:
+                continue
+            if name in fields:
+                fields[name] = serializer_class(read_only=True)
+            elif _is_reverse_relation(self.Meta.model, name):
+                fields[name] = serializer_class(many=True, read_only=True)
+        requested = _param(request, 'fields')
+        if requested:
+            fields = type(fields)((name, field) for name, field in fields.items() if name in requested)
+        return fields
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    @classmethod
+    def expandable_serializer(cls, name):
+        """The serializer class `name` expands to, or None if it cannot be expanded."""
+        target = getattr(cls.Meta, 'expandable_fields', {}).get(name)
+        if isinstance(target, str):
+            # Named lazily so serializers can expand to classes defined later in the module
+            target = getattr(sys.modules[cls.__module__], target)
+        return target
+
+
+class SparseFieldsetViewMixin:
+    """View mixin narrowing the queryset to the columns a sparse fieldset reads."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not _is_read(self.request):
+            return queryset
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetMixin):
+            return queryset
+
+        requested = _param(self.request, 'fields')
+        expanded = [
+            name for name in _param(self.request, 'expand')
+            if serializer_class.expandable_serializer(name) is not None
+            and (not requested or name in requested)
+        ]
+        related = [name for name in expanded if _is_forward_relation(queryset.model, name)]
+        joined = [name for name in related if not _crosses_databases(queryset.model, name)]
+        if joined:
+            queryset = queryset.select_related(*joined)
+        prefetched = [
+            name for name in expanded
+            if _is_reverse_relation(queryset.model, name) or name in related and name not in joined
+        ]
+        if prefetched:
+            queryset = queryset.prefetch_related(*prefetched)
+        if requested:
+            columns = sparse_columns(serializer_class, queryset.model, requested)
+            if columns is not None:
+                # Joins of the base queryset may be for columns that are now deferred
+                joins = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+                queryset = queryset.select_related(None)
+                if joins or joined:
+                    queryset = queryset.select_related(*joins, *joined)
+                # Expanded relations are loaded whole
+                for name in joined:
+                    columns.update(f"{name}__{field.name}" for field in _related_fields(queryset.model, name))
+                # Prefetched forward relations need their key column
+                for lookup in queryset._prefetch_related_lookups:
+                    name = getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+                    if _is_forward_relation(queryset.model, name):
+                        columns.add(name)
+                queryset = queryset.only(*columns)
+        return queryset
+
+
+def sparse_columns(serializer_class, model, requested):
+    """
+    Columns of `model` the `requested` serializer fields read.
+
+    Returns None when a field's columns cannot be determined, meaning the
+    queryset must not be narrowed.
+    """
+    fields = serializer_class().fields
+    dependencies = getattr(serializer_class.Meta, 'field_dependencies', {})
+    columns = {model._meta.pk.name}
+    for name in requested:
+        field = fields.get(name)
+        if field is None or field.write_only:
+            continue
+        if name in dependencies:
+            columns.update(dependencies[name])
+            continue
+        source = field.source.split('.')[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.concrete:
+            columns.add(model_field.name)
+        elif not (model_field.one_to_many or model_field.many_to_many or model_field.one_to_one):
+            return None
+        # Reverse relations are read through their own query or prefetch
+    return columns
+
+
+def _is_forward_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.concrete and field.is_relation
+
+
+def _crosses_databases(model, name):
+    return is_sharded(model) and not is_sharded(model._meta.get_field(name).related_model)
+
+
+def _is_reverse_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.one_to_many and not field.concrete
+
+
+def _related_fields(model, name):
+    return model._meta.get_field(name).related_model._meta.concrete_fields
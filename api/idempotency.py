@@ -0,0 +1,186 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+CACHE_PREFIX = 'idempotency'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_key(user_id, endpoint, key):
+    digest = hashlib.sha256(f"{user_id}:{endpoint}:{key}".encode()).hexdigest()
+    return f"{CACHE_PREFIX}:{digest}"
+
+
+def _replay(record):
+    response = Response(record['response_body'], status=record['response_status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _error(message, status_code):
+    return Response({"error": message}, status=status_code)
+
+
+def idempotent(view_method):
+    """
+    Make a view method safe to retry with an `Idempotency-Key` header.
+
+    The first request with a given key runs the view and stores its response;
+    later requests with the same key replay that response without running the
+    view again. A duplicate that arrives while the first one is still running
+    waits up to IDEMPOTENCY_WAIT_TIMEOUT seconds for it to finish, then gets a
+    409. The first request holds the key for IDEMPOTENCY_LOCK_TIMEOUT; if it
+    has not finished by then (e.g. its worker died), the next retry takes the
+    key over and runs the view. Reusing a key with a different body is
+    rejected with a 422. Requests without the header are passed straight
+    through.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return _error(f"{IDEMPOTENCY_HEADER} must be at most 255 characters",
+                          status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user.is_authenticated else None
+        endpoint = f"{request.method} {request.path}"
+        request_hash = _request_hash(request)
+        cache_key = _cache_key(user.pk if user else None, endpoint, key)
+        use_cache = _setting('IDEMPOTENCY_USE_CACHE', True)
+
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                if cached['request_hash'] != request_hash:
+                    return _error(f"{IDEMPOTENCY_HEADER} was already used with a different request",
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY)
+                return _replay(cached)
+
+        ttl = _setting('IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+        record, created = _claim(user, endpoint, key, request_hash, ttl)
+        if not created:
+            if record.request_hash != request_hash:
+                return _error(f"{IDEMPOTENCY_HEADER} was already used with a different request",
+                              status.HTTP_422_UNPROCESSABLE_ENTITY)
+            record = _wait_for_completion(record)
+            if record is None:
+                return _error("A request with this idempotency key is already in progress",
+                              status.HTTP_409_CONFLICT)
+            return _replay(_as_cached(record))
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            _held(record).delete()
+            raise
+
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            # Server errors are not final, let the client retry with the same key
+            _held(record).delete()
+            return response
+
+        record.status = 'completed'
+        record.response_status = response.status_code
+        record.response_body = response.data
+        if not _held(record).update(
+            status='completed', response_status=response.status_code, response_body=response.data
+        ):
+            # A retry took the key over meanwhile; its outcome is the stored one
+            return response
+        if use_cache:
+            cache.set(cache_key, _as_cached(record), ttl.total_seconds())
+        return response
+
+    return wrapper
+
+
+def _claim(user, endpoint, key, request_hash, ttl):
+    """
+    Insert an in-progress record for the key, or return the existing one.
+
+    An in-progress record whose lock has run out is taken over, as if the
+    key were new; the second item of the result tells whether the caller
+    holds the key.
+    """
+    now = timezone.now()
+    locked_until = now + _setting('IDEMPOTENCY_LOCK_TIMEOUT', timedelta(seconds=60))
+    lookup = {'user': user, 'endpoint': endpoint, 'key': key}
+    # Expired keys are free to be reused
+    IdempotencyKey.objects.filter(expires_at__lte=now, **lookup).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                request_hash=request_hash, expires_at=now + ttl, locked_until=locked_until, **lookup
+            )
+        return record, True
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(**lookup)
+    if record.request_hash == request_hash and record.status == 'in_progress':
+        # Only one retry wins the update when several find the lock run out
+        taken = IdempotencyKey.objects.filter(
+            Q(locked_until__lte=now) | Q(locked_until__isnull=True),
+            pk=record.pk, status='in_progress', locked_until=record.locked_until,
+        ).update(locked_until=locked_until)
+        if taken:
+            record.locked_until = locked_until
+            return record, True
+    return record, False
+
+
+def _held(record):
+    """`record` as a queryset, empty once another request has taken the key over."""
+    return IdempotencyKey.objects.filter(pk=record.pk, status='in_progress', locked_until=record.locked_until)
+
+
+def _wait_for_completion(record):
+    """Poll an in-progress record until it completes; None if it never does in time."""
+    deadline = time.monotonic() + _setting('IDEMPOTENCY_WAIT_TIMEOUT', 5)
+    while record.status != 'completed':
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.1)
+        try:
+            record.refresh_from_db()
+        except IdempotencyKey.DoesNotExist:
+            # The first request failed and released the key
+            return None
+    return record
+
+
+def _as_cached(record):
+    return {
+        'request_hash': record.request_hash,
+        'response_status': record.response_status,
+        'response_body': record.response_body,
+    }
+
+
+class IdempotentCreateMixin:
+    """ViewSet mixin that makes `create` honour the `Idempotency-Key` header."""
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+
+from api import throttling
+
+
+class Command(BaseCommand):
+    """
+    Measure the per-request cost of the rate limit check.
+
+    Times allow_request() of the token-bucket throttle against each store,
+    with DRF's cache-backed AnonRateThrottle as a reference, spreading the
+    requests over `--clients` addresses. The rate is set high enough that
+    every request is allowed, which is the path nearly all traffic takes.
+    """
+
+    help = 'Benchmark the per-request overhead of API throttling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--clients', type=int, default=1000, help='Distinct client addresses')
+        parser.add_argument('--redis-url', help='Also benchmark RedisTokenBucketStore against this server')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        requests = []
+        for client in range(options['clients']):
+            address = f"10.{client // 65536}.{client // 256 % 256}.{client % 256}"
+            request = Request(factory.get('/api/products/', REMOTE_ADDR=address))
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        stores = [('local token bucket', throttling.LocalTokenBucketStore())]
+        if options['redis_url']:
+            stores.append(('redis token bucket', throttling.RedisTokenBucketStore(url=options['redis_url'])))
+
+        rates = {'anon': '1000000000/min', 'anon_catalog': '1000000000/min'}
+        with override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': rates}):
+            for label, store in stores:
+                throttle_class = type('BenchmarkThrottle', (throttling.CatalogAnonThrottle,), {'store': store})
+                self._report(label, throttle_class, requests, options['requests'])
+            cache.clear()
+            self._report('drf AnonRateThrottle', AnonRateThrottle, requests, options['requests'])
+
+    def _report(self, label, throttle_class, requests, count):
+        timings = []
+        clients = len(requests)
+        for index in range(count):
+            request = requests[index % clients]
+            started = time.perf_counter()
+            # A new throttle per request, as DRF does
+            throttle_class().allow_request(request, None)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f"{label:>22}: mean {statistics.fmean(timings) * 1e6:.1f}us, "
+            f"p50 {timings[len(timings) // 2] * 1e6:.1f}us, "
+            f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f}us "
+            f"({count} requests, {clients} clients)"
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import product_documents
+
+
+class Command(BaseCommand):
+    """
+    Render the precomputed product documents of the whole catalog.
+
+    Changes re-render the documents they affect in the background; run this
+    to build the documents of an existing catalog and after changing
+    ProductSerializer, so every document takes the new shape.
+    """
+
+    help = 'Rebuild the ProductDocument table from the product catalog, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Products rendered per batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        started = time.perf_counter()
+        built, deleted = product_documents.build_all(
+            batch_size=options['batch_size'],
+            progress=lambda built: self.stdout.write(f"  {built} products rendered"),
+        )
+        self.stdout.write(
+            f"Built {built} product documents and deleted {deleted} in {time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,27 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI schema to OPENAPI_SCHEMA_FILE so it is not introspected per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Defaults to OPENAPI_SCHEMA_FILE')
+        parser.add_argument('--url', default=None, help='Base URL of the API, e.g. https://shop.example.com')
+
+    def handle(self, *args, **options):
+        from drf_yasg.codecs import OpenAPICodecJson
+        from drf_yasg.generators import OpenAPISchemaGenerator
+        from ecommerce_api.schema import api_info
+
+        # Views that filter on request.user cannot build a queryset without a
+        # request; drf_yasg falls back to plain path parameters and logs a traceback
+        logging.getLogger('drf_yasg.inspectors').setLevel(logging.ERROR)
+        generator = OpenAPISchemaGenerator(api_info(), url=options['url'])
+        document = generator.get_schema(request=None, public=True)
+        output = options['output'] or settings.OPENAPI_SCHEMA_FILE
+        with open(output, 'wb') as f:
+            f.write(OpenAPICodecJson(validators=[], pretty=True).encode(document))
+        self.stdout.write(f"Wrote OpenAPI schema to {output}")
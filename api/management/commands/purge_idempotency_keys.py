@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import retention
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = retention.reap(retention.POLICIES['idempotency_keys'], batch_size=options['batch_size'])
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys")
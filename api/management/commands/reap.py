@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import retention
+
+
+class Command(BaseCommand):
+    """
+    Clear stale carts, cart items, expired idempotency keys and abandoned
+    pending payments, see api.retention.
+
+    Batches are small and short-lived with a pause between them, so the
+    command can run next to live traffic and be stopped at any point. With
+    `--every` it keeps running and starts a new pass every N seconds.
+    """
+
+    help = 'Delete stale carts and expired records, and fail abandoned pending payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', action='append', choices=list(retention.POLICIES),
+            help='Run only this policy; may be given more than once',
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.REAP_BATCH_SIZE)
+        parser.add_argument(
+            '--delay', type=float, default=settings.REAP_BATCH_DELAY, help='Seconds to sleep between batches'
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Stop each policy after this many rows')
+        parser.add_argument('--every', type=float, default=None, help='Repeat every this many seconds')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that are due')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        policies = [retention.POLICIES[name] for name in options['only'] or retention.POLICIES]
+        while True:
+            started = time.monotonic()
+            for policy in policies:
+                self._run(policy, options)
+            if options['every'] is None:
+                break
+            time.sleep(max(options['every'] - (time.monotonic() - started), 0))
+
+    def _run(self, policy, options):
+        now = timezone.now()
+        if options['dry_run']:
+            self.stdout.write(f"{policy.name}: {policy.count(now)} rows due")
+            return
+
+        started = time.perf_counter()
+
+        def progress(total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {policy.name}: {total} rows ({total / elapsed:.0f} rows/s)")
+
+        total = retention.reap(
+            policy,
+            batch_size=options['batch_size'],
+            delay=options['delay'],
+            limit=options['limit'],
+            progress=progress if options['verbosity'] > 1 else None,
+            now=now,
+        )
+        elapsed = time.perf_counter() - started
+        remaining = policy.count(timezone.now())
+        self.stdout.write(
+            f"{policy.name}: cleared {total} rows in {elapsed:.1f}s "
+            f"({total / elapsed if elapsed else 0:.0f} rows/s), {remaining} remaining"
+        )
@@ -0,0 +1,110 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Run in a fresh interpreter so nothing is already imported
+PROBE = """
+import json, os, time
+started = time.perf_counter()
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+django.setup()
+ready = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+handler = time.perf_counter()
+print(json.dumps({{
+    'setup': ready - started,
+    'urlconf': urls - ready,
+    'middleware': handler - urls,
+    'total': handler - started,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    """
+    Measure how long a cold worker takes to become ready.
+
+    Each run starts a new interpreter with `-X importtime`, times
+    `django.setup()` (app registry ready), loading the URLconf and building
+    the WSGI handler, and reports the slowest imports.
+    """
+
+    help = 'Report cold-start import and app-ready times'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to take the median of')
+        parser.add_argument('--top', type=int, default=20, help='Number of slowest modules to list')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        runs = [self._probe() for _ in range(options['runs'])]
+        phases = {
+            phase: statistics.median(run['phases'][phase] for run in runs)
+            for phase in ('setup', 'urlconf', 'middleware', 'total')
+        }
+        modules = self._median_imports([run['imports'] for run in runs])
+        slowest = sorted(modules.items(), key=lambda item: item[1]['self'], reverse=True)[:options['top']]
+        packages = {}
+        for name, timing in modules.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + timing['self']
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'phases': phases,
+                'modules': dict(slowest),
+                'packages': dict(heaviest),
+            }, indent=2))
+            return
+
+        self.stdout.write(f"Median of {len(runs)} cold starts:")
+        for phase, seconds in phases.items():
+            self.stdout.write(f"  {phase:<12} {seconds * 1000:8.1f} ms")
+        self.stdout.write("\nImport time by top-level package (self time):")
+        for package, micros in heaviest:
+            self.stdout.write(f"  {micros / 1000:8.1f} ms  {package}")
+        self.stdout.write("\nSlowest modules (self / cumulative):")
+        for name, timing in slowest:
+            self.stdout.write(f"  {timing['self'] / 1000:8.1f} / {timing['cumulative'] / 1000:8.1f} ms  {name}")
+
+    def _probe(self):
+        script = PROBE.format(settings_module=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        )
+        return {
+            'phases': json.loads(result.stdout.strip().splitlines()[-1]),
+            'imports': self._parse_importtime(result.stderr),
+        }
+
+    def _parse_importtime(self, output):
+        """Parse `-X importtime` lines into {module: {'self': us, 'cumulative': us}}."""
+        imports = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            imports[name.strip()] = {'self': int(self_us), 'cumulative': int(cumulative_us)}
+        return imports
+
+    def _median_imports(self, runs):
+        names = set().union(*runs)
+        return {
+            name: {
+                key: statistics.median(run.get(name, {}).get(key, 0) for run in runs)
+                for key in ('self', 'cumulative')
+            }
+            for name in names
+        }
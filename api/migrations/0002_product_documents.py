@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_category_deleted_at'),
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='products.product')),
+                ('slug', models.SlugField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('stale', models.BooleanField(default=False)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stale'], name='product_document_stale_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,56 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here. 
\ No newline at end of file
+from products.models import Product
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an `Idempotency-Key` header."""
+    
+    STATUS_CHOICES = (
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # Until when the request that claimed an in-progress key holds it
+    locked_until = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('user', 'endpoint', 'key')
+    
+    def __str__(self):
+        return f"{self.endpoint} [{self.key}] - {self.status}"
+
+
+class ProductDocument(models.Model):
+    """
+    A product's detail response, rendered ahead of time (see api.product_documents).
+    
+    `body` is the JSON the product endpoints send as is; it is empty until the
+    first build. `stale` is set when a row it was rendered from changes and
+    cleared when a rebuild picks the document up.
+    """
+    
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='document')
+    slug = models.SlugField(max_length=255, db_index=True)
+    body = models.TextField(blank=True)
+    stale = models.BooleanField(default=False)
+    built_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['stale'], name='product_document_stale_idx')]
+    
+    def __str__(self):
+        return f"{self.slug}{' (stale)' if self.stale else ''}"
@@ -0,0 +1,186 @@
+"""
+Precomputed product documents: the product endpoints' JSON, rendered ahead of time.
+
+`GET /api/products/<slug>/` sends the product's stored ProductDocument
+body as it is, without joining the category, images and reviews or
+running ProductSerializer. The product list still filters, sorts and
+paginates on the products table, reading ids only, and then fetches the
+page's documents by id. Requests with `?fields=` or `?expand=`, and
+renderers other than JSON, are served by the serializer as before.
+
+Whenever a row a document is rendered from changes (the product, its
+category, images or reviews, or its prices through promotions) the
+receivers below mark the document stale and queue the
+`api.build_product_documents` job, which re-renders stale documents in
+batches of PRODUCT_DOCUMENT_BATCH_SIZE. The previous body is served until
+then. Products without a built document fall back to the serializer.
+`manage.py build_product_documents` renders the whole catalog.
+
+Documents are rendered outside of a request; image URLs never depend on
+one (see api.serializers.media_url), so stored documents and responses
+rendered on the fly carry the same URLs.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from jobs.queue import enqueue
+from products.models import Product, Review
+from .models import ProductDocument
+
+CONTENT_TYPE = 'application/json'
+
+
+def _batch_size():
+    return getattr(settings, 'PRODUCT_DOCUMENT_BATCH_SIZE', 500)
+
+
+def _queue_build():
+    transaction.on_commit(lambda: enqueue('api.build_product_documents'))
+
+
+def invalidate(products):
+    """Mark the documents of the product queryset `products` stale and queue their rebuild."""
+    # Only documents that were fresh queue a job; stale ones already have one coming
+    if ProductDocument.objects.filter(product__in=products.values('pk'), stale=False).update(stale=True):
+        _queue_build()
+
+
+def render(products, context=None):
+    """`{product_id: body}` of `products` as ProductSerializer renders them."""
+    from .serializers import ProductSerializer
+
+    renderer = JSONRenderer()
+    return {
+        data['id']: renderer.render(data).decode()
+        for data in ProductSerializer(products, many=True, context=context or {}).data
+    }
+
+
+def build(product_ids):
+    """Render and store the documents of `product_ids`; returns how many were written."""
+    products = list(
+        Product.objects.live().with_shard_stock().filter(pk__in=product_ids)
+        .select_related('category')
+        .prefetch_related('images', Prefetch('reviews', queryset=Review.objects.only('product_id', 'rating')))
+    )
+    rendered = render(products)
+    now = timezone.now()
+    documents = [
+        ProductDocument(product_id=product.pk, slug=product.slug, body=rendered[product.pk], built_at=now)
+        for product in products
+    ]
+    with transaction.atomic():
+        ProductDocument.objects.bulk_create(
+            documents, update_conflicts=True, unique_fields=['product'], update_fields=['slug', 'body', 'built_at']
+        )
+        # Products that left the live catalog are no longer served from documents
+        ProductDocument.objects.filter(pk__in=product_ids).exclude(
+            pk__in=[document.product_id for document in documents]
+        ).delete()
+    return len(documents)
+
+
+def _rebuild(product_ids):
+    # Cleared before rendering, so a change made meanwhile marks the document stale again
+    ProductDocument.objects.filter(pk__in=product_ids).update(stale=False)
+    try:
+        return build(product_ids)
+    except Exception:
+        ProductDocument.objects.filter(pk__in=product_ids).update(stale=True)
+        raise
+
+
+def build_stale(batch_size=None, progress=None):
+    """
+    Re-render every stale document, a batch at a time; returns how many were written.
+
+    `progress(built)` is called after every batch.
+    """
+    batch_size = batch_size or _batch_size()
+    built = 0
+    while True:
+        ids = list(ProductDocument.objects.filter(stale=True).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return built
+        built += _rebuild(ids)
+        if progress:
+            progress(built)
+
+
+def build_all(batch_size=None, progress=None):
+    """
+    Render the documents of the whole live catalog, streaming through it by id.
+
+    Documents of products outside the live catalog are deleted. Returns
+    `(built, deleted)`; `progress(built)` is called after every batch.
+    """
+    batch_size = batch_size or _batch_size()
+    built, last_id = 0, 0
+    while True:
+        ids = list(
+            Product.objects.live().filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        built += _rebuild(ids)
+        last_id = ids[-1]
+        if progress:
+            progress(built)
+    deleted, _ = ProductDocument.objects.exclude(product__in=Product.objects.live().values('pk')).delete()
+    return built, deleted
+
+
+def lookup(slug):
+    """The stored body of the product `slug`, or None when it has not been built."""
+    return ProductDocument.objects.filter(slug=slug).exclude(body='').values_list('body', flat=True).first()
+
+
+def bodies(product_ids):
+    """`{product_id: body}` of the built documents among `product_ids`."""
+    return dict(ProductDocument.objects.filter(pk__in=product_ids).exclude(body='').values_list('pk', 'body'))
+
+
+def response(body):
+    return HttpResponse(body, content_type=CONTENT_TYPE)
+
+
+def page_response(envelope, bodies):
+    """A paginated list response of `envelope` (count, next, previous) around the `bodies` of the page."""
+    head = JSONRenderer().render(envelope)[:-1]
+    return HttpResponse(
+        head + b',"results":[' + ','.join(bodies).encode() + b']}', content_type=CONTENT_TYPE
+    )
+
+
+# Signal receivers, connected in ApiConfig.ready
+
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    """post_save for Product: new products get a document, changed ones a rebuild."""
+    if raw:
+        return
+    if created:
+        ProductDocument.objects.create(product=instance, slug=instance.slug, stale=True)
+        _queue_build()
+    else:
+        invalidate(Product.objects.filter(pk=instance.pk))
+
+
+def products_changed(sender, queryset, **kwargs):
+    """products_changed: set-based updates and stock changes."""
+    invalidate(queryset)
+
+
+def category_saved(sender, instance, raw=False, **kwargs):
+    """post_save for Category: the documents carry the category name."""
+    if not raw:
+        invalidate(Product.objects.filter(category=instance))
+
+
+def product_part_changed(sender, instance, raw=False, **kwargs):
+    """post_save/post_delete for ProductImage and Review."""
+    if not raw:
+        invalidate(Product.objects.filter(pk=instance.product_id))
@@ -0,0 +1,183 @@
+"""
+Clearing out rows that are no longer needed.
+
+Each RetentionPolicy names the rows of one model that are due, by an
+indexed timestamp, and how to clear them:
+
+- idempotency_keys: Idempotency-Key records past `expires_at`.
+- cart_items: cart items not touched for CART_ITEM_RETENTION.
+- carts: carts left without items for EMPTY_CART_RETENTION. Carts are
+  created again on the next add, see CartViewSet.
+- pending_payments: payments still pending after PENDING_PAYMENT_TIMEOUT
+  are marked failed rather than deleted, and so are their orders if they
+  are still pending, with an outbox event each. Payments whose capture
+  job is queued or running are left to the job.
+
+reap() works through a policy's rows in batches read in index order, one
+database after the other: carts and payments are spread over the user
+shards (see ecommerce_api.sharding). Each batch starts after the last row
+of the previous one, so rows a policy keeps are not read again. Every
+batch runs in its own short transaction and rechecks that its rows are
+still due, so rows touched meanwhile are kept. Guest carts live in the cache and expire there on
+their own.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from ecommerce_api import sharding
+from events.outbox import record_many
+from jobs.models import Job
+from orders.models import Order
+from payments.models import Payment
+from .models import IdempotencyKey
+
+
+class RetentionPolicy:
+    """Rows of one model that are due for clearing."""
+
+    name = None
+    model = None
+    # Indexed column the due rows are read in order of
+    order_by = None
+
+    def due(self, now):
+        raise NotImplementedError
+
+    def databases(self):
+        """Aliases the model's rows are on."""
+        return sharding.shards() if sharding.is_sharded(self.model) else [self.model.objects.db]
+
+    def count(self, now):
+        return sum(self.due(now).using(alias).count() for alias in self.databases())
+
+    def clear(self, ids, now, using):
+        """Clear the rows in `ids` on `using` that are still due; returns how many were cleared."""
+        with transaction.atomic(using=using):
+            queryset = self.due(now).using(using).filter(pk__in=ids)
+            # A plain DELETE; none of these models have delete signals or children
+            return queryset._raw_delete(using)
+
+
+class IdempotencyKeyPolicy(RetentionPolicy):
+    name = 'idempotency_keys'
+    model = IdempotencyKey
+    order_by = 'expires_at'
+
+    def due(self, now):
+        return IdempotencyKey.objects.filter(expires_at__lte=now)
+
+
+class CartItemPolicy(RetentionPolicy):
+    name = 'cart_items'
+    model = CartItem
+    order_by = 'updated_at'
+
+    def due(self, now):
+        cutoff = now - getattr(settings, 'CART_ITEM_RETENTION', timedelta(days=60))
+        return CartItem.objects.filter(updated_at__lt=cutoff)
+
+
+class EmptyCartPolicy(RetentionPolicy):
+    name = 'carts'
+    model = Cart
+    order_by = 'updated_at'
+
+    def due(self, now):
+        cutoff = now - getattr(settings, 'EMPTY_CART_RETENTION', timedelta(days=7))
+        return Cart.objects.filter(updated_at__lt=cutoff).exclude(
+            Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+        )
+
+
+class PendingPaymentPolicy(RetentionPolicy):
+    name = 'pending_payments'
+    model = Payment
+    order_by = 'updated_at'
+
+    def due(self, now):
+        cutoff = now - getattr(settings, 'PENDING_PAYMENT_TIMEOUT', timedelta(days=1))
+        return Payment.objects.filter(status='pending', updated_at__lt=cutoff)
+
+    def _capturing(self, ids):
+        """Those of `ids` with a capture job still to run, which may yet charge them."""
+        # Jobs are on the default database, so they are looked up for one batch at a time
+        return set(
+            Job.objects.filter(name='payments.capture', status__in=('queued', 'running'), payload__payment_id__in=ids)
+            .values_list('payload__payment_id', flat=True)
+        )
+
+    def clear(self, ids, now, using):
+        ids = set(ids) - self._capturing(list(ids))
+        with sharding.atomic(using):
+            payments = list(self.due(now).using(using).select_for_update().filter(pk__in=ids).order_by())
+            Payment.objects.using(using).filter(pk__in=[payment.pk for payment in payments]).update(
+                status='failed', updated_at=now
+            )
+            for payment in payments:
+                payment.status = 'failed'
+                payment.updated_at = now
+            # An order another payment has settled keeps its status
+            orders = list(
+                Order.objects.using(using).select_for_update()
+                .filter(pk__in={payment.order_id for payment in payments}, payment_status='pending')
+                .order_by()
+            )
+            Order.objects.using(using).filter(pk__in=[order.pk for order in orders]).update(
+                payment_status='failed', updated_at=now
+            )
+            for order in orders:
+                order.payment_status = 'failed'
+                order.updated_at = now
+            record_many(
+                [
+                    (Payment.outbox_aggregate, payment.outbox_aggregate_id(), 'payment.updated',
+                     payment.outbox_payload())
+                    for payment in payments
+                ]
+                + [('order', order.pk, 'order.updated', order.outbox_payload()) for order in orders]
+            )
+        return len(payments)
+
+
+# In the order they run: items go before the carts they would leave empty
+POLICIES = {
+    policy.name: policy
+    for policy in (IdempotencyKeyPolicy(), CartItemPolicy(), EmptyCartPolicy(), PendingPaymentPolicy())
+}
+
+
+def reap(policy, batch_size=1000, delay=0.0, limit=None, progress=None, now=None):
+    """
+    Clear `policy`'s due rows in batches of `batch_size`; returns the number cleared.
+
+    Rows are due as of `now`, fixed for the whole run, so the work is
+    bounded. Sleeps `delay` seconds between batches to leave the database
+    to other traffic. `progress(cleared_so_far)` is called after every batch.
+    """
+    now = now or timezone.now()
+    total = 0
+    for alias in policy.databases():
+        due = policy.due(now).using(alias).order_by(policy.order_by, 'pk')
+        batch = due
+        while limit is None or total < limit:
+            size = batch_size if limit is None else min(batch_size, limit - total)
+            rows = list(batch.values_list(policy.order_by, 'pk')[:size])
+            if not rows:
+                break
+            ids = [pk for _, pk in rows]
+            total += policy.clear(ids, now, using=alias)
+            last, last_pk = rows[-1]
+            batch = due.filter(Q(**{f'{policy.order_by}__gt': last}) | Q(**{policy.order_by: last, 'pk__gt': last_pk}))
+            if progress:
+                progress(total)
+            if len(rows) < size:
+                break
+            if delay:
+                time.sleep(delay)
+    return total
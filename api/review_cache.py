@@ -0,0 +1,44 @@
+"""
+Cached first page of a product's reviews.
+
+Most clients only ever read `/api/products/<id>/reviews/` without
+parameters, so that response is cached per product for
+REVIEW_PAGE_CACHE_TIMEOUT seconds. Writing or deleting a review of the
+product moves it to a new cache version. A page still being built from
+the old data can only be stored under the old version, which nothing
+reads any more.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_PREFIX = 'reviews'
+
+
+def _version_key(product_id):
+    return f"{CACHE_PREFIX}:version:{product_id}"
+
+
+def lookup(product_id):
+    """`(key, data)` of the product's cached first page; data is None on a miss."""
+    version = cache.get(_version_key(product_id), 0)
+    key = f"{CACHE_PREFIX}:first-page:{product_id}:{version}"
+    return key, cache.get(key)
+
+
+def store(key, data):
+    """Cache a first page under the `key` lookup() returned before it was built."""
+    cache.set(key, data, getattr(settings, 'REVIEW_PAGE_CACHE_TIMEOUT', 300))
+
+
+def invalidate(product_id):
+    cache.set(_version_key(product_id), time.time_ns(), None)
+
+
+def invalidate_review(sender, instance, **kwargs):
+    """post_save/post_delete receiver for Review."""
+    product_id = instance.product_id
+    # After the commit, so a reader cannot cache the page again from the old rows
+    transaction.on_commit(lambda: invalidate(product_id))
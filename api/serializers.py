@@ -1,16 +1,23 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.db import models
 from django.contrib.auth import get_user_model
-from django.db import transaction
-from products.models import Category, Product, ProductImage, Review
+from django.core.files.storage import default_storage
+from products.models import Category, Product, ProductImage, RelatedProduct, Review
+from products.images import srcset
 from users.models import Address
 from cart.models import Cart, CartItem
 from orders.models import Order, OrderItem
 from payments.models import Payment, Refund
+from jobs.models import Job
+from events.models import OutboxEvent
+from ecommerce_api import sharding
+from .fieldsets import SparseFieldsetMixin
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the User model."""
     
     password = serializers.CharField(write_only=True, required=False)
@@ -30,9 +37,8 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"email": "Email is required when creating a user"})
         if not validated_data.get('password'):
             raise serializers.ValidationError({"password": "Password is required when creating a user"})
-        user = User.objects.create_user(**validated_data)
-        Cart.objects.create(user=user)  # Create cart for new user
-        return user
+        # The cart is created when the first item is added
+        return User.objects.create_user(**validated_data)
     def update(self, instance, validated_data):
         # Handle password update separately if provided
         password = validated_data.pop('password', None)
@@ -47,7 +53,7 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Address model."""
     
     class Meta:
@@ -61,34 +67,114 @@ class AddressSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+def media_url(url):
+    """
+    `url` of a stored file as the API gives it: under API_MEDIA_BASE_URL when set.
+    
+    The request is not used, so precomputed product documents and responses
+    rendered per request carry the same URLs.
+    """
+    base = getattr(settings, 'API_MEDIA_BASE_URL', '')
+    if base and url.startswith('/'):
+        return base.rstrip('/') + url
+    return url
+
+
+class MediaImageField(serializers.ImageField):
+    """ImageField whose URL comes from `media_url` rather than the request."""
+    
+    def to_representation(self, value):
+        if not value:
+            return None
+        return media_url(value.url)
+
+
+class ImageVariantsMixin:
+    """Builds the URLs of an object's image and its stored variants with `media_url`."""
+    
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: MediaImageField,
+    }
+    
+    def _variant_url(self, name):
+        return media_url(default_storage.url(name))
+    
+    def _variants(self, variants):
+        return {
+            variant: {
+                key: value if key in ('width', 'height') else self._variant_url(value)
+                for key, value in entry.items()
+            }
+            for variant, entry in (variants or {}).get('variants', {}).items()
+        }
+    
+    def _srcset(self, variants):
+        return srcset(variants, build_url=self._variant_url)
+
+
+class CategorySerializer(SparseFieldsetMixin, ImageVariantsMixin, serializers.ModelSerializer):
     """Serializer for the Category model."""
     
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = Category
-        fields = ('id', 'name', 'slug', 'description', 'image')
+        fields = ('id', 'name', 'slug', 'parent', 'depth', 'description', 'image',
+                  'image_variants', 'image_srcset')
+        read_only_fields = ('depth',)
+        expandable_fields = {'parent': 'CategorySerializer'}
+        field_dependencies = {
+            'image_variants': ('image_variants',),
+            'image_srcset': ('image_variants',),
+        }
+    
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None and self.instance.is_ancestor_of(parent):
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its descendants")
+        return parent
+    
+    def get_image_variants(self, obj):
+        return self._variants(obj.image_variants)
+    
+    def get_image_srcset(self, obj):
+        return self._srcset(obj.image_variants)
 
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(SparseFieldsetMixin, ImageVariantsMixin, serializers.ModelSerializer):
     """Serializer for the ProductImage model."""
     
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'is_primary')
+        fields = ('id', 'image', 'is_primary', 'variants', 'srcset')
+    
+    def get_variants(self, obj):
+        return self._variants(obj.variants)
+    
+    def get_srcset(self, obj):
+        return self._srcset(obj.variants)
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Review model."""
     
     user_email = serializers.SerializerMethodField()
     user_name = serializers.SerializerMethodField()
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), required=False)
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.live(), required=False)
     
     class Meta:
         model = Review
         fields = ('id', 'product', 'user', 'rating', 'comment', 'created_at', 'user_email', 'user_name')
         read_only_fields = ('user',)
         extra_kwargs = {'product': {'required': False}}
+        field_dependencies = {
+            'user_email': ('user__email',),
+            'user_name': ('user__first_name', 'user__last_name'),
+        }
     
     def get_user_email(self, obj):
         return obj.user.email
@@ -102,7 +188,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Product model."""
     
     category_name = serializers.SerializerMethodField()
@@ -112,12 +198,34 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ('id', 'name', 'slug', 'category', 'category_name', 'description', 
-                  'price', 'discount_price', 'stock', 'is_available', 'is_featured', 
-                  'created_at', 'images', 'average_rating', 'get_discount_percent')
+                  'price', 'discount_price', 'effective_price', 'discount_percent', 'stock',
+                  'is_available', 'is_featured', 'created_at', 'images', 'average_rating',
+                  'get_discount_percent')
+        read_only_fields = ('effective_price', 'discount_percent')
+        expandable_fields = {'category': 'CategorySerializer'}
+        field_dependencies = {
+            'category_name': ('category__name',),
+            'stock': ('stock', 'stock_sharded'),
+            'average_rating': (),
+            'get_discount_percent': ('discount_percent',),
+        }
     
     def get_category_name(self, obj):
         return obj.category.name
     
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'stock' in data and instance.stock_sharded:
+            data['stock'] = instance.available_stock
+        return data
+    
+    def update(self, instance, validated_data):
+        stock = validated_data.pop('stock', None) if instance.stock_sharded else None
+        instance = super().update(instance, validated_data)
+        if stock is not None:
+            instance.set_stock(stock)
+        return instance
+    
     def get_average_rating(self, obj):
         reviews = obj.reviews.all()
         if reviews:
@@ -125,7 +233,24 @@ class ProductSerializer(serializers.ModelSerializer):
         return 0
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class RelatedProductSerializer(serializers.ModelSerializer):
+    """Compact product entry of a "frequently bought together" list."""
+    
+    id = serializers.IntegerField(source='related.id', read_only=True)
+    name = serializers.CharField(source='related.name', read_only=True)
+    slug = serializers.SlugField(source='related.slug', read_only=True)
+    price = serializers.DecimalField(source='related.price', max_digits=10, decimal_places=2, read_only=True)
+    effective_price = serializers.DecimalField(
+        source='related.effective_price', max_digits=10, decimal_places=2, read_only=True
+    )
+    discount_percent = serializers.IntegerField(source='related.discount_percent', read_only=True)
+    
+    class Meta:
+        model = RelatedProduct
+        fields = ('id', 'name', 'slug', 'price', 'effective_price', 'discount_percent', 'score')
+
+
+class CartItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the CartItem model."""
     
     product = ProductSerializer(read_only=True)
@@ -138,14 +263,13 @@ class CartItemSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         user = self.context['request'].user
-        cart, created = Cart.objects.get_or_create(user=user)
+        cart, created = Cart.objects.on_shard_of(user).get_or_create(user=user)
         
         product_id = validated_data.pop('product_id')
         product = Product.objects.get(id=product_id)
         
         # Check if item already exists in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
+        cart_item, created = cart.items.get_or_create(
             product=product,
             defaults={'quantity': validated_data.get('quantity', 1)}
         )
@@ -157,7 +281,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         return cart_item
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Cart model."""
     
     items = CartItemSerializer(many=True, read_only=True)
@@ -169,7 +293,7 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ('id', 'items', 'total_price', 'total_items', 'updated_at')
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the OrderItem model."""
     
     class Meta:
@@ -178,10 +302,12 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('product_name', 'product_price', 'total_price')
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Order model."""
     
     items = OrderItemSerializer(many=True, read_only=True)
+    items_count = serializers.IntegerField(read_only=True)
+    items_subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     shipping_address_id = serializers.IntegerField(write_only=True)
     billing_address_id = serializers.IntegerField(write_only=True)
     
@@ -190,26 +316,41 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ('id', 'order_number', 'user', 'shipping_address', 'billing_address',
                   'shipping_address_id', 'billing_address_id', 'order_status', 
                   'payment_status', 'shipping_cost', 'total_price', 'items',
+                  'items_count', 'items_subtotal',
                   'payment_method', 'payment_id', 'notes', 'tracking_number',
                   'created_at', 'updated_at')
         read_only_fields = ('order_number', 'user', 'shipping_address', 'billing_address',
                            'order_status', 'payment_status', 'total_price')
+        expandable_fields = {
+            'user': 'UserSerializer',
+            'shipping_address': 'AddressSerializer',
+            'billing_address': 'AddressSerializer',
+            'payments': 'PaymentSerializer',
+            'refunds': 'RefundSerializer',
+        }
+        # Annotated by OrderQuerySet.with_items()
+        field_dependencies = {
+            'items_count': (),
+            'items_subtotal': (),
+        }
     
-    @transaction.atomic
     def create(self, validated_data):
         user = self.context['request'].user
-        
+        with sharding.atomic(sharding.shard_for_user(user)):
+            return self._create(user, validated_data)
+    
+    def _create(self, user, validated_data):
         # Get addresses with proper error handling
         try:
             shipping_address_id = validated_data.pop('shipping_address_id')
             billing_address_id = validated_data.pop('billing_address_id')
             
             # Verify addresses exist and belong to the user
-            shipping_address = Address.objects.filter(id=shipping_address_id, user=user).first()
+            shipping_address = Address.objects.for_user(user).filter(id=shipping_address_id).first()
             if not shipping_address:
                 raise serializers.ValidationError({"shipping_address_id": "Invalid shipping address ID"})
                 
-            billing_address = Address.objects.filter(id=billing_address_id, user=user).first()
+            billing_address = Address.objects.for_user(user).filter(id=billing_address_id).first()
             if not billing_address:
                 raise serializers.ValidationError({"billing_address_id": "Invalid billing address ID"})
         except Exception as e:
@@ -217,22 +358,22 @@ class OrderSerializer(serializers.ModelSerializer):
         
         # Get user's cart with error handling
         try:
-            cart = Cart.objects.get(user=user)
+            cart = Cart.objects.for_user(user).get()
             if not cart.items.exists():
                 raise serializers.ValidationError({"cart": "Your cart is empty"})
         except Cart.DoesNotExist:
-            # Create a cart if it doesn't exist
-            cart = Cart.objects.create(user=user)
             raise serializers.ValidationError({"cart": "Your cart is empty"})
         except Exception as e:
             raise serializers.ValidationError({"cart": str(e)})
         
+        cart_items = list(cart.items.prefetch_related('product'))
+        
         # Calculate total price with error handling
         try:
-            # Manually calculate total price to avoid dependency on Cart.total_price property
+            # Use the stored effective price so totals match what the catalog showed
             total_price = sum(
-                (item.product.current_price or item.product.price) * item.quantity 
-                for item in cart.items.all()
+                item.product.effective_price * item.quantity 
+                for item in cart_items
             )
             shipping_cost = validated_data.get('shipping_cost', 0)
             if shipping_cost is None:
@@ -267,10 +408,10 @@ class OrderSerializer(serializers.ModelSerializer):
         
         # Create order items from cart items with error handling
         try:
-            for cart_item in cart.items.all():
+            for cart_item in cart_items:
                 try:
-                    # Make sure product has a valid current_price
-                    product_price = cart_item.product.current_price
+                    # Make sure product has a valid effective price
+                    product_price = cart_item.product.effective_price
                     if product_price is None or product_price <= 0:
                         product_price = cart_item.product.price
                     
@@ -297,7 +438,49 @@ class OrderSerializer(serializers.ModelSerializer):
         return order
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class OrderTransitionSerializer(serializers.Serializer):
+    """One entry of a bulk status transition, identified by id or order number."""
+    
+    id = serializers.IntegerField(required=False)
+    order_number = serializers.CharField(max_length=20, required=False)
+    status = serializers.ChoiceField(choices=[choice for choice, _ in Order.ORDER_STATUS_CHOICES])
+    tracking_number = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    
+    def validate(self, data):
+        if data.get('id') is None and not data.get('order_number'):
+            raise serializers.ValidationError("Either id or order_number is required")
+        return data
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    """Request body of POST /api/orders/bulk-transition/."""
+    
+    updates = OrderTransitionSerializer(many=True, allow_empty=False, max_length=5000)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """One sub-request of a batch."""
+    
+    id = serializers.CharField(max_length=100, required=False)
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False)
+    headers = serializers.DictField(child=serializers.CharField(max_length=1000), required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Request body of POST /api/batch/."""
+    
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+    
+    def validate_requests(self, value):
+        limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"A batch may hold at most {limit} requests")
+        return value
+
+
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Payment model."""
     
     class Meta:
@@ -307,7 +490,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ('payment_id', 'user', 'created_at')
 
 
-class RefundSerializer(serializers.ModelSerializer):
+class RefundSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for the Refund model."""
     
     order_id = serializers.IntegerField(write_only=True)
@@ -321,11 +504,11 @@ class RefundSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context['request'].user
         order_id = validated_data.pop('order_id')
-        order = Order.objects.get(id=order_id, user=user)
+        order = Order.objects.for_user(user).get(id=order_id)
         
         # Find the associated payment
         try:
-            payment = Payment.objects.filter(order=order, status='completed').first()
+            payment = order.payments.filter(status='completed').first()
         except Payment.DoesNotExist:
             payment = None
         
@@ -336,4 +519,22 @@ class RefundSerializer(serializers.ModelSerializer):
             reason=validated_data.get('reason', '')
         )
         
-        return refund 
\ No newline at end of file
+        return refund 
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for background job status."""
+    
+    status_url = serializers.HyperlinkedIdentityField(view_name='job-detail')
+    
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'result', 'last_error', 'status_url',
+                  'created_at', 'updated_at')
+
+
+class OutboxEventSerializer(serializers.ModelSerializer):
+    """Serializer for change events in the event feed."""
+    
+    class Meta:
+        model = OutboxEvent
+        fields = ('id', 'aggregate_type', 'aggregate_id', 'sequence', 'event_type', 'payload', 'created_at')
@@ -0,0 +1,21 @@
+from jobs.queue import report_progress, task
+from . import deletion, product_documents
+
+
+@task('api.delete_category', max_attempts=5)
+def delete_category(category_id):
+    """Remove a deleted category's subtree and products in batches."""
+    return deletion.purge_category(category_id, progress=report_progress)
+
+
+@task('api.delete_user', max_attempts=5)
+def delete_user(user_id):
+    """Remove a deleted user's orders, payments, reviews, cart and addresses in batches."""
+    return deletion.purge_user(user_id, progress=report_progress)
+
+
+@task('api.build_product_documents')
+def build_product_documents():
+    """Re-render the stale product documents."""
+    built = product_documents.build_stale(progress=lambda built: report_progress({'built': built}))
+    return {'built': built}
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import retention
+from api.deletion import delete_category
+from jobs.models import Job
+from jobs.queue import claim, enqueue, requeue_stale, run
+from orders.models import Order
+from payments.models import Payment
+from products.models import Category, Product
+from users.models import User
+
+
+class CategoryPurgeTests(TestCase):
+    """A purge that runs longer than JOB_LOCK_TIMEOUT keeps its job."""
+
+    # Cart and order lines of the products are looked for on every shard
+    databases = '__all__'
+
+    @override_settings(JOB_LOCK_TIMEOUT=1, DELETION_BATCH_SIZE=1, DELETION_BATCH_DELAY=0.4)
+    def test_long_purge_is_not_requeued(self):
+        category = Category.objects.create(name='Books')
+        for n in range(5):
+            Product.objects.create(category=category, name=f'Book {n}', description='-', price='10.00', stock=1)
+        job = delete_category(category)
+        [job] = [claimed for claimed in claim('w1', limit=10) if claimed.pk == job.pk]
+
+        # A second worker looks for stale jobs between the purge's batches
+        requeued = []
+
+        def check_stale(sender, **kwargs):
+            requeued.append(requeue_stale())
+
+        post_delete.connect(check_stale, sender=Product, dispatch_uid='test_long_purge')
+        self.addCleanup(post_delete.disconnect, sender=Product, dispatch_uid='test_long_purge')
+        run(job)
+
+        self.assertEqual(len(requeued), 5)
+        self.assertEqual(sum(requeued), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'succeeded')
+        self.assertFalse(Product.objects.filter(category=category).exists())
+
+
+class PendingPaymentRetentionTests(TestCase):
+    """Stale pending payments are failed unless a capture job may still settle them."""
+
+    # Orders and payments are on the user's shard when SHARD_COUNT is set
+    databases = '__all__'
+
+    def test_payments_with_a_capture_job_are_kept(self):
+        user = User.objects.create_user(email='buyer@example.com', password='pw123456')
+        payments = []
+        for _ in range(4):
+            order = Order.objects.create(user=user, total_price='10.00')
+            payments.append(Payment.objects.create(user=user, order=order, amount='10.00', payment_method='paypal'))
+        Payment.objects.for_user(user).update(updated_at=timezone.now() - timedelta(days=3))
+        capturing = {payments[0].pk, payments[2].pk}
+        for payment_id in capturing:
+            enqueue('payments.capture', {'payment_id': payment_id})
+
+        # Batches of one, so the kept payments come first in some of them
+        self.assertEqual(retention.reap(retention.POLICIES['pending_payments'], batch_size=1), 2)
+        statuses = dict(Payment.objects.for_user(user).values_list('pk', 'status'))
+        self.assertEqual({pk for pk, status in statuses.items() if status == 'pending'}, capturing)
@@ -0,0 +1,255 @@
+"""
+Token-bucket rate limiting for the API.
+
+Each scope has a rate from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] in DRF's
+"100/min" form: a bucket holds up to 100 tokens, refills at 100 per minute
+and every request takes one, so clients may burst up to the full budget
+but not exceed the rate over time.
+
+Buckets live in the store configured by RATE_LIMIT_STORE:
+
+- LocalTokenBucketStore keeps them in this process, in lock-sharded dicts;
+  limits then apply per worker process.
+- RedisTokenBucketStore keeps them in Redis (or anything speaking its
+  scripting commands), shared by every node; the refill and take run as
+  one Lua script, timed by the Redis clock.
+
+RateLimitHeadersMiddleware adds RateLimit-Limit, RateLimit-Remaining and
+RateLimit-Reset for the tightest bucket a request was checked against.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework import permissions
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# Outcome of taking from a bucket; `reset` is seconds until it is full again
+BucketState = namedtuple('BucketState', ['allowed', 'limit', 'remaining', 'reset', 'retry_after'])
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """`'100/min'` -> (capacity 100, refill 100/60 tokens per second)."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip()[0]]
+
+
+def _state(allowed, capacity, rate, tokens, cost):
+    return BucketState(
+        allowed=allowed,
+        limit=capacity,
+        remaining=max(0, int(tokens)),
+        reset=(capacity - tokens) / rate,
+        retry_after=0 if allowed else (cost - tokens) / rate,
+    )
+
+
+class LocalTokenBucketStore:
+    """
+    In-process buckets, spread over `shards` dicts with a lock each.
+
+    Threads only contend when their keys hash to the same shard. Each shard
+    keeps its buckets in the order they were last taken from, so the least
+    recently used ones are at the front: full buckets there are dropped,
+    since a missing bucket reads as full, and past `max_keys` buckets in
+    all the least recently used are evicted whether full or not.
+    """
+
+    def __init__(self, shards=16, max_keys=10000):
+        self.shards = [(OrderedDict(), threading.Lock()) for _ in range(shards)]
+        self.max_keys = max_keys
+        self.shard_max_keys = max(1, max_keys // shards)
+
+    def take(self, key, capacity, rate, cost=1):
+        buckets, lock = self.shards[hash(key) % len(self.shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, stamp, _ = buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            # Stored with the time the bucket is full again, when it can be forgotten
+            buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            while len(buckets) > 1 and next(iter(buckets.values()))[2] <= now:
+                buckets.popitem(last=False)
+            while len(buckets) > self.shard_max_keys:
+                buckets.popitem(last=False)
+        return _state(allowed, capacity, rate, tokens, cost)
+
+    def clear(self):
+        for buckets, lock in self.shards:
+            with lock:
+                buckets.clear()
+
+
+TAKE_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisTokenBucketStore:
+    """
+    Buckets shared by all nodes in Redis, one hash per bucket.
+
+    If Redis cannot be reached requests are let through rather than
+    failing the API.
+    """
+
+    def __init__(self, url=None, prefix='ratelimit', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate, cost=1):
+        try:
+            allowed, tokens = self.script(keys=[f"{self.prefix}:{key}"], args=[capacity, rate, cost])
+        except Exception:
+            logger.exception("Rate limit store unavailable, allowing request")
+            return _state(True, capacity, rate, capacity, cost)
+        return _state(bool(int(allowed)), capacity, rate, float(tokens), cost)
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    config = getattr(settings, 'RATE_LIMIT_STORE', {'BACKEND': 'api.throttling.LocalTokenBucketStore'})
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base throttle: one bucket per scope and client.
+
+    Subclasses set `scope` and may narrow `applies` to the requests the
+    budget is meant for. Clients are authenticated users by id, anyone
+    else by address. `store` defaults to the RATE_LIMIT_STORE one.
+    """
+
+    scope = None
+    store = None
+
+    def __init__(self):
+        self.capacity, self.rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES[self.scope])
+        self.state = None
+
+    def applies(self, request, view):
+        return True
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        if not self.applies(request, view):
+            return True
+        store = self.store or get_store()
+        self.state = store.take(f"{self.scope}:{self.get_ident_key(request)}", self.capacity, self.rate)
+        _remember(request, self.state)
+        return self.state.allowed
+
+    def wait(self):
+        return self.state.retry_after if self.state else None
+
+
+class AnonThrottle(TokenBucketThrottle):
+    """Anonymous requests not covered by a more specific budget."""
+
+    scope = 'anon'
+
+    def applies(self, request, view):
+        return not request.user.is_authenticated
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Overall budget of an authenticated user."""
+
+    scope = 'user'
+
+    def applies(self, request, view):
+        return request.user.is_authenticated
+
+
+class CatalogAnonThrottle(AnonThrottle):
+    """Anonymous catalog browsing: products, categories and reviews."""
+
+    scope = 'anon_catalog'
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """Login, registration and token refresh, per address whoever is logged in."""
+
+    scope = 'auth'
+
+    def get_ident_key(self, request):
+        return f"ip:{self.get_ident(request)}"
+
+
+class CheckoutThrottle(TokenBucketThrottle):
+    """Orders, payments and refunds being created, per user."""
+
+    scope = 'checkout'
+
+    def applies(self, request, view):
+        return request.method not in permissions.SAFE_METHODS
+
+
+class DashboardThrottle(TokenBucketThrottle):
+    """Staff dashboard reports, which run aggregate queries."""
+
+    scope = 'dashboard'
+
+
+def _remember(request, state):
+    # Kept on the Django request so the middleware sees it after DRF is done
+    django_request = getattr(request, '_request', request)
+    current = getattr(django_request, 'rate_limit', None)
+    if current is None or state.remaining < current.remaining or not state.allowed:
+        django_request.rate_limit = state
+
+
+class RateLimitHeadersMiddleware:
+    """Add RateLimit-* headers for the tightest bucket the request was checked against."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, 'rate_limit', None)
+        if state is not None:
+            response['RateLimit-Limit'] = str(state.limit)
+            response['RateLimit-Remaining'] = str(state.remaining)
+            response['RateLimit-Reset'] = str(math.ceil(state.reset))
+        return response
@@ -30,6 +30,15 @@ urlpatterns = [
     path('payments/process/', views.ProcessPaymentView.as_view(), name='process-payment'),
     path('payments/refund/', views.RefundRequestView.as_view(), name='refund-request'),
     
+    # Several requests in one round trip
+    path('batch/', views.BatchView.as_view(), name='batch'),
+    
+    # Background job status
+    path('jobs/<int:pk>/', views.JobStatusView.as_view(), name='job-detail'),
+    
+    # Change event feed
+    path('events/', views.EventFeedView.as_view(), name='event-feed'),
+    
     # Dashboard endpoints (for admin)
     path('dashboard/summary/', views.DashboardSummaryView.as_view(), name='dashboard-summary'),
     path('dashboard/recent-orders/', views.RecentOrdersView.as_view(), name='recent-orders'),
@@ -1,20 +1,44 @@
-from django.db.models import Count, Sum, Avg
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Sum, Avg, Q
 from django.contrib.auth import get_user_model
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView as BaseTokenRefreshView
 from rest_framework.decorators import action
-from products.models import Category, Product, Review
+from products.models import Category, Product, RelatedProduct, Review
+from products import facets
 from users.models import Address
+from cart.guest import GuestCart, GUEST_CART_HEADER, merge_guest_cart
 from cart.models import Cart, CartItem
-from orders.models import Order, OrderItem
+from orders.archive import ArchiveUnion
+from orders.transitions import bulk_transition
+from orders.models import ArchivedOrder, Order, OrderItem
 from payments.models import Payment, Refund
+from jobs.models import Job
+from jobs.queue import enqueue
+from events.models import OutboxEvent
+from ecommerce_api import sharding
+from .fieldsets import SparseFieldsetViewMixin
+from . import batch, deletion, product_documents, review_cache
+from .idempotency import IdempotentCreateMixin, idempotent
+from .throttling import (
+    AuthThrottle, CatalogAnonThrottle, CheckoutThrottle, DashboardThrottle, UserThrottle,
+)
 from .serializers import (
     UserSerializer, AddressSerializer, CategorySerializer, ProductSerializer,
     ReviewSerializer, CartSerializer, CartItemSerializer, OrderSerializer,
-    OrderItemSerializer, PaymentSerializer, RefundSerializer
+    OrderItemSerializer, PaymentSerializer, RefundSerializer, JobSerializer,
+    OutboxEventSerializer, RelatedProductSerializer, BulkTransitionSerializer, BatchSerializer
 )
 # geting model from getusermodel
 User = get_user_model()
@@ -36,18 +60,32 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [AuthThrottle]
 
 
 class LoginView(TokenObtainPairView):
-    """View for user login."""
+    """View for user login; a guest cart sent in the Cart-Token header is merged into the user's cart."""
     
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [AuthThrottle]
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        token = request.headers.get(GUEST_CART_HEADER)
+        if token:
+            merge_guest_cart(token, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
 class TokenRefreshView(BaseTokenRefreshView):
     """View for refreshing JWT token."""
     
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [AuthThrottle]
 
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
@@ -60,48 +98,97 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class AddressViewSet(viewsets.ModelViewSet):
+class AddressViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet for the Address model."""
     
     serializer_class = AddressSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Address.objects.filter(user=self.request.user)
+        return Address.objects.for_user(self.request.user)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet for the Category model."""
     
-    queryset = Category.objects.all()
+    queryset = Category.objects.live()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_classes = [CatalogAnonThrottle, UserThrottle]
     lookup_field = 'slug'
-
-
-class ProductViewSet(viewsets.ModelViewSet):
+    
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """The whole category tree with direct and subtree product counts, from one query."""
+        categories = list(
+            Category.objects.live().annotate(product_count=Count('products'))
+            .values('id', 'name', 'slug', 'parent_id', 'depth', 'path', 'product_count')
+            .order_by('depth', 'name')
+        )
+        nodes = {}
+        roots = []
+        for category in categories:
+            node = {
+                'id': category['id'],
+                'name': category['name'],
+                'slug': category['slug'],
+                'depth': category['depth'],
+                'product_count': category['product_count'],
+                'total_product_count': category['product_count'],
+                'children': [],
+            }
+            nodes[category['id']] = node
+            parent = nodes.get(category['parent_id'])
+            (parent['children'] if parent else roots).append(node)
+        # Deepest first, so every child's subtree total is final before it is added to its parent
+        for category in reversed(categories):
+            parent = nodes.get(category['parent_id'])
+            if parent:
+                parent['total_product_count'] += nodes[category['id']]['total_product_count']
+        return Response(roots)
+    
+    def destroy(self, request, *args, **kwargs):
+        # The subtree and its products are removed in the background, see api.deletion
+        category = self.get_object()
+        job = deletion.delete_category(category, user=request.user)
+        return _accepted(request, self.get_serializer(category).data, job)
+
+
+class ProductViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet for the Product model."""
     
-    queryset = Product.objects.all()
+    queryset = Product.objects.live()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_classes = [CatalogAnonThrottle, UserThrottle]
     lookup_field = 'slug'
+    # ?ordering= values and the columns they sort on
+    ordering_fields = {
+        'price': 'effective_price',
+        'discount': 'discount_percent',
+        'name': 'name',
+        'created_at': 'created_at',
+    }
     
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = Product.objects.live().with_shard_stock()
         
-        # Filter by category
+        # Filter by category, including its subcategories
         category = self.request.query_params.get('category')
         if category:
-            queryset = queryset.filter(category__slug=category)
+            # Looked up first so the filter is a literal prefix the path index can use
+            path = Category.objects.live().filter(slug=category).values_list('path', flat=True).first()
+            if path is None:
+                return queryset.none()
+            queryset = queryset.filter(category__path__startswith=path)
         
-        # Filter by price range
+        # Filter by price range, on the discounted price when there is one
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
         if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+            queryset = queryset.filter(effective_price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            queryset = queryset.filter(effective_price__lte=max_price)
         
         # Filter by featured
         featured = self.request.query_params.get('featured')
@@ -113,61 +200,228 @@ class ProductViewSet(viewsets.ModelViewSet):
         if search:
             queryset = queryset.filter(name__icontains=search) | queryset.filter(description__icontains=search)
         
+        # Sort, e.g. ?ordering=price or ?ordering=-discount,name
+        ordering = self.request.query_params.get('ordering')
+        if ordering:
+            fields = []
+            for field in ordering.split(','):
+                field = field.strip()
+                descending = field.startswith('-')
+                column = self.ordering_fields.get(field.lstrip('-'))
+                if column:
+                    fields.append(f"-{column}" if descending else column)
+            if fields:
+                queryset = queryset.order_by(*fields, '-pk')
+        
         return queryset
+    
+    def _serves_documents(self, request):
+        """Whether the precomputed product documents answer `request` as the serializer would."""
+        return request.accepted_renderer.format == 'json' and not (
+            {'fields', 'expand'} & set(request.query_params)
+        )
+    
+    def retrieve(self, request, *args, **kwargs):
+        if self._serves_documents(request):
+            body = product_documents.lookup(kwargs[self.lookup_field])
+            if body is not None:
+                return product_documents.response(body)
+        return super().retrieve(request, *args, **kwargs)
+    
+    def list(self, request, *args, **kwargs):
+        if not self._serves_documents(request) or self.paginator is None:
+            return super().list(request, *args, **kwargs)
+        # Filter, sort and paginate on ids only, then read the page's documents by id
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = self.paginate_queryset(queryset.values_list('pk', flat=True))
+        bodies = product_documents.bodies(ids)
+        missing = [pk for pk in ids if pk not in bodies]
+        if missing:
+            bodies.update(product_documents.render(
+                queryset.filter(pk__in=missing), self.get_serializer_context()
+            ))
+        envelope = self.get_paginated_response([]).data
+        del envelope['results']
+        return product_documents.page_response(envelope, [bodies[pk] for pk in ids if pk in bodies])
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the current filters; the unfiltered catalog is served precomputed."""
+        filtered = any(
+            request.query_params.get(param)
+            for param in ('category', 'min_price', 'max_price', 'featured', 'search')
+        )
+        counts = None if filtered else facets.stored_facets()
+        if counts is None:
+            counts = facets.compute_facets(self.get_queryset())
+        return Response(facets.format_facets(counts))
+    
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug=None):
+        """Products frequently bought together with this one, precomputed from paid orders."""
+        links = (
+            RelatedProduct.objects.filter(
+                product__slug=slug, related__is_available=True, related__category__deleted_at__isnull=True
+            )
+            .select_related('related')
+            .order_by('rank')
+        )
+        data = RelatedProductSerializer(links, many=True).data
+        if not data and not Product.objects.live().filter(slug=slug).exists():
+            return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+def filter_by_rating(queryset, request):
+    """Apply `?rating=1..5`; other values are ignored."""
+    rating = request.query_params.get('rating')
+    if rating in ('1', '2', '3', '4', '5'):
+        return queryset.filter(rating=int(rating))
+    return queryset
+
+
+class ReviewViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet for the Review model."""
     
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_classes = [CatalogAnonThrottle, UserThrottle]
     
     def get_queryset(self):
-        if self.request.user.is_staff:
-            return Review.objects.all()
-        elif self.request.user.is_authenticated:
-            return Review.objects.filter(user=self.request.user)
-        return Review.objects.none()
-
-
-class ProductReviewsView(generics.ListCreateAPIView):
+        if not self.request.user.is_authenticated:
+            return Review.objects.none()
+        # Writes need whole rows: save() on a deferred instance skips unloaded fields, updated_at included
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = Review.objects.for_listing()
+        else:
+            queryset = Review.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return filter_by_rating(queryset, self.request)
+
+
+class ProductReviewsView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     """View for listing and creating reviews for a specific product."""
     
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_classes = [CatalogAnonThrottle, UserThrottle]
     
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')
-        return Review.objects.filter(product_id=product_id)
+        return filter_by_rating(Review.objects.for_listing().filter(product_id=product_id), self.request)
+    
+    def list(self, request, *args, **kwargs):
+        # The plain first page is what nearly every client reads; it is cached per product
+        if request.query_params and dict(request.query_params) != {'page': ['1']}:
+            return super().list(request, *args, **kwargs)
+        key, data = review_cache.lookup(self.kwargs['product_id'])
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        review_cache.store(key, response.data)
+        return response
     
     def perform_create(self, serializer):
         product_id = self.kwargs.get('product_id')
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product.objects.live(), id=product_id)
         serializer.save(user=self.request.user, product=product)
 
 
 class CartViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet for the Cart model."""
+    """
+    ViewSet for the Cart model.
+    
+    Anonymous shoppers get a guest cart kept in the cache (see cart.guest),
+    identified by the `cart_token` returned with it and sent back in the
+    Cart-Token header. A user's Cart row is only created when the first
+    item is added, so reading a cart never writes to the database.
+    """
     
     serializer_class = CartSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.AllowAny]
     
     def get_queryset(self):
         user = self.request.user
-        return Cart.objects.filter(user=user)
+        if not user.is_authenticated:
+            return Cart.objects.none()
+        return Cart.objects.for_user(user).prefetch_related('items__product')
     
     def list(self, request):
-        user = request.user
-        cart, created = Cart.objects.get_or_create(user=user)
+        if not request.user.is_authenticated:
+            return self._guest_response(GuestCart.from_request(request))
+        cart = self.get_queryset().first()
+        if cart is None:
+            return Response(self._cart_data([]))
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'])
+    def add(self, request):
+        """Add `quantity` (default 1) of `product_id` to the cart."""
+        try:
+            product_id = int(request.data.get('product_id'))
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return Response({"error": "product_id and quantity must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity < 1:
+            return Response({"error": "quantity must be at least 1"}, status=status.HTTP_400_BAD_REQUEST)
+        if not Product.objects.live().filter(pk=product_id).exists():
+            return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        if request.user.is_authenticated:
+            serializer = CartItemSerializer(data={'product_id': product_id, 'quantity': quantity},
+                                            context={'request': request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return self.list(request)
+        guest = GuestCart.from_request(request)
+        try:
+            guest.add(product_id, quantity)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        guest.save()
+        return self._guest_response(guest)
+    
+    @action(detail=False, methods=['post'])
+    def remove(self, request):
+        """Remove `product_id` from the cart."""
+        try:
+            product_id = int(request.data.get('product_id'))
+        except (TypeError, ValueError):
+            return Response({"error": "product_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.is_authenticated:
+            CartItem.objects.for_user(request.user).filter(product_id=product_id).delete()
+            return self.list(request)
+        guest = GuestCart.from_request(request)
+        guest.remove(product_id)
+        if guest.token:
+            guest.save()
+        return self._guest_response(guest)
+    
     @action(detail=False, methods=['post'])
     def clear(self, request):
         user = request.user
-        cart = get_object_or_404(Cart, user=user)
-        cart.items.all().delete()
+        if not user.is_authenticated:
+            GuestCart.from_request(request).delete()
+            return Response({"message": "Cart cleared successfully"}, status=status.HTTP_200_OK)
+        CartItem.objects.for_user(user).delete()
         return Response({"message": "Cart cleared successfully"}, status=status.HTTP_200_OK)
+    
+    def _guest_response(self, guest):
+        data = self._cart_data(guest.cart_items())
+        data['cart_token'] = guest.token
+        return Response(data)
+    
+    def _cart_data(self, items):
+        """The CartSerializer representation of a cart that has no database row."""
+        return {
+            'id': None,
+            'items': CartItemSerializer(items, many=True, context=self.get_serializer_context()).data,
+            'total_price': str(sum((item.total_price for item in items), Decimal('0.00'))),
+            'total_items': sum(item.quantity for item in items),
+            'updated_at': None,
+        }
 
 
 class CartItemViewSet(viewsets.ModelViewSet):
@@ -177,25 +431,60 @@ class CartItemViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        cart = get_object_or_404(Cart, user=user)
-        return CartItem.objects.filter(cart=cart)
+        return CartItem.objects.for_user(self.request.user).prefetch_related('product')
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsetViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     """ViewSet for the Order model."""
     
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserThrottle, CheckoutThrottle]
     
     def get_queryset(self):
         user = self.request.user
+        queryset = Order.objects.for_listing()
         if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=user)
+            # One order is read from its shard, lists from all of them, see list()
+            if 'pk' in self.kwargs:
+                queryset = queryset.for_id(self.kwargs['pk'])
+            return queryset.live()
+        return queryset.for_user(user)
+    
+    def get_archived_queryset(self):
+        # Addresses and users may live on another database than the archive, so they are not joined
+        queryset = ArchivedOrder.objects.with_items()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        orders = self.filter_queryset(self.get_queryset())
+        # Archived orders are only read when asked for, e.g. ?include_archived=true
+        if request.query_params.get('include_archived', '').lower() == 'true':
+            orders = ArchiveUnion(orders, self.get_archived_queryset())
+        else:
+            # Staff see every shard's orders, merged newest first
+            orders = sharding.gather(orders)
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(orders[:], many=True).data)
+    
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Archived orders can be read under their old id but not changed
+            if self.request.method not in permissions.SAFE_METHODS:
+                raise
+            order = generics.get_object_or_404(self.get_archived_queryset(), pk=self.kwargs['pk'])
+            self.check_object_permissions(self.request, order)
+            return order
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        order = serializer.save(user=self.request.user)
+        enqueue('orders.order_placed', {'order_id': order.pk}, user=self.request.user)
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -205,13 +494,27 @@ class OrderViewSet(viewsets.ModelViewSet):
             order.save()
             return Response({"message": "Order cancelled successfully"}, status=status.HTTP_200_OK)
         return Response({"error": "Cannot cancel this order"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-transition',
+            permission_classes=[permissions.IsAdminUser], throttle_classes=[UserThrottle])
+    def bulk_transition(self, request):
+        """Move many orders along pending -> processing -> shipped -> delivered in one request."""
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_transition(serializer.validated_data['updates'])
+        summary = {}
+        for result in results:
+            summary[result['result']] = summary.get(result['result'], 0) + 1
+        return Response({'summary': summary, 'results': results})
 
 
 class CreatePaymentView(APIView):
     """View for creating a payment."""
     
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserThrottle, CheckoutThrottle]
     
+    @idempotent
     def post(self, request):
         order_id = request.data.get('order_id')
         payment_method = request.data.get('payment_method')
@@ -220,16 +523,14 @@ class CreatePaymentView(APIView):
             return Response({"error": "Order ID and payment method are required"}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            order = Order.objects.get(id=order_id, user=request.user)
+            order = Order.objects.for_user(request.user).get(id=order_id)
         except Order.DoesNotExist:
             return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # In a real app, you would integrate with a payment gateway here
-        # For this example, we'll just create a payment record
+        # The payment id is generated on save, so repeat payments for an order get their own
         payment = Payment.objects.create(
             user=request.user,
             order=order,
-            payment_id=f"PAY-{order.order_number}",
             amount=order.total_price,
             payment_method=payment_method,
             status='pending'
@@ -243,7 +544,9 @@ class ProcessPaymentView(APIView):
     """View for processing a payment."""
     
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserThrottle, CheckoutThrottle]
     
+    @idempotent
     def post(self, request):
         payment_id = request.data.get('payment_id')
         
@@ -251,88 +554,198 @@ class ProcessPaymentView(APIView):
             return Response({"error": "Payment ID is required"}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            payment = Payment.objects.get(payment_id=payment_id, user=request.user)
+            payment = Payment.objects.for_user(request.user).get(payment_id=payment_id)
         except Payment.DoesNotExist:
             return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # In a real app, you would process the payment with a payment gateway here
-        # For this example, we'll just update the payment status
-        payment.status = 'completed'
-        payment.save()
-        
-        # Update order status
-        order = payment.order
-        order.payment_status = 'paid'
-        order.order_status = 'processing'
-        order.save()
-        
         serializer = PaymentSerializer(payment)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if payment.status != 'pending':
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        
+        # The gateway call runs in a worker, the client polls the job's status URL
+        job = enqueue('payments.capture', {'payment_id': payment.pk}, user=request.user)
+        return _accepted(request, serializer.data, job)
 
 
 class RefundRequestView(APIView):
     """View for requesting a refund."""
     
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserThrottle, CheckoutThrottle]
     
     def post(self, request):
         serializer = RefundSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             refund = serializer.save()
-            return Response(RefundSerializer(refund).data, status=status.HTTP_201_CREATED)
+            job = enqueue('payments.process_refund', {'refund_id': refund.pk}, user=request.user)
+            return _accepted(request, RefundSerializer(refund).data, job)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _accepted(request, data, job):
+    """202 response for work handed off to a background job."""
+    job_data = JobSerializer(job, context={'request': request}).data
+    response = Response({**data, 'job': job_data}, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = job_data['status_url']
+    return response
+
+
+class BatchView(APIView):
+    """
+    Several API requests in one: `{"requests": [{"method", "path", "body",
+    "headers", "id"}, ...]}`, answered with one status and body per request.
+    See api.batch.
+    """
+    
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'responses': batch.run(request, serializer.validated_data['requests'])})
+
+
+class JobStatusView(generics.RetrieveAPIView):
+    """View for polling the status of a background job."""
+    
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Job.objects.all()
+        return Job.objects.filter(user=self.request.user)
+
+
+class EventFeedView(APIView):
+    """
+    Long-poll feed of change events.
+    
+    Returns events with an id greater than `after`, waiting up to `wait`
+    seconds for new ones when there are none yet. Ids are handed out when an
+    event is written but become visible when its transaction commits, so a
+    missing id may still turn up. The feed stops before such a gap until the
+    event after it is EVENT_FEED_GAP_TIMEOUT old, when the missing one is
+    taken as rolled back; a cursor therefore never moves past an event that
+    commits later.
+    """
+    
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+            wait = min(float(request.query_params.get('wait', settings.EVENT_FEED_MAX_WAIT)),
+                       settings.EVENT_FEED_MAX_WAIT)
+        except ValueError:
+            return Response({"error": "after, limit and wait must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        gap_timeout = timedelta(seconds=settings.EVENT_FEED_GAP_TIMEOUT)
+        deadline = time.monotonic() + wait
+        while True:
+            events = _before_open_gap(
+                list(OutboxEvent.objects.filter(id__gt=after).order_by('id')[:limit]),
+                after, timezone.now() - gap_timeout,
+            )
+            if events or time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+        
+        return Response({
+            'events': OutboxEventSerializer(events, many=True).data,
+            'next_after': events[-1].id if events else after,
+        })
+
+
+def _before_open_gap(events, after, timed_out):
+    """The events of `events`, in id order, up to the first id gap newer than `timed_out`."""
+    previous = after
+    for index, event in enumerate(events):
+        # The missing ids were handed out before this event was written
+        if event.id != previous + 1 and event.created_at > timed_out:
+            return events[:index]
+        previous = event.id
+    return events
+
+
 # Admin Dashboard Views
 class DashboardSummaryView(APIView):
     """View for dashboard summary."""
     
     permission_classes = [permissions.IsAdminUser]
+    throttle_classes = [DashboardThrottle]
     
     def get(self, request):
-        total_orders = Order.objects.count()
-        total_revenue = Order.objects.filter(payment_status='paid').aggregate(Sum('total_price'))['total_price__sum'] or 0
-        total_customers = User.objects.filter(is_staff=False).count()
-        total_products = Product.objects.count()
-        
-        pending_orders = Order.objects.filter(order_status='pending').count()
-        processing_orders = Order.objects.filter(order_status='processing').count()
-        shipped_orders = Order.objects.filter(order_status='shipped').count()
-        delivered_orders = Order.objects.filter(order_status='delivered').count()
+        # One aggregate per shard, added up
+        totals = Counter()
+        for orders in Order.objects.scatter():
+            totals.update({
+                name: value or 0 for name, value in orders.aggregate(
+                    total_orders=Count('pk'),
+                    total_revenue=Sum('total_price', filter=Q(payment_status='paid')),
+                    pending=Count('pk', filter=Q(order_status='pending')),
+                    processing=Count('pk', filter=Q(order_status='processing')),
+                    shipped=Count('pk', filter=Q(order_status='shipped')),
+                    delivered=Count('pk', filter=Q(order_status='delivered')),
+                ).items()
+            })
+        total_customers = User.objects.filter(is_staff=False, deleted_at__isnull=True).count()
+        total_products = Product.objects.live().count()
         
         return Response({
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
+            'total_orders': totals['total_orders'],
+            'total_revenue': totals['total_revenue'],
             'total_customers': total_customers,
             'total_products': total_products,
             'order_status': {
-                'pending': pending_orders,
-                'processing': processing_orders,
-                'shipped': shipped_orders,
-                'delivered': delivered_orders
+                'pending': totals['pending'],
+                'processing': totals['processing'],
+                'shipped': totals['shipped'],
+                'delivered': totals['delivered']
             }
         })
 
 
-class RecentOrdersView(generics.ListAPIView):
+class RecentOrdersView(SparseFieldsetViewMixin, generics.ListAPIView):
     """View for recent orders."""
     
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAdminUser]
+    throttle_classes = [DashboardThrottle]
     
     def get_queryset(self):
-        return Order.objects.all().order_by('-created_at')[:10]
+        return Order.objects.for_listing().live()
+    
+    def list(self, request, *args, **kwargs):
+        # The newest ten of every shard's newest ten
+        orders = sharding.gather(self.filter_queryset(self.get_queryset()))[:10]
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(orders, many=True).data)
 
 
 class TopProductsView(APIView):
     """View for top products."""
     
     permission_classes = [permissions.IsAdminUser]
+    throttle_classes = [DashboardThrottle]
     
     def get(self, request):
-        top_products = Product.objects.annotate(
-            order_count=Count('orderitem')
-        ).order_by('-order_count')[:10]
+        # Order lines are counted on each shard, products read from the default database
+        order_counts = Counter()
+        for items in OrderItem.objects.filter(product__isnull=False).scatter():
+            order_counts.update(dict(
+                items.values_list('product').annotate(count=Count('pk')).order_by()
+            ))
+        products = Product.objects.live()
+        top_products = sorted(
+            products.filter(pk__in=[pk for pk, _ in order_counts.most_common(100)]),
+            key=lambda product: -order_counts[product.pk],
+        )[:10]
+        if len(top_products) < 10:
+            top_products += products.exclude(pk__in=[product.pk for product in top_products])[:10 - len(top_products)]
         
         serializer = ProductSerializer(top_products, many=True)
         return Response(serializer.data)
\ No newline at end of file
@@ -1,20 +1,50 @@
 from django.contrib import admin
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from ecommerce_api.admin import LargeTableAdmin, register_user_owned
 from .models import Cart, CartItem
 
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
+    autocomplete_fields = ('product',)
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 
-@admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+@register_user_owned(Cart)
+class CartAdmin(LargeTableAdmin):
     list_display = ('user', 'total_items', 'total_price', 'updated_at')
+    list_select_related = ('user',)
+    search_fields = ('user__email__exact',)
+    autocomplete_fields = ('user',)
     inlines = [CartItemInline]
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # The totals are summed by the database instead of per row through the cart's properties
+        money = DecimalField(max_digits=12, decimal_places=2)
+        line_total = ExpressionWrapper(F('items__quantity') * F('items__product__effective_price'), output_field=money)
+        return queryset.annotate(
+            item_total=Coalesce(Sum('items__quantity'), 0),
+            price_total=Coalesce(Sum(line_total), 0, output_field=money),
+        )
+    
+    @admin.display(description='Total items', ordering='item_total')
+    def total_items(self, obj):
+        return obj.item_total
+    
+    @admin.display(description='Total price', ordering='price_total')
+    def total_price(self, obj):
+        return obj.price_total
 
 
-@admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+@register_user_owned(CartItem)
+class CartItemAdmin(LargeTableAdmin):
     list_display = ('cart', 'product', 'quantity', 'total_price', 'updated_at')
-    list_filter = ('cart__user',)
-    search_fields = ('product__name', 'cart__user__email') 
\ No newline at end of file
+    list_select_related = ('cart__user', 'product')
+    search_fields = ('product__name__startswith', 'cart__user__email__exact')
+    autocomplete_fields = ('product',)
+    raw_id_fields = ('cart',)
\ No newline at end of file
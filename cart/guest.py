@@ -0,0 +1,117 @@
+"""
+Guest carts, kept in the cache rather than the database.
+
+An anonymous shopper's cart is a `{product_id: quantity}` dict in the
+GUEST_CART_CACHE cache under a random token. The token is handed back with
+the cart and sent on later requests in the `Cart-Token` header. Nothing is
+written to the database until the shopper logs in. merge_guest_cart() then
+folds the guest cart into their Cart with one bulk upsert and drops it.
+
+The cache must be shared by all web processes (e.g. Redis or memcached)
+for guest carts to survive requests served by different workers.
+"""
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+
+from ecommerce_api import sharding
+from products.models import Product
+from .models import Cart, CartItem
+
+GUEST_CART_HEADER = 'Cart-Token'
+CACHE_PREFIX = 'guest-cart'
+
+
+def _cache():
+    return caches[getattr(settings, 'GUEST_CART_CACHE', 'default')]
+
+
+def _key(token):
+    return f"{CACHE_PREFIX}:{token}"
+
+
+class GuestCart:
+    """An anonymous cart; changes are kept until save()."""
+
+    def __init__(self, token=None, items=None):
+        self.token = token
+        self.items = items or {}
+
+    @classmethod
+    def load(cls, token):
+        """The cart stored under `token`, or a new empty one if there is none."""
+        if token:
+            items = _cache().get(_key(token))
+            if items is not None:
+                return cls(token, items)
+        return cls()
+
+    @classmethod
+    def from_request(cls, request):
+        return cls.load(request.headers.get(GUEST_CART_HEADER))
+
+    def add(self, product_id, quantity=1):
+        limit = getattr(settings, 'GUEST_CART_MAX_ITEMS', 100)
+        if product_id not in self.items and len(self.items) >= limit:
+            raise ValueError(f"A guest cart holds at most {limit} products")
+        self.items[product_id] = self.items.get(product_id, 0) + quantity
+
+    def remove(self, product_id):
+        self.items.pop(product_id, None)
+
+    def clear(self):
+        self.items = {}
+
+    def save(self):
+        if self.token is None:
+            self.token = secrets.token_urlsafe(24)
+        ttl = getattr(settings, 'GUEST_CART_TTL', timedelta(days=7))
+        _cache().set(_key(self.token), self.items, ttl.total_seconds())
+
+    def delete(self):
+        if self.token is not None:
+            _cache().delete(_key(self.token))
+
+    def cart_items(self):
+        """Unsaved CartItems for display, for the products that still exist."""
+        products = Product.objects.in_bulk(list(self.items))
+        return [
+            CartItem(product=products[product_id], quantity=quantity)
+            for product_id, quantity in self.items.items()
+            if product_id in products
+        ]
+
+
+def merge_guest_cart(token, user):
+    """
+    Add the guest cart under `token` to `user`'s Cart and delete it.
+
+    Quantities of products already in the user's cart are added together.
+    Returns the number of products merged.
+    """
+    guest = GuestCart.load(token)
+    if not guest.items:
+        guest.delete()
+        return 0
+    product_ids = list(Product.objects.filter(pk__in=list(guest.items)).values_list('pk', flat=True))
+    with sharding.atomic(sharding.shard_for_user(user)):
+        cart, _ = Cart.objects.on_shard_of(user).get_or_create(user=user)
+        items = CartItem.objects.on_shard_of(user)
+        existing = dict(
+            items.select_for_update()
+            .filter(cart=cart, product_id__in=product_ids).values_list('product_id', 'quantity')
+        )
+        items.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id,
+                         quantity=existing.get(product_id, 0) + guest.items[product_id])
+                for product_id in product_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+    guest.delete()
+    return len(product_ids)
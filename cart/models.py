@@ -1,15 +1,24 @@
 from django.db import models
 from users.models import User
 from products.models import Product
+from ecommerce_api.sharding import ShardedQuerySet
 
 
 class Cart(models.Model):
     """Shopping cart model."""
     
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Stored on the user's shard, see ecommerce_api.sharding
+    shard_user = 'user'
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'], name='cart_updated_idx')]
+    
     def __str__(self):
         return f"{self.user.email}'s Cart"
     
@@ -25,18 +34,23 @@ class Cart(models.Model):
 class CartItem(models.Model):
     """Cart item model."""
     
+    shard_user = 'cart__user'
+    
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('cart', 'product')
+        indexes = [models.Index(fields=['updated_at'], name='cartitem_updated_idx')]
     
     def __str__(self):
         return f"{self.product.name} ({self.quantity}) in {self.cart}"
     
     @property
     def total_price(self):
-        return self.product.current_price * self.quantity 
\ No newline at end of file
+        return self.product.effective_price * self.quantity 
\ No newline at end of file
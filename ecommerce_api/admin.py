@@ -0,0 +1,122 @@
+"""
+Admin helpers for large tables.
+
+The changelist paginator counts rows with COUNT(*), and by default runs a
+second COUNT(*) over the whole table for the "N results (M total)" line.
+Admins using LargeTableAdmin skip the total and paginate with
+EstimatedCountPaginator instead:
+
+- An unfiltered list takes its count from the database's table statistics
+  once those report more than ADMIN_COUNT_LIMIT rows.
+- Any other list counts at most ADMIN_COUNT_LIMIT rows, so a broad filter
+  on a huge table costs a bounded scan.
+
+BackgroundDeletionAdmin hands deletes over to a background job, see
+api.deletion, instead of collecting and deleting every related row in the
+request.
+
+The admin reads and writes a single database. Models spread over the user
+shards (see ecommerce_api.sharding) are registered with register_user_owned()
+and inlined with user_owned_inlines(), which leave them out of the admin
+when there is more than one shard: their changelists, searches and bulk
+actions would silently cover the default shard's rows only.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+from . import sharding
+
+
+def estimated_rows(model, using):
+    """Row count of `model`'s table from the database statistics, or None if there are none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table]),
+        'mysql': (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s",
+            [table],
+        ),
+        # Filled in by ANALYZE; the first number of `stat` is the row count
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    sql, params = queries[connection.vendor]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for a table that was never analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is estimated or capped instead of exact on large tables."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
+
+
+def register_user_owned(*models):
+    """admin.register for user-owned models; registers nothing with more than one shard."""
+    def decorator(admin_class):
+        if len(sharding.shards()) == 1:
+            admin.site.register(models, admin_class)
+        return admin_class
+    return decorator
+
+
+def user_owned_inlines(*inlines):
+    """`inlines` of user-owned models, or none with more than one shard."""
+    return list(inlines) if len(sharding.shards()) == 1 else []
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin for tables with millions of rows."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BackgroundDeletionAdmin(admin.ModelAdmin):
+    """ModelAdmin whose deletes mark the object and queue the removal of its related rows."""
+
+    # Steps of api.deletion the job runs, for the permission check
+    deletion_steps = ()
+
+    def mark_deleted(self, request, obj):
+        raise NotImplementedError
+
+    def get_deleted_objects(self, objs, request):
+        # Listing every related row would load them all, which is what the job avoids
+        perms_needed = {
+            step.model._meta.verbose_name
+            for step in self.deletion_steps
+            if not step.set_null and step.model in self.admin_site._registry
+            and not self.admin_site._registry[step.model].has_delete_permission(request)
+        }
+        return [str(obj) for obj in objs], {}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.mark_deleted(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.mark_deleted(request, obj)
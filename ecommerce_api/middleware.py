@@ -0,0 +1,113 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+Brotli is used when the client accepts it and the optional `brotli`
+package is installed, gzip otherwise. Small bodies, streaming responses,
+already-encoded responses and content types that do not compress well
+are passed through unchanged.
+
+Against BREACH, which recovers secrets from the compressed size of
+responses that also reflect attacker input, responses to requests that
+carry credentials (an Authorization header, or the session or CSRF
+cookie) are not compressed, nor is anything under
+COMPRESSION_EXCLUDED_PATHS: the auth endpoints answer with tokens before
+the client has any credentials.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used on its own
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+# Login, registration and refresh return tokens; a batch may include them
+EXCLUDED_PATHS = ('/api/auth/', '/api/batch/')
+
+
+def accepted_encodings(header):
+    """`{encoding: q}` from an Accept-Encoding header; q=0 marks a refused encoding."""
+    encodings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    """Compress eligible responses with brotli or gzip."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        self.excluded_paths = tuple(getattr(settings, 'COMPRESSION_EXCLUDED_PATHS', EXCLUDED_PATHS))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if self._may_hold_secrets(request):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        # Whatever the outcome, caches must key this response on Accept-Encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+
+        encoding = self._choose(accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        if encoding is None:
+            return response
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body changed, so a strong ETag no longer holds byte for byte
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def _may_hold_secrets(self, request):
+        return (
+            'HTTP_AUTHORIZATION' in request.META
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+            or settings.CSRF_COOKIE_NAME in request.COOKIES
+            or request.path_info.startswith(self.excluded_paths)
+        )
+
+    def _choose(self, accepted):
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+        wildcard = accepted.get('*', 0)
+        scored = [(accepted.get(name, wildcard), -index, name) for index, name in enumerate(candidates)]
+        quality, _, name = max(scored)
+        return name if quality > 0 else None
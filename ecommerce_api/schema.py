@@ -0,0 +1,65 @@
+"""
+API documentation views, built on first use.
+
+drf_yasg is only imported when a documentation URL is actually requested,
+which keeps it (and the pkg_resources import it drags in) out of worker
+start-up. When OPENAPI_SCHEMA_FILE exists, produced at build time by
+`manage.py generate_openapi`, the schema is served from it instead of
+being introspected on every request.
+"""
+import functools
+import os
+
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import permissions
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="E-Commerce API",
+        default_version='v1',
+        description="API for E-Commerce application",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@ecommerce.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_view():
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        api_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _ui_view(renderer):
+    return _schema_view().with_ui(renderer, cache_timeout=0)
+
+
+def _has_static_schema():
+    return os.path.exists(settings.OPENAPI_SCHEMA_FILE)
+
+
+def static_schema(request, *args, **kwargs):
+    """The OpenAPI document, from the pre-generated file when there is one."""
+    if _has_static_schema():
+        return FileResponse(open(settings.OPENAPI_SCHEMA_FILE, 'rb'), content_type='application/json')
+    return _schema_view().without_ui(cache_timeout=0)(request, *args, **kwargs)
+
+
+def schema_ui(renderer):
+    """View rendering the `renderer` ('swagger' or 'redoc') documentation page."""
+    def view(request, *args, **kwargs):
+        # The UI page fetches its schema from the same URL with ?format=openapi
+        if request.GET.get('format') == 'openapi' and _has_static_schema():
+            return static_schema(request)
+        return _ui_view(renderer)(request, *args, **kwargs)
+    return view
@@ -2,6 +2,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -13,6 +15,12 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Swagger/redoc pages; set API_DOCS_ENABLED=1 to serve them with DEBUG off
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+# Pre-generated OpenAPI document (manage.py generate_openapi), served instead of introspecting
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi.json'
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -26,7 +34,6 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
-    'drf_yasg',
     
     # Local apps
     'users',
@@ -34,14 +41,22 @@ INSTALLED_APPS = [
     'orders',
     'cart',
     'payments',
+    'jobs',
+    'events',
+    'promotions',
     'api',
 ]
 
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'ecommerce_api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'api.throttling.RateLimitHeadersMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -76,6 +91,25 @@ DATABASES = {
     }
 }
 
+# User-owned carts, orders, payments, refunds and addresses are spread over
+# SHARD_DATABASES by user id (ecommerce_api.sharding). SHARD_COUNT=N adds N
+# local sqlite shards next to the default database, e.g. to try it out;
+# `manage.py migrate --database shardN` creates their tables. Adding a shard
+# to a database with data remaps most users; move their rows first (see the
+# sharding module).
+SHARD_DATABASES = ['default']
+for shard in range(1, int(os.environ.get('SHARD_COUNT', 1))):
+    DATABASES[f'shard{shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'shard{shard}.sqlite3',
+    }
+    SHARD_DATABASES.append(f'shard{shard}')
+SHARD_ID_BITS = 40  # each shard numbers its rows from index << SHARD_ID_BITS
+
+# Archived orders, payments and refunds go to ORDER_ARCHIVE_DATABASE; add a
+# second alias above and point this at it to move them off the main database.
+DATABASE_ROUTERS = ['orders.routers.ArchiveRouter', 'ecommerce_api.sharding.ShardRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,6 +139,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 # Media files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Origin put in front of media URLs in API responses, e.g. 'https://shop.example.com';
+# empty leaves them relative to the site
+API_MEDIA_BASE_URL = os.environ.get('API_MEDIA_BASE_URL', '')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -122,6 +159,19 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonThrottle',
+        'api.throttling.UserThrottle',
+    ],
+    # Token buckets: "100/min" allows bursts of 100 refilled at 100 a minute
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '100/min',
+        'user': '1000/min',
+        'anon_catalog': '300/min',
+        'auth': '10/min',
+        'checkout': '30/min',
+        'dashboard': '60/min',
+    },
 }
 
 # JWT settings
@@ -140,5 +190,87 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Idempotency-Key handling for order and payment creation
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_WAIT_TIMEOUT = 5  # seconds a duplicate waits for the in-flight request
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=60)  # after which a retry takes over an unfinished request
+IDEMPOTENCY_USE_CACHE = True
+
+# Node of this process in generated order, payment and refund ids (ecommerce_api.ids).
+# Must differ between all processes when set; None picks a random node per process.
+ID_NODE = None
+
+# Guest carts of anonymous shoppers (cart.guest). Use a cache shared by all web
+# processes, e.g. Redis, so a guest cart is found whichever worker serves the request.
+GUEST_CART_CACHE = 'default'
+GUEST_CART_TTL = timedelta(days=7)
+GUEST_CART_MAX_ITEMS = 100  # distinct products per guest cart
+
+# Data retention (manage.py reap, api.retention)
+CART_ITEM_RETENTION = timedelta(days=60)  # cart items untouched this long are deleted
+EMPTY_CART_RETENTION = timedelta(days=7)  # carts empty this long are deleted
+PENDING_PAYMENT_TIMEOUT = timedelta(days=1)  # pending payments older than this are failed
+REAP_BATCH_SIZE = 1000
+REAP_BATCH_DELAY = 0.1  # seconds between batches
+
+# Background removal of deleted categories and users (api.deletion)
+DELETION_BATCH_SIZE = 500  # rows per transaction
+DELETION_BATCH_DELAY = 0.05  # seconds between batches
+
+# POST /api/batch/ (api.batch)
+BATCH_MAX_REQUESTS = 20  # sub-requests per batch
+BATCH_MAX_WORKERS = 4  # threads running a batch's reads, shared by all batches of the process
+
+# Background jobs
+JOB_LOCK_TIMEOUT = 300  # seconds before a running job with a silent worker is requeued
+
+# Payment gateway used by the payment jobs
+PAYMENT_GATEWAY = {
+    'BACKEND': 'payments.gateway.FakeGateway',
+    'OPTIONS': {
+        'latency': 0.0,
+        'failure_rate': 0.0,
+        'error_rate': 0.0,
+    },
+}
+
+# Rate limit buckets. LocalTokenBucketStore limits each worker process on its
+# own; for limits shared across processes and nodes use
+# {'BACKEND': 'api.throttling.RedisTokenBucketStore', 'OPTIONS': {'url': 'redis://...'}}
+RATE_LIMIT_STORE = {
+    'BACKEND': 'api.throttling.LocalTokenBucketStore',
+    'OPTIONS': {'shards': 16},
+}
+
+# Response compression (brotli needs the optional `brotli` package)
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller responses are sent as they are
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+# Never compressed, see ecommerce_api.middleware; requests with credentials never are either
+COMPRESSION_EXCLUDED_PATHS = ('/api/auth/', '/api/batch/')
+
+# Seconds the first page of a product's reviews stays cached (api.review_cache)
+REVIEW_PAGE_CACHE_TIMEOUT = 300
+
+# Products re-rendered per batch into the precomputed product responses (api.product_documents)
+PRODUCT_DOCUMENT_BATCH_SIZE = 500
+
+# Admin changelists on large tables (ecommerce_api.admin.LargeTableAdmin)
+ADMIN_COUNT_LIMIT = 10000  # rows counted exactly before counts are estimated or capped
+
+# Order archival (manage.py archive_orders)
+ORDER_ARCHIVE_AFTER_DAYS = 180  # delivered/cancelled orders older than this move to the archive
+ORDER_ARCHIVE_DATABASE = 'default'
+
+# Change events: sinks the outbox relay publishes to (manage.py relay_events).
+# Also available: events.sinks.NDJSONFileSink (OPTIONS: path) and
+# events.sinks.RedisStreamSink (OPTIONS: url, stream, maxlen).
+EVENT_SINKS = [
+    {'BACKEND': 'events.sinks.InProcessSink'},
+]
+EVENT_FEED_MAX_WAIT = 30  # seconds a /api/events/ long poll may wait
+EVENT_FEED_GAP_TIMEOUT = 60  # seconds the feed waits for a missing event id before skipping it
+
 # CORS settings
-CORS_ALLOW_ALL_ORIGINS = True  # For development only, set specific origins in production 
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True  # For development only, set specific origins in production
+CORS_ALLOW_HEADERS = (*default_headers, 'cart-token') 
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Horizontal sharding of user-owned data.
+
+Models with a `shard_user` attribute hold data owned by one user: carts,
+orders, payments, refunds and addresses, plus their items.
+`shard_user` is the lookup from the model to that user, e.g.
+'order__user'. All of a user's rows live on the database alias picked by
+hashing the user id over SHARD_DATABASES. Users, the catalog and
+everything else stay on the default database. Every alias carries the
+full schema, so migrations run unchanged on each; the links from
+user-owned rows to users and products have no database constraints.
+
+Each shard hands out primary keys from its own range: the shard at index
+i of SHARD_DATABASES numbers its rows from i << SHARD_ID_BITS. An id alone
+is therefore enough to find its shard, see shard_for_id(). The ranges are
+reserved by reserve_id_ranges() after every migrate.
+
+Queries reach a shard in one of these ways:
+
+- ShardedQuerySet.for_user(), on_shard_of() and for_id() pin a queryset
+  to the right alias.
+- ShardRouter routes saves, and the related managers and descriptors of an
+  instance, by the instance.
+- scatter() and gather() run a staff-wide query on every shard and
+  merge-sort the results.
+
+With the default SHARD_DATABASES = ['default'] every lookup lands on the
+default database and nothing changes. The admin reads a single database,
+so with more than one shard the user-owned models are left out of it (see
+ecommerce_api.admin.register_user_owned).
+
+There is no directory of users to shards: the shard is the user id's hash
+modulo the number of shards. Adding an alias (or reordering the list)
+therefore moves most users to another shard, where their existing rows
+are not. Their carts, orders, payments, refunds and addresses have to be
+copied to the new shard_for_user() alias before the new list is deployed,
+and SHARD_DATABASES only ever appended to, so the id ranges of existing
+shards keep their index.
+"""
+import hashlib
+import heapq
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+
+def shards():
+    return getattr(settings, 'SHARD_DATABASES', [DEFAULT_DB_ALIAS])
+
+
+def is_sharded(model):
+    return getattr(model, 'shard_user', None) is not None
+
+
+def shard_for_user(user):
+    """Alias holding the data of `user`, a User or its id."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return aliases[0]
+    user_id = getattr(user, 'pk', user)
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return aliases[int.from_bytes(digest, 'big') % len(aliases)]
+
+
+def shard_for_id(pk):
+    """Alias that handed out the primary key `pk`, or None if no shard did."""
+    aliases = shards()
+    try:
+        index = int(pk) >> settings.SHARD_ID_BITS
+    except (TypeError, ValueError):
+        return None
+    return aliases[index] if 0 <= index < len(aliases) else None
+
+
+def shard_of(instance):
+    """Alias `instance` is, or belongs, on; None when that cannot be told."""
+    model = type(instance)
+    if not is_sharded(model):
+        # A user's rows are related to it from their shard
+        return shard_for_user(instance) if model._meta.label == settings.AUTH_USER_MODEL else None
+    if instance._state.db and not instance._state.adding:
+        return instance._state.db
+    # A new row goes where its user's, or its parent's, rows are
+    field = model._meta.get_field(model.shard_user.split('__')[0])
+    parent = field.get_cached_value(instance, None)
+    # Read from __dict__: during __init__ the key may not be set yet
+    key = instance.__dict__.get(field.attname)
+    if parent is not None:
+        alias = shard_of(parent)
+    elif key is None:
+        alias = None
+    elif is_sharded(field.related_model):
+        alias = shard_for_id(key)
+    else:
+        alias = shard_for_user(key)
+    return alias or instance._state.db
+
+
+class ShardRouter:
+    """Route user-owned models to the shard of the instance they are read or written for."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if is_sharded(model):
+            return shard_of(instance)
+        if is_sharded(type(instance)):
+            # The user or product of a user-owned row, never on its shard
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            return None
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            db1, db2 = shard_of(obj1), shard_of(obj2)
+            return db1 is None or db2 is None or db1 == db2
+        # User-owned rows point at users and products on the default database
+        return True
+
+
+class ShardedQuerySet(models.QuerySet):
+    """QuerySet of a user-owned model that finds the shard to run on."""
+
+    def on_shard_of(self, user):
+        """This queryset on the shard holding `user`'s rows."""
+        if not is_sharded(self.model):
+            return self
+        return self.using(shard_for_user(user))
+
+    def for_user(self, user):
+        """The rows owned by `user`, read from their shard."""
+        return self.on_shard_of(user).filter(**{getattr(self.model, 'shard_user', 'user'): user})
+
+    def for_id(self, pk):
+        """This queryset on the shard that handed out the primary key `pk`."""
+        if not is_sharded(self.model):
+            return self
+        alias = shard_for_id(pk)
+        return self.using(alias) if alias is not None else self.none()
+
+    def create(self, **kwargs):
+        if self._db is not None or not is_sharded(self.model):
+            return super().create(**kwargs)
+        # Saved where the router puts the new row, i.e. with its user or parent
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+    def scatter(self):
+        """One copy of this queryset per shard; just this one when it is pinned to a database."""
+        if self._db is not None or not is_sharded(self.model) or len(shards()) == 1:
+            return [self]
+        return [self.using(alias) for alias in shards()]
+
+
+class MergedSequence:
+    """
+    Several querysets read as one sequence sorted by `ordering`.
+
+    Supports what pagination needs: `count()` and slicing. A slice first
+    merge-sorts the ordering keys of every queryset up to the end of the
+    slice, then loads only the rows on the page. Ordering fields must be
+    plain columns, all in the same direction, the last one the primary
+    key.
+    """
+
+    def __init__(self, querysets, ordering=('-created_at', '-pk')):
+        self.querysets = list(querysets)
+        self.ordering = ordering
+        self.reverse = ordering[0].startswith('-')
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    __len__ = count
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        if stop is None:
+            stop = self.count()
+        keys = [
+            [(*values, index) for values in queryset.order_by(*self.ordering).values_list(*self.fields)[:stop]]
+            for index, queryset in enumerate(self.querysets)
+        ]
+        page = list(islice(heapq.merge(*keys, reverse=self.reverse), start, stop))
+        loaded = [
+            queryset.in_bulk([row[-2] for row in page if row[-1] == index])
+            for index, queryset in enumerate(self.querysets)
+        ]
+        return [loaded[row[-1]][row[-2]] for row in page]
+
+
+def gather(queryset, ordering=('-created_at', '-pk')):
+    """`queryset` across all shards, merge-sorted by `ordering`; the queryset itself when unsharded."""
+    parts = queryset.scatter() if isinstance(queryset, ShardedQuerySet) else [queryset]
+    return parts[0] if len(parts) == 1 else MergedSequence(parts, ordering)
+
+
+@contextmanager
+def atomic(*aliases):
+    """
+    One transaction on the default database and on each of `aliases`.
+
+    There is no two-phase commit: the transactions commit one after the
+    other, the default database's last.
+    """
+    with ExitStack() as stack:
+        for alias in dict.fromkeys((DEFAULT_DB_ALIAS, *aliases)):
+            if alias is not None:
+                stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def reserve_id_ranges(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: start the ids of `sender`'s sharded tables on
+    `using` at the beginning of that shard's range.
+    """
+    aliases = shards()
+    if using not in aliases or aliases.index(using) == 0:
+        return
+    start = aliases.index(using) << settings.SHARD_ID_BITS
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in sender.get_models():
+            if not is_sharded(model):
+                continue
+            table = model._meta.db_table
+            if connection.vendor == 'sqlite':
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s", [start, table, start])
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                    [table, start, table],
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, %s), %s, false) "
+                    "WHERE (SELECT COALESCE(MAX({pk}), 0) FROM {table}) < %s".format(
+                        pk=connection.ops.quote_name(model._meta.pk.column),
+                        table=connection.ops.quote_name(table),
+                    ),
+                    [table, model._meta.pk.column, start, start],
+                )
+            elif connection.vendor == 'mysql':
+                cursor.execute(f"ALTER TABLE {connection.ops.quote_name(table)} AUTO_INCREMENT = {start}")
@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from api.models import IdempotencyKey
+from cart.models import Cart, CartItem
+from ecommerce_api import sharding
+from ecommerce_api.admin import LargeTableAdmin, register_user_owned, user_owned_inlines
+from jobs.queue import enqueue
+from orders.models import Order, OrderItem
+from payments.models import Payment, Refund
+from products.models import Category, Product, RelatedProduct, Review
+from promotions.models import Promotion, PromotionPrice
+from users.admin import AddressInline
+from users.models import Address, User
+
+
+class LargeTableAdminQueryCountTests(TestCase):
+    """Changelist pages of the large-table admins run a bounded number of queries."""
+
+    # Cart, order and payment rows are on the user's shard when SHARD_COUNT is set
+    databases = '__all__'
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(email='admin@example.com', password='pw123456')
+        self.client.force_login(self.admin_user)
+        self.category = Category.objects.create(name='Books')
+        self.promotion = Promotion.objects.create(
+            name='Sale', category=self.category, kind='percentage', value='10', starts_at=timezone.now(),
+        )
+        self.rows = 0
+
+    def add_rows(self, count):
+        """`count` more rows in every table with a LargeTableAdmin."""
+        for _ in range(count):
+            self.rows += 1
+            n = self.rows
+            user = User.objects.create_user(email=f'user{n}@example.com', password='pw123456')
+            address = Address.objects.create(
+                user=user, address_type='shipping', street_address=f'{n} Main St', city='City',
+                state='State', country='Country', postal_code='12345',
+            )
+            product = Product.objects.create(
+                category=self.category, name=f'Book {n}', description='-', price='10.00', stock=10
+            )
+            PromotionPrice.objects.create(product=product, promotion=self.promotion, price='9.00', discount_percent=10)
+            if n > 1:
+                RelatedProduct.objects.create(product=product, related_id=product.pk - 1, score=1)
+            Review.objects.create(product=product, user=user, rating=5, comment='Good')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+            order = Order.objects.create(
+                user=user, shipping_address=address, billing_address=address, total_price='10.00'
+            )
+            OrderItem.objects.create(
+                order=order, product=product, product_name=product.name, product_price=product.price,
+                quantity=1, total_price=product.price,
+            )
+            payment = Payment.objects.create(user=user, order=order, amount='10.00', payment_method='paypal')
+            Refund.objects.create(order=order, payment=payment, amount='1.00', reason='Damaged')
+            IdempotencyKey.objects.create(
+                user=user, key=f'key-{n}', endpoint='orders', request_hash='-',
+                expires_at=timezone.now() + timedelta(days=1),
+            )
+            enqueue('orders.order_placed', {'order_id': order.pk}, user=user)
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        models = [
+            model for model, model_admin in admin.site._registry.items() if isinstance(model_admin, LargeTableAdmin)
+        ]
+        self.add_rows(3)
+        few = {model: self.changelist_queries(model) for model in models}
+        self.add_rows(12)
+        for model in models:
+            with self.subTest(model=model._meta.label):
+                self.assertEqual(self.changelist_queries(model), few[model])
+
+    def test_changelist_search(self):
+        self.add_rows(2)
+        for model, model_admin in admin.site._registry.items():
+            if not model_admin.search_fields:
+                continue
+            url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+            with self.subTest(model=model._meta.label):
+                self.assertEqual(self.client.get(url, {'q': 'Book 1'}).status_code, 200)
+
+
+class UserOwnedAdminTests(SimpleTestCase):
+    """The admin leaves out user-owned models it could only show one shard of."""
+
+    def test_registered_with_one_shard_only(self):
+        registered = {model for model in admin.site._registry if sharding.is_sharded(model)}
+        if len(sharding.shards()) == 1:
+            self.assertIn(Order, registered)
+        else:
+            self.assertEqual(registered, set())
+
+    @override_settings(SHARD_DATABASES=['default', 'shard1'])
+    def test_nothing_registered_with_several_shards(self):
+        # Order is registered already with a single shard, which would raise AlreadyRegistered
+        register_user_owned(Order)(admin.ModelAdmin)
+        self.assertEqual(user_owned_inlines(AddressInline), [])
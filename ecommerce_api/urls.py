@@ -2,36 +2,24 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Swagger documentation setup
-schema_view = get_schema_view(
-    openapi.Info(
-        title="E-Commerce API",
-        default_version='v1',
-        description="API for E-Commerce application",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@ecommerce.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from . import schema
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     
     # API endpoints
     path('api/', include('api.urls')),
-    
-    # Swagger documentation
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
+# Swagger documentation, loaded on first request and off unless API_DOCS_ENABLED
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [
+        path('swagger.json', schema.static_schema, name='schema-json'),
+        path('swagger/', schema.schema_ui('swagger'), name='schema-swagger-ui'),
+        path('redoc/', schema.schema_ui('redoc'), name='schema-redoc'),
+    ]
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) 
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
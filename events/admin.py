@@ -0,0 +1,12 @@
+from django.contrib import admin
+from ecommerce_api.admin import LargeTableAdmin
+from .models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+    list_display = ('id', 'event_type', 'aggregate_type', 'aggregate_id', 'sequence', 'created_at', 'published_at')
+    list_filter = ('aggregate_type', 'event_type')
+    search_fields = ('=aggregate_id',)
+    readonly_fields = ('aggregate_type', 'aggregate_id', 'sequence', 'event_type', 'payload',
+                       'created_at', 'published_at')
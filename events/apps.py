@@ -0,0 +1,15 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_delete
+
+
+class EventsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'events'
+    
+    def ready(self):
+        from .models import OutboxMixin
+        from .outbox import record_deleted
+        
+        for model in apps.get_models():
+            if issubclass(model, OutboxMixin):
+                post_delete.connect(record_deleted, sender=model, dispatch_uid=f'outbox-{model._meta.label}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from events.relay import run_relay
+
+
+class Command(BaseCommand):
+    help = 'Publish outbox events to the sinks configured in EVENT_SINKS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is drained')
+
+    def handle(self, *args, **options):
+        try:
+            published = run_relay(
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(f"Published {published} events")
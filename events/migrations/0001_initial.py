@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aggregate_type', models.CharField(max_length=50)),
+                ('aggregate_id', models.BigIntegerField()),
+                ('sequence', models.PositiveIntegerField()),
+                ('event_type', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['published_at', 'id'], name='outbox_unpublished_idx')],
+                'unique_together': {('aggregate_type', 'aggregate_id', 'sequence')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AggregateSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aggregate_type', models.CharField(max_length=50)),
+                ('aggregate_id', models.BigIntegerField()),
+                ('last_sequence', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('aggregate_type', 'aggregate_id')},
+            },
+        ),
+    ]
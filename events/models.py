@@ -0,0 +1,69 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router
+
+from ecommerce_api import sharding
+
+
+class OutboxEvent(models.Model):
+    """A change event written in the same transaction as the change itself."""
+    
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.BigIntegerField()
+    sequence = models.PositiveIntegerField()
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ('id',)
+        unique_together = ('aggregate_type', 'aggregate_id', 'sequence')
+        indexes = [
+            models.Index(fields=['published_at', 'id'], name='outbox_unpublished_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id} #{self.sequence}"
+
+
+class AggregateSequence(models.Model):
+    """Last event sequence number handed out for an aggregate."""
+    
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.BigIntegerField()
+    last_sequence = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('aggregate_type', 'aggregate_id')
+    
+    def __str__(self):
+        return f"{self.aggregate_type}:{self.aggregate_id} @ {self.last_sequence}"
+
+
+class OutboxMixin:
+    """
+    Model mixin that records an outbox event for every save.
+    
+    The save and the event insert share one transaction, held on both the
+    model's shard and the default database when they differ (see
+    ecommerce_api.sharding). Deletes are recorded by the post_delete
+    receiver connected in EventsConfig.ready, which also covers cascaded
+    deletes.
+    """
+    
+    # Aggregate the events are ordered under; defaults to the model name
+    outbox_aggregate = None
+    
+    def outbox_aggregate_id(self):
+        return self.pk
+    
+    def outbox_payload(self):
+        return {field.attname: field.value_from_object(self) for field in self._meta.concrete_fields}
+    
+    def save(self, *args, **kwargs):
+        from .outbox import record_instance
+        
+        created = self._state.adding
+        with sharding.atomic(kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+            record_instance(self, 'created' if created else 'updated')
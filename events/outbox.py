@@ -0,0 +1,107 @@
+"""
+Writing change events to the outbox.
+
+Events must be recorded inside the transaction that makes the change, so
+the change and its event commit or roll back together. Each aggregate
+gets a gapless, increasing sequence; allocating it takes a row lock on
+the aggregate's AggregateSequence row, which keeps per-aggregate event
+ids in commit order.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import AggregateSequence, OutboxEvent
+
+
+def record(aggregate_type, aggregate_id, event_type, payload=None):
+    """Record a single event; returns the OutboxEvent."""
+    return record_many([(aggregate_type, aggregate_id, event_type, payload)])[0]
+
+
+def record_many(events):
+    """
+    Record a batch of `(aggregate_type, aggregate_id, event_type, payload)` events.
+
+    Sequences for every aggregate in the batch are allocated with a handful of
+    queries rather than one round trip per event.
+    """
+    events = [(kind, int(ident), event_type, payload or {}) for kind, ident, event_type, payload in events]
+    if not events:
+        return []
+
+    counts = {}
+    for kind, ident, _, _ in events:
+        counts[(kind, ident)] = counts.get((kind, ident), 0) + 1
+
+    with transaction.atomic():
+        sequences = _allocate(counts)
+        rows = []
+        for kind, ident, event_type, payload in events:
+            sequences[(kind, ident)] += 1
+            rows.append(OutboxEvent(
+                aggregate_type=kind,
+                aggregate_id=ident,
+                sequence=sequences[(kind, ident)],
+                event_type=event_type,
+                payload=payload,
+            ))
+        return OutboxEvent.objects.bulk_create(rows)
+
+
+def _allocate(counts):
+    """
+    Reserve `counts[aggregate]` sequence numbers per aggregate.
+
+    Returns the last sequence used before the reservation, so callers number
+    their events from there.
+    """
+    by_type = {}
+    for kind, ident in counts:
+        by_type.setdefault(kind, set()).add(ident)
+
+    for kind, idents in by_type.items():
+        existing = set(
+            AggregateSequence.objects.filter(aggregate_type=kind, aggregate_id__in=idents)
+            .values_list('aggregate_id', flat=True)
+        )
+        missing = [AggregateSequence(aggregate_type=kind, aggregate_id=ident) for ident in idents - existing]
+        if missing:
+            try:
+                with transaction.atomic():
+                    AggregateSequence.objects.bulk_create(missing)
+            except IntegrityError:
+                # A concurrent transaction created some of them first
+                AggregateSequence.objects.bulk_create(missing, ignore_conflicts=True)
+
+    start = {}
+    for kind, idents in by_type.items():
+        rows = list(
+            AggregateSequence.objects.select_for_update()
+            .filter(aggregate_type=kind, aggregate_id__in=idents)
+            .order_by('aggregate_id')
+        )
+        for row in rows:
+            start[(kind, row.aggregate_id)] = row.last_sequence
+            row.last_sequence = F('last_sequence') + counts[(kind, row.aggregate_id)]
+        AggregateSequence.objects.bulk_update(rows, ['last_sequence'])
+    return start
+
+
+def _aggregate_of(instance):
+    return (
+        instance.outbox_aggregate or instance._meta.model_name,
+        instance.outbox_aggregate_id(),
+    )
+
+
+def record_instance(instance, action):
+    """Record `<model>.<action>` for an OutboxMixin instance."""
+    kind, ident = _aggregate_of(instance)
+    if ident is None:
+        return None
+    return record(kind, ident, f"{instance._meta.model_name}.{action}", instance.outbox_payload())
+
+
+def record_deleted(sender, instance, **kwargs):
+    """post_delete receiver for OutboxMixin models, cascaded deletes included."""
+    record_instance(instance, 'deleted')
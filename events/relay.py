@@ -0,0 +1,56 @@
+"""
+Relay of committed outbox events to the configured sinks.
+
+Delivery is at-least-once: a batch is marked published only after every
+sink accepted it, so a crash in between publishes it again. Run a single
+relay process; the batch rows are locked while publishing, so a second
+relay just waits its turn rather than reordering events.
+"""
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .sinks import get_sinks
+
+
+def event_document(event):
+    return {
+        'id': event.pk,
+        'aggregate_type': event.aggregate_type,
+        'aggregate_id': event.aggregate_id,
+        'sequence': event.sequence,
+        'event_type': event.event_type,
+        'payload': event.payload,
+        'created_at': event.created_at,
+    }
+
+
+def relay_batch(sinks, batch_size=100):
+    """Publish the oldest unpublished events; returns how many were published."""
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update()
+            .filter(published_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        documents = [event_document(event) for event in events]
+        for sink in sinks:
+            sink.publish(documents)
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(published_at=timezone.now())
+    return len(events)
+
+
+def run_relay(batch_size=100, poll_interval=1.0, once=False, sinks=None):
+    sinks = get_sinks() if sinks is None else sinks
+    published = 0
+    while True:
+        count = relay_batch(sinks, batch_size)
+        published += count
+        if not count:
+            if once:
+                return published
+            time.sleep(poll_interval)
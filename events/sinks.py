@@ -0,0 +1,136 @@
+"""
+Destinations the outbox relay publishes event batches to.
+
+Sinks are configured with the EVENT_SINKS setting as a list of
+`{'BACKEND': dotted path, 'OPTIONS': {...}}` entries. A sink takes a list
+of event dicts and must raise if the batch was not delivered, so the
+relay leaves it unpublished and tries again.
+"""
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+
+class NDJSONFileSink:
+    """Append each event as one JSON line to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(callback, event_types=None):
+    """Call `callback(event)` for every relayed event, optionally only for `event_types`."""
+    with _subscribers_lock:
+        _subscribers.append((callback, set(event_types) if event_types else None))
+    return callback
+
+
+def unsubscribe(callback):
+    with _subscribers_lock:
+        _subscribers[:] = [entry for entry in _subscribers if entry[0] is not callback]
+
+
+class InProcessSink:
+    """Hand events to the callbacks registered with `subscribe` in this process."""
+
+    def publish(self, events):
+        with _subscribers_lock:
+            subscribers = list(_subscribers)
+        for event in events:
+            for callback, event_types in subscribers:
+                if event_types is None or event['event_type'] in event_types:
+                    callback(event)
+
+
+class InMemoryRedis:
+    """
+    Minimal stand-in for the Redis stream commands the RedisStreamSink uses.
+
+    Lets the sink run locally and in tests without a Redis server.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self._lock = threading.Lock()
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        with self._lock:
+            stream = self.streams.setdefault(name, [])
+            entry_id = f"{len(stream) + 1}-0"
+            stream.append((entry_id, dict(fields)))
+            if maxlen is not None and len(stream) > maxlen:
+                del stream[:len(stream) - maxlen]
+            return entry_id
+
+    def xrange(self, name, min='-', max='+', count=None):
+        with self._lock:
+            entries = list(self.streams.get(name, []))
+        return entries[:count] if count else entries
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+
+class _InMemoryPipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def xadd(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+        return self
+
+    def execute(self):
+        return [self.client.xadd(*args, **kwargs) for args, kwargs in self.commands]
+
+
+_memory_redis = InMemoryRedis()
+
+
+class RedisStreamSink:
+    """
+    Append events to a Redis stream with XADD, one pipeline per batch.
+
+    With a `url` the `redis` package is used; without one, events go to a
+    process-wide InMemoryRedis that speaks the same commands.
+    """
+
+    def __init__(self, url=None, stream='events', maxlen=None, client=None):
+        if client is None:
+            if url:
+                import redis
+                client = redis.Redis.from_url(url)
+            else:
+                client = _memory_redis
+        self.client = client
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def publish(self, events):
+        pipe = self.client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {'event': json.dumps(event, cls=DjangoJSONEncoder)}, maxlen=self.maxlen)
+        pipe.execute()
+
+
+def get_sinks():
+    return [
+        import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        for config in getattr(settings, 'EVENT_SINKS', [])
+    ]
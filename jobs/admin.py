@@ -0,0 +1,12 @@
+from django.contrib import admin
+from ecommerce_api.admin import LargeTableAdmin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'locked_by', 'updated_at')
+    list_filter = ('status', 'name')
+    search_fields = ('=id', 'name__exact')
+    raw_id_fields = ('user',)
+    readonly_fields = ('locked_by', 'locked_at', 'result', 'last_error', 'created_at', 'updated_at')
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand
+
+
+def _worker_main(worker_id, options, stop):
+    # Under the spawn start method the child has to set Django up itself
+    import django
+    django.setup()
+    from django.db import connections
+    from jobs.queue import work
+
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        work(
+            worker_id,
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            stop=stop,
+        )
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of background job worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        from django.db import connections
+
+        connections.close_all()
+        stop = multiprocessing.Event()
+        host = socket.gethostname()
+        workers = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(f"{host}:{os.getpid()}:{index}", options, stop),
+                daemon=True,
+            )
+            for index in range(options['processes'])
+        ]
+        for process in workers:
+            process.start()
+        self.stdout.write(f"Started {len(workers)} worker processes")
+
+        try:
+            for process in workers:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers...")
+            stop.set()
+            for process in workers:
+                process.join()
+        self.stdout.write("Workers stopped")
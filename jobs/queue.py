@@ -0,0 +1,176 @@
+"""
+Database-backed job queue.
+
+Handlers are registered with the `task` decorator in an app's `tasks`
+module, enqueued by name with `enqueue`, and run by the worker processes
+started with `manage.py run_workers`.
+"""
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_running = threading.local()
+
+
+def task(name, max_attempts=3):
+    """Register `func` as the handler for jobs called `name`."""
+    def decorator(func):
+        func.job_name = name
+        func.max_attempts = max_attempts
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, user=None, delay=None):
+    """Queue a job for `name`; returns the Job so callers can expose its status."""
+    handler = _registry.get(name)
+    if handler is None:
+        raise ValueError(f"No task registered as '{name}'")
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        user=user,
+        max_attempts=handler.max_attempts,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+
+
+def claim(worker_id, limit=1):
+    """
+    Claim up to `limit` due jobs for `worker_id`.
+
+    On databases with SKIP LOCKED the candidate rows are locked so competing
+    workers skip them instead of waiting; everywhere else the conditional
+    UPDATE on `status='queued'` makes sure each job is claimed only once.
+    """
+    now = timezone.now()
+    claimed = []
+    with transaction.atomic():
+        candidates = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        for job_id in candidates.values_list('pk', flat=True)[:limit]:
+            won = Job.objects.filter(pk=job_id, status='queued').update(
+                status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+            )
+            if won:
+                claimed.append(job_id)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def requeue_stale(timeout=None):
+    """
+    Put back jobs whose worker died while running them.
+
+    A running job's lock is refreshed by every `report_progress` call, so
+    only jobs that went quiet for `timeout` seconds count as abandoned. One
+    that has used up its attempts is failed instead of being handed to yet
+    another worker.
+    """
+    timeout = timeout or getattr(settings, 'JOB_LOCK_TIMEOUT', 300)
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_by=None, locked_at=None,
+        last_error='Worker lost while running the job', updated_at=now,
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', locked_by=None, locked_at=None, updated_at=now
+    )
+    if failed:
+        logger.warning("Failed %s jobs whose worker was lost on their last attempt", failed)
+    return requeued
+
+
+def run(job):
+    """
+    Run a claimed job and record its outcome, retrying with backoff on errors.
+
+    The outcome is only written while the job is still locked by the worker
+    that ran it; if it was requeued in the meantime the newer claim owns it.
+    """
+    handler = _registry.get(job.name)
+    _running.job = job
+    try:
+        if handler is None:
+            raise LookupError(f"No task registered as '{job.name}'")
+        result = handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts)
+        if handler is not None and job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_at = timezone.now() + timedelta(seconds=2 ** job.attempts)
+        else:
+            job.status = 'failed'
+        job.last_error = error
+        _finish(job, status=job.status, run_at=job.run_at, last_error=error)
+        return job
+    finally:
+        _running.job = None
+
+    job.status = 'succeeded'
+    job.result = result
+    _finish(job, status='succeeded', result=result)
+    return job
+
+
+def _finish(job, **fields):
+    """Record the outcome of `job` unless another worker has claimed it since."""
+    worker_id, job.locked_by, job.locked_at = job.locked_by, None, None
+    owned = Job.objects.filter(pk=job.pk, status='running', locked_by=worker_id).update(
+        locked_by=None, locked_at=None, updated_at=timezone.now(), **fields
+    )
+    if not owned:
+        logger.warning("Job %s (%s) was taken over by another worker; outcome dropped", job.pk, job.name)
+    return owned
+
+
+def report_progress(progress):
+    """
+    Store `progress` as the result of the job running in this thread.
+
+    Lets long jobs show how far they got on the job's status URL until the
+    final result replaces it. It also refreshes the job's lock, so a job that
+    reports progress more often than JOB_LOCK_TIMEOUT is never mistaken for
+    one whose worker died. Does nothing outside a job.
+    """
+    job = getattr(_running, 'job', None)
+    if job is not None:
+        now = timezone.now()
+        Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+            result=progress, locked_at=now, updated_at=now
+        )
+
+
+def work(worker_id, batch_size=1, poll_interval=1.0, once=False, stop=None):
+    """
+    Claim and run jobs until `stop` is set.
+
+    With `once`, return as soon as the queue has no due jobs instead of polling.
+    """
+    processed = 0
+    while stop is None or not stop.is_set():
+        requeue_stale()
+        jobs = claim(worker_id, batch_size)
+        for job in jobs:
+            run(job)
+            processed += 1
+        if not jobs:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return processed
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import claim, enqueue, requeue_stale, run
+
+
+class StaleJobTests(TestCase):
+    """Jobs whose worker went quiet are requeued at most until their attempts are used up."""
+
+    def claimed(self, worker_id='w1'):
+        job = enqueue('api.build_product_documents')
+        [job] = claim(worker_id)
+        return job
+
+    def test_stale_job_is_requeued(self):
+        job = self.claimed()
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'queued')
+
+    def test_stale_job_on_its_last_attempt_fails(self):
+        job = self.claimed()
+        Job.objects.filter(pk=job.pk).update(
+            attempts=job.max_attempts, locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNone(job.locked_by)
+
+    def test_outcome_of_a_job_taken_over_is_dropped(self):
+        job = self.claimed()
+        # Requeued and claimed by another worker while the first one ran it
+        Job.objects.filter(pk=job.pk).update(locked_by='w2')
+        run(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'w2'))
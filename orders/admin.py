@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Order, OrderItem
+from django.contrib import admin, messages
+from ecommerce_api.admin import LargeTableAdmin, register_user_owned
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .transitions import bulk_transition
 
 
 class OrderItemInline(admin.TabularInline):
@@ -10,13 +12,18 @@ class OrderItemInline(admin.TabularInline):
     
     def has_add_permission(self, request, obj=None):
         return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 
-@admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+@register_user_owned(Order)
+class OrderAdmin(LargeTableAdmin):
     list_display = ('order_number', 'user', 'order_status', 'payment_status', 'total_price', 'created_at')
     list_filter = ('order_status', 'payment_status', 'created_at')
-    search_fields = ('order_number', 'user__email', 'user__first_name', 'user__last_name')
+    list_select_related = ('user',)
+    # Exact matches on indexed columns rather than substring scans
+    search_fields = ('order_number__exact', 'user__email__exact')
     readonly_fields = ('order_number', 'user', 'shipping_address', 'billing_address', 'total_price', 'created_at')
     fieldsets = (
         ('Order Information', {
@@ -36,6 +43,55 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
     inlines = [OrderItemInline]
+    actions = ['mark_processing', 'mark_shipped', 'mark_delivered']
+    
+    def has_add_permission(self, request):
+        return False 
+    
+    def _transition(self, request, queryset, target):
+        results = bulk_transition({'id': pk, 'status': target} for pk in queryset.values_list('pk', flat=True))
+        updated = sum(1 for result in results if result['result'] == 'updated')
+        rejected = [result['order_number'] for result in results if result['result'] == 'invalid_transition']
+        self.message_user(request, f"{updated} orders marked {target}.", messages.SUCCESS)
+        if rejected:
+            self.message_user(
+                request,
+                f"{len(rejected)} orders cannot move to {target}: {', '.join(rejected[:20])}",
+                messages.WARNING,
+            )
+    
+    @admin.action(description='Mark selected orders as processing')
+    def mark_processing(self, request, queryset):
+        self._transition(request, queryset, 'processing')
+    
+    @admin.action(description='Mark selected orders as shipped')
+    def mark_shipped(self, request, queryset):
+        self._transition(request, queryset, 'shipped')
+    
+    @admin.action(description='Mark selected orders as delivered')
+    def mark_delivered(self, request, queryset):
+        self._transition(request, queryset, 'delivered')
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    readonly_fields = ('product', 'product_name', 'product_price', 'quantity', 'total_price')
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(LargeTableAdmin):
+    list_display = ('order_number', 'user_id', 'order_status', 'payment_status', 'total_price', 'created_at', 'archived_at')
+    list_filter = ('order_status', 'payment_status')
+    search_fields = ('order_number__exact',)
+    inlines = [ArchivedOrderItemInline]
     
     def has_add_permission(self, request):
-        return False 
\ No newline at end of file
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
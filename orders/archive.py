@@ -0,0 +1,109 @@
+"""
+Moving finished orders to the archive tables.
+
+Delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are
+copied, with their items, payments and refunds, to the Archived* tables on
+ORDER_ARCHIVE_DATABASE and then removed from the hot tables, one batch per
+transaction. Ids are kept, so an archived order is still found under its
+old URL. Each shard's orders are archived in turn, see
+ecommerce_api.sharding.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+
+from ecommerce_api import sharding
+from events.outbox import record_many
+from payments.models import ArchivedPayment, ArchivedRefund, Payment, Refund
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+# Hot model -> archive model, parents before children
+ARCHIVE_MODELS = (
+    (Order, ArchivedOrder),
+    (OrderItem, ArchivedOrderItem),
+    (Payment, ArchivedPayment),
+    (Refund, ArchivedRefund),
+)
+
+
+def archivable(older_than=None, now=None):
+    """Orders due for the archive."""
+    if older_than is None:
+        older_than = timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+    cutoff = (now or timezone.now()) - older_than
+    return Order.objects.filter(order_status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_orders(older_than=None, batch_size=500, limit=None, progress=None):
+    """
+    Archive due orders in batches of `batch_size`; returns the number archived.
+
+    `progress(archived_so_far)` is called after every batch.
+    """
+    total = 0
+    for due in archivable(older_than).scatter():
+        while limit is None or total < limit:
+            size = batch_size if limit is None else min(batch_size, limit - total)
+            ids = list(due.order_by('pk').values_list('pk', flat=True)[:size])
+            if not ids:
+                break
+            total += archive_batch(ids, using=due.db)
+            if progress:
+                progress(total)
+    return total
+
+
+def archive_batch(order_ids, using=None):
+    """Copy one batch of orders on database `using` to the archive and delete them from the hot tables."""
+    archive_db = router.db_for_write(ArchivedOrder)
+    hot_db = using or router.db_for_write(Order)
+    # The archive commits first: if the hot commit then fails the orders are
+    # still hot, and the next run's copy skips the rows already archived
+    with sharding.atomic(hot_db, archive_db):
+        # Recheck the status under lock, it may have changed since the ids were read
+        ids = list(
+            Order.objects.using(hot_db).select_for_update()
+            .filter(pk__in=order_ids, order_status__in=ARCHIVABLE_STATUSES)
+            .values_list('pk', flat=True)
+        )
+        if not ids:
+            return 0
+        rows = {
+            Order: Order.objects.using(hot_db).filter(pk__in=ids),
+            OrderItem: OrderItem.objects.using(hot_db).filter(order_id__in=ids),
+            Payment: Payment.objects.using(hot_db).filter(order_id__in=ids),
+            Refund: Refund.objects.using(hot_db).filter(order_id__in=ids),
+        }
+        for model, archive_model in ARCHIVE_MODELS:
+            archive_model.objects.bulk_create(
+                [_archived_copy(instance, archive_model) for instance in rows[model]],
+                ignore_conflicts=True,
+            )
+        record_many([('order', pk, 'order.archived', {'id': pk}) for pk in ids])
+        # Children first. A raw DELETE skips the per-row outbox events of a
+        # model delete; the order.archived events above stand in for them.
+        for model, _ in reversed(ARCHIVE_MODELS):
+            rows[model]._raw_delete(hot_db)
+    return len(ids)
+
+
+def _archived_copy(instance, archive_model):
+    return archive_model(**{
+        field.attname: getattr(instance, field.attname)
+        for field in archive_model._meta.concrete_fields
+        if hasattr(instance, field.attname)
+    })
+
+
+class ArchiveUnion(sharding.MergedSequence):
+    """
+    Hot orders, from every shard, and archived orders as one read-only
+    sequence, newest first; see MergedSequence.
+    """
+
+    def __init__(self, hot, archived):
+        super().__init__([*hot.scatter(), archived], ordering=('-created_at', '-pk'))
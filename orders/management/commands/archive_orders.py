@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import archive
+
+
+class Command(BaseCommand):
+    """
+    Move delivered and cancelled orders past the retention age to the archive.
+
+    Each batch is copied and deleted in its own transaction, so the command
+    can be interrupted and rerun at any point.
+    """
+
+    help = 'Archive old delivered and cancelled orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Archive orders created more than this many days ago',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many orders')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that are due')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        older_than = timedelta(days=options['days'])
+        if options['dry_run']:
+            self.stdout.write(f"{archive.archivable(older_than).count()} orders are due for the archive")
+            return
+
+        started = time.perf_counter()
+
+        def progress(total):
+            self.stdout.write(f"  {total} orders archived ({time.perf_counter() - started:.1f}s)")
+
+        total = archive.archive_orders(
+            older_than=older_than,
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f"Archived {total} orders in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+from django.utils.crypto import get_random_string
+
+from ecommerce_api.ids import new_id
+
+SCHEMES = {
+    'random': lambda: f"ORD-{get_random_string(16).upper()}",
+    'time-ordered': lambda: new_id('ORD'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Compare random and time-ordered order numbers on a unique index.
+
+    For each scheme a scratch table with a unique order number column is
+    filled in batches, timing the inserts, and the size of the index is
+    read back. Random keys land on arbitrary index pages, which splits
+    pages throughout the index; time-ordered keys only ever append to its
+    last page. The gap widens once the index no longer fits in memory, so
+    use a large `--rows` against the production database engine.
+    """
+
+    help = 'Benchmark insert throughput and index size of random vs time-ordered order numbers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to benchmark against')
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        for scheme, generate in SCHEMES.items():
+            started = time.perf_counter()
+            [generate() for _ in range(10000)]
+            generate_us = (time.perf_counter() - started) / 10000 * 1e6
+
+            table = f"benchmark_order_numbers_{scheme.replace('-', '_')}"
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                cursor.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, order_number VARCHAR(20) NOT NULL)")
+                cursor.execute(f"CREATE UNIQUE INDEX {table}_number ON {table} (order_number)")
+            try:
+                elapsed = self._fill(connection, table, generate, options)
+                size = self._index_size(connection, f"{table}_number")
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {table}")
+            size_text = f"index {size / 1024 / 1024:.1f} MiB" if size is not None else "index size n/a"
+            self.stdout.write(
+                f"{scheme:>12}: {options['rows'] / elapsed:.0f} inserts/s, "
+                f"{generate_us:.2f}us per number, {size_text}"
+            )
+
+    def _fill(self, connection, table, generate, options):
+        rows, batch_size = options['rows'], options['batch_size']
+        sql = f"INSERT INTO {table} (id, order_number) VALUES (%s, %s)"
+        started = time.perf_counter()
+        for start in range(0, rows, batch_size):
+            batch = [(pk, generate()) for pk in range(start, min(start + batch_size, rows))]
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+        return time.perf_counter() - started
+
+    def _index_size(self, connection, index):
+        """Bytes used by `index`, or None where the engine does not report it."""
+        queries = {
+            'sqlite': "SELECT SUM(pgsize) FROM dbstat WHERE name = %s",
+            'postgresql': "SELECT pg_relation_size(to_regclass(%s))",
+        }
+        if connection.vendor not in queries:
+            return None
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(queries[connection.vendor], [index])
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,90 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.models import Order
+from orders.transitions import bulk_transition
+
+STATUSES = {choice for choice, _ in Order.ORDER_STATUS_CHOICES}
+
+
+class Command(BaseCommand):
+    """
+    Ingest a warehouse CSV of tracking numbers and status changes.
+
+    Columns: `order_number`, `tracking_number` and optionally `status`
+    (defaults to --status). Rows are applied in chunks through the same
+    bulk transition as POST /api/orders/bulk-transition/; rejected rows are
+    listed, or written as CSV with --rejects.
+    """
+
+    help = 'Apply tracking numbers and status changes from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, or '-' for stdin")
+        parser.add_argument('--status', default='shipped', choices=sorted(STATUSES),
+                            help='Status for rows without a status column')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per transaction')
+        parser.add_argument('--rejects', help='Write rejected rows with the reason to this CSV file')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        source = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        started = time.perf_counter()
+        summary, rejects = {}, []
+        try:
+            reader = csv.DictReader(source)
+            if not reader.fieldnames or 'order_number' not in reader.fieldnames:
+                raise CommandError('The CSV needs an order_number column')
+            chunk = []
+            for line, row in enumerate(reader, start=2):
+                update = {
+                    'order_number': (row.get('order_number') or '').strip(),
+                    'tracking_number': (row.get('tracking_number') or '').strip(),
+                    'status': (row.get('status') or '').strip() or options['status'],
+                }
+                if not update['order_number'] or update['status'] not in STATUSES:
+                    rejects.append({**update, 'line': line, 'result': 'invalid_row'})
+                    continue
+                chunk.append((line, update))
+                if len(chunk) >= options['chunk_size']:
+                    self._apply(chunk, summary, rejects)
+                    chunk = []
+            if chunk:
+                self._apply(chunk, summary, rejects)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        summary['invalid_row'] = sum(1 for reject in rejects if reject['result'] == 'invalid_row')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            ', '.join(f"{count} {result}" for result, count in sorted(summary.items()) if count)
+            + f" in {elapsed:.2f}s"
+        )
+        if rejects:
+            self._report(sorted(rejects, key=lambda reject: reject['line']), options['rejects'])
+
+    def _apply(self, chunk, summary, rejects):
+        results = bulk_transition(update for _, update in chunk)
+        for (line, update), result in zip(chunk, results):
+            summary[result['result']] = summary.get(result['result'], 0) + 1
+            if result['result'] not in ('updated', 'unchanged'):
+                rejects.append({**update, 'line': line, 'result': result['result']})
+
+    def _report(self, rejects, path):
+        fields = ['line', 'order_number', 'tracking_number', 'status', 'result']
+        if path:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rejects)
+            self.stdout.write(f"{len(rejects)} rejected rows written to {path}")
+            return
+        for reject in rejects:
+            self.stdout.write(
+                f"  line {reject['line']}: {reject['order_number'] or '-'} -> {reject['status']}: {reject['result']}"
+            )
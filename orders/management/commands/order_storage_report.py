@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, router
+
+from ecommerce_api import sharding
+from orders.archive import ARCHIVE_MODELS
+
+
+class Command(BaseCommand):
+    """
+    Report rows and on-disk size of the hot order tables, per shard, and
+    their archives.
+
+    Sizes come from pg_total_relation_size on PostgreSQL, information_schema
+    on MySQL and the dbstat table on SQLite builds that include it.
+    """
+
+    help = 'Report hot and archived sizes of the order, item, payment and refund tables'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'table':<28} {'database':<10} {'rows':>10} {'size':>12}")
+        totals = {'hot': [0, 0], 'archive': [0, 0]}
+        for pair in ARCHIVE_MODELS:
+            for tier, model in zip(('hot', 'archive'), pair):
+                aliases = sharding.shards() if sharding.is_sharded(model) else [router.db_for_read(model)]
+                for alias in aliases:
+                    rows = model.objects.using(alias).count()
+                    size = self._table_bytes(connections[alias], model._meta.db_table)
+                    totals[tier][0] += rows
+                    totals[tier][1] += size or 0
+                    self.stdout.write(
+                        f"{model._meta.db_table:<28} {alias:<10} {rows:>10} {self._format(size):>12}"
+                    )
+        for tier, (rows, size) in totals.items():
+            self.stdout.write(f"{tier + ' total':<28} {'':<10} {rows:>10} {self._format(size):>12}")
+
+    def _table_bytes(self, connection, table):
+        queries = {
+            'postgresql': ('SELECT pg_total_relation_size(%s)', [table]),
+            'mysql': (
+                'SELECT data_length + index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            ),
+            'sqlite': ('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table]),
+        }
+        if connection.vendor not in queries:
+            return None
+        sql, params = queries[connection.vendor]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+        except DatabaseError:
+            # e.g. SQLite compiled without the dbstat virtual table
+            return None
+        return int(row[0]) if row and row[0] is not None else None
+
+    def _format(self, size):
+        if size is None:
+            return '-'
+        for unit in ('B', 'KiB', 'MiB', 'GiB'):
+            if size < 1024 or unit == 'GiB':
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
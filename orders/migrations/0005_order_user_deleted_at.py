@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_sharded_relations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='user_deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
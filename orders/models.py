@@ -1,10 +1,59 @@
 from django.db import models
-from django.utils.crypto import get_random_string
+from django.db.models import DecimalField, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from users.models import User, Address
 from products.models import Product
+from ecommerce_api.ids import new_id
+from ecommerce_api.sharding import ShardedQuerySet
+from events.models import OutboxMixin
 
 
-class Order(models.Model):
+class OrderQuerySet(ShardedQuerySet):
+    """Orders loaded with what serializing them reads, in a fixed number of queries."""
+    
+    def with_items(self):
+        """Prefetch the items and annotate their unit count and total from the database."""
+        item_model = self.model._meta.get_field('items').related_model
+        items = item_model.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        money = DecimalField(max_digits=12, decimal_places=2)
+        return self.prefetch_related(
+            Prefetch('items', queryset=item_model.objects.order_by('pk'))
+        ).annotate(
+            annotated_items_count=Coalesce(
+                Subquery(items.annotate(total=Sum('quantity')).values('total')), Value(0)
+            ),
+            annotated_items_subtotal=Coalesce(
+                Subquery(items.annotate(total=Sum('total_price')).values('total'), output_field=money),
+                Value(0), output_field=money,
+            ),
+        )
+    
+    def for_listing(self):
+        """with_items() plus the addresses, joined in, and the user, read from the default database."""
+        return self.select_related('shipping_address', 'billing_address').prefetch_related('user').with_items()
+    
+    def live(self):
+        """Orders whose user is not marked for deletion, see api.deletion."""
+        return self.filter(user_deleted_at__isnull=True)
+
+
+class OrderTotalsMixin:
+    """Item totals, taken from the with_items() annotations when the order was loaded with them."""
+    
+    @property
+    def items_count(self):
+        if hasattr(self, 'annotated_items_count'):
+            return self.annotated_items_count
+        return sum(item.quantity for item in self.items.all())
+    
+    @property
+    def items_subtotal(self):
+        if hasattr(self, 'annotated_items_subtotal'):
+            return self.annotated_items_subtotal
+        return sum((item.total_price for item in self.items.all()), 0)
+
+
+class Order(OrderTotalsMixin, OutboxMixin, models.Model):
     """Order model."""
     
     ORDER_STATUS_CHOICES = (
@@ -23,7 +72,10 @@ class Order(models.Model):
         ('refunded', 'Refunded'),
     )
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
+    # Stored on the user's shard, see ecommerce_api.sharding
+    shard_user = 'user'
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name='orders')
     order_number = models.CharField(max_length=20, unique=True, editable=False)
     shipping_address = models.ForeignKey(
         Address, on_delete=models.SET_NULL, null=True, related_name='shipping_orders'
@@ -39,11 +91,16 @@ class Order(models.Model):
     payment_id = models.CharField(max_length=100, null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
     tracking_number = models.CharField(max_length=100, null=True, blank=True)
+    # Set with the user's deleted_at, since the users table is not on the order's shard
+    user_deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         ordering = ('-created_at',)
+        indexes = [models.Index(fields=['created_at'], name='order_created_idx')]
     
     def __str__(self):
         return f"Order #{self.order_number}"
@@ -54,30 +111,94 @@ class Order(models.Model):
         super().save(*args, **kwargs)
     
     def _generate_order_number(self):
-        """Generate a unique order number."""
-        return f"ORD-{get_random_string(16).upper()}"
-    
-    @property
-    def items_count(self):
-        return sum(item.quantity for item in self.items.all())
+        """Generate a unique, time-ordered order number (see ecommerce_api.ids)."""
+        return new_id('ORD')
 
 
-class OrderItem(models.Model):
+class OrderItem(OutboxMixin, models.Model):
     """Order item model."""
     
+    outbox_aggregate = 'order'
+    shard_user = 'order__user'
+    
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, db_constraint=False)
     product_name = models.CharField(max_length=255)  # Store the name in case the product is deleted
     product_price = models.DecimalField(max_digits=10, decimal_places=2)  # Price at the time of purchase
     quantity = models.PositiveIntegerField(default=1)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    objects = ShardedQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.product_name} ({self.quantity}) in Order #{self.order.order_number}"
     
+    def outbox_aggregate_id(self):
+        return self.order_id
+    
     
     def save(self, *args, **kwargs):
         # Calculate total price if not already set
         if not self.total_price:
             self.total_price = self.product_price * self.quantity
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs) 
+
+class ArchivedOrder(OrderTotalsMixin, models.Model):
+    """
+    Delivered or cancelled order moved out of the hot tables by `manage.py archive_orders`.
+    
+    Keeps the id and fields of the Order. The archive tables live on
+    settings.ORDER_ARCHIVE_DATABASE (see orders.routers), so references to
+    hot tables carry no database constraint.
+    """
+    
+    is_archive = True
+    
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    order_number = models.CharField(max_length=20, unique=True)
+    shipping_address = models.ForeignKey(
+        Address, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    billing_address = models.ForeignKey(
+        Address, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    order_status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=50, null=True, blank=True)
+    payment_id = models.CharField(max_length=100, null=True, blank=True)
+    notes = models.TextField(null=True, blank=True)
+    tracking_number = models.CharField(max_length=100, null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = OrderQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ('-created_at',)
+        indexes = [models.Index(fields=['user', 'created_at'], name='archived_order_user_idx')]
+    
+    def __str__(self):
+        return f"Archived order #{self.order_number}"
+
+
+class ArchivedOrderItem(models.Model):
+    """Line of an ArchivedOrder."""
+    
+    is_archive = True
+    
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    product_name = models.CharField(max_length=255)
+    product_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    def __str__(self):
+        return f"{self.product_name} ({self.quantity}) in archived order {self.order_id}"
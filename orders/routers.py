@@ -0,0 +1,41 @@
+from django.conf import settings
+
+
+class ArchiveRouter:
+    """
+    Send the archive tables (models with `is_archive = True`) to
+    settings.ORDER_ARCHIVE_DATABASE and keep everything else off it.
+    """
+    
+    def _alias(self):
+        return getattr(settings, 'ORDER_ARCHIVE_DATABASE', 'default')
+    
+    def db_for_read(self, model, **hints):
+        if getattr(model, 'is_archive', False):
+            return self._alias()
+        return None
+    
+    db_for_write = db_for_read
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Archive rows point at hot users, addresses and products without constraints
+        if getattr(obj1, 'is_archive', False) or getattr(obj2, 'is_archive', False):
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = self._alias()
+        if model_name is not None and self._is_archive_model(app_label, model_name):
+            return db == alias
+        if db == alias and alias != 'default':
+            return False
+        return None
+    
+    def _is_archive_model(self, app_label, model_name):
+        # Migrations pass historical models, which lack class attributes; look up the real one
+        from django.apps import apps
+        
+        try:
+            return getattr(apps.get_model(app_label, model_name), 'is_archive', False)
+        except LookupError:
+            return False
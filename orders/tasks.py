@@ -0,0 +1,24 @@
+import logging
+
+from jobs.queue import task
+from products import recommendations
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+
+@task('orders.order_placed')
+def order_placed(order_id):
+    """Side effects of a new order that do not need to hold up the checkout request."""
+    order = Order.objects.for_id(order_id).get(pk=order_id)
+    logger.info("Order %s placed by %s", order.order_number, order.user_id)
+    return {'order_number': order.order_number}
+
+
+@task('orders.order_paid')
+def order_paid(order_id):
+    """Side effects of a captured payment."""
+    order = Order.objects.for_id(order_id).get(pk=order_id)
+    logger.info("Order %s paid", order.order_number)
+    related = recommendations.record_order(order.pk)
+    return {'order_number': order.order_number, 'related_added': related}
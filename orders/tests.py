@@ -0,0 +1,73 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from payments.models import Payment
+from products.models import Category, Product
+from users.models import Address, User
+
+
+class OrderListQueryCountTests(TestCase):
+    """Order listings run the same number of queries whatever the number of orders."""
+
+    # Orders are on the user's shard when SHARD_COUNT is set
+    databases = '__all__'
+    URLS = (
+        '/api/orders/',
+        '/api/orders/?expand=payments',
+        '/api/orders/?expand=user,payments',
+        '/api/orders/?fields=id,order_number,items',
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pw123456')
+        self.staff = User.objects.create_user(email='staff@example.com', password='pw123456', is_staff=True)
+        self.address = Address.objects.create(
+            user=self.user, address_type='shipping', street_address='1 Main St', city='City',
+            state='State', country='Country', postal_code='12345',
+        )
+        category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(category=category, name=f'Book {i}', description='-', price='10.00', stock=100)
+            for i in range(3)
+        ]
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                user=self.user, shipping_address=self.address, billing_address=self.address, total_price='30.00'
+            )
+            for product in self.products:
+                OrderItem.objects.create(
+                    order=order, product=product, product_name=product.name, product_price=product.price,
+                    quantity=1, total_price=product.price,
+                )
+            Payment.objects.create(user=self.user, order=order, amount='30.00', payment_method='paypal')
+
+    def query_counts(self, client):
+        counts = {}
+        for url in self.URLS:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def assert_constant(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        self.add_orders(1)
+        single = self.query_counts(client)
+        self.add_orders(7)
+        for url in self.URLS:
+            with self.assertNumQueries(single[url]):
+                response = client.get(url)
+            self.assertEqual(response.data['count'], 8, url)
+
+    def test_customer_listing(self):
+        self.assert_constant(self.user)
+
+    def test_staff_listing(self):
+        self.assert_constant(self.staff)
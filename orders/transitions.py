@@ -0,0 +1,117 @@
+"""
+Bulk order status transitions for fulfillment.
+
+A batch of `{'id' or 'order_number', 'status', 'tracking_number'}` updates
+is checked against ALLOWED_TRANSITIONS and applied with one conditional
+UPDATE per (current status, target status) group, rather than one
+serializer save per order. Every change is recorded as an
+`order.status_changed` outbox event in the same transaction, which spans
+all order shards (see ecommerce_api.sharding).
+"""
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+
+from ecommerce_api import sharding
+from events.outbox import record_many
+from .models import Order
+
+ALLOWED_TRANSITIONS = {
+    'pending': {'processing'},
+    'processing': {'shipped'},
+    'shipped': {'delivered'},
+}
+
+# Orders per UPDATE statement
+CHUNK_SIZE = 500
+
+
+def bulk_transition(updates):
+    """
+    Apply `updates` and return one result dict per update, in order.
+
+    A result has the order's `id` and `order_number` when it was found and a
+    `result` of 'updated', 'unchanged', 'not_found', 'invalid_transition'
+    or 'duplicate'.
+    """
+    updates = [dict(update) for update in updates]
+    ids = {update['id'] for update in updates if update.get('id') is not None}
+    numbers = {update['order_number'] for update in updates if update.get('order_number')}
+
+    with sharding.atomic(*sharding.shards()):
+        # Order numbers do not tell the shard, so every shard is asked
+        rows = [
+            row
+            for orders in Order.objects.select_for_update()
+            .filter(Q(pk__in=ids) | Q(order_number__in=numbers)).scatter()
+            for row in orders.values('pk', 'order_number', 'order_status', 'tracking_number')
+        ]
+        by_id = {row['pk']: row for row in rows}
+        by_number = {row['order_number']: row for row in rows}
+
+        results = []
+        groups = {}
+        seen = set()
+        for update in updates:
+            row = by_id.get(update.get('id')) or by_number.get(update.get('order_number'))
+            result = _check(update, row, seen)
+            results.append(result)
+            if result['result'] == 'updated':
+                groups.setdefault((row['order_status'], update['status']), []).append(
+                    (row['pk'], update.get('tracking_number') or None)
+                )
+
+        now = timezone.now()
+        events = []
+        for (current, target), changes in groups.items():
+            for start in range(0, len(changes), CHUNK_SIZE):
+                chunk = changes[start:start + CHUNK_SIZE]
+                _apply(current, target, chunk, now)
+                events.extend(
+                    ('order', pk, 'order.status_changed', {
+                        'previous_status': current,
+                        'order_status': target,
+                        'tracking_number': tracking_number or by_id[pk]['tracking_number'],
+                    })
+                    for pk, tracking_number in chunk
+                )
+        record_many(events)
+    return results
+
+
+def _check(update, row, seen):
+    result = {
+        'id': row['pk'] if row else update.get('id'),
+        'order_number': row['order_number'] if row else update.get('order_number'),
+        'status': update['status'],
+    }
+    if row is None:
+        return {**result, 'result': 'not_found'}
+    if row['pk'] in seen:
+        return {**result, 'result': 'duplicate', 'error': 'Order appears more than once in the batch'}
+    seen.add(row['pk'])
+
+    current, target = row['order_status'], update['status']
+    tracking_number = update.get('tracking_number') or None
+    if current == target:
+        if tracking_number and tracking_number != row['tracking_number']:
+            # Same status, new tracking number: still an update
+            return {**result, 'result': 'updated', 'previous_status': current}
+        return {**result, 'result': 'unchanged'}
+    if target not in ALLOWED_TRANSITIONS.get(current, ()):
+        return {
+            **result,
+            'result': 'invalid_transition',
+            'error': f"Cannot change status from '{current}' to '{target}'",
+        }
+    return {**result, 'result': 'updated', 'previous_status': current}
+
+
+def _apply(current, target, changes, now):
+    """One UPDATE, per shard, for orders moving from `current` to `target`, with per-order tracking numbers."""
+    fields = {'order_status': target, 'updated_at': now}
+    tracking = [When(pk=pk, then=Value(number)) for pk, number in changes if number]
+    if tracking:
+        fields['tracking_number'] = Case(*tracking, default=F('tracking_number'), output_field=CharField())
+    # The status guard keeps a concurrent change from being overwritten
+    for orders in Order.objects.filter(pk__in=[pk for pk, _ in changes], order_status=current).scatter():
+        orders.update(**fields)
@@ -1,18 +1,25 @@
 from django.contrib import admin
+from ecommerce_api.admin import LargeTableAdmin, register_user_owned
 from .models import Payment, Refund
 
 
-@admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+@register_user_owned(Payment)
+class PaymentAdmin(LargeTableAdmin):
     list_display = ('payment_id', 'user', 'order', 'amount', 'payment_method', 'status', 'created_at')
     list_filter = ('status', 'payment_method', 'created_at')
-    search_fields = ('payment_id', 'user__email', 'order__order_number')
-    readonly_fields = ('payment_id', 'user', 'order', 'amount', 'currency', 'payment_method', 'created_at')
+    list_select_related = ('user', 'order')
+    search_fields = (
+        'payment_id__exact', 'gateway_reference__exact', 'user__email__exact', 'order__order_number__exact'
+    )
+    readonly_fields = (
+        'payment_id', 'user', 'order', 'amount', 'currency', 'payment_method', 'gateway_reference', 'created_at'
+    )
 
 
-@admin.register(Refund)
-class RefundAdmin(admin.ModelAdmin):
+@register_user_owned(Refund)
+class RefundAdmin(LargeTableAdmin):
     list_display = ('order', 'amount', 'status', 'created_at')
     list_filter = ('status', 'created_at')
-    search_fields = ('order__order_number', 'reason')
-    readonly_fields = ('order', 'payment', 'amount', 'created_at') 
\ No newline at end of file
+    list_select_related = ('order',)
+    search_fields = ('order__order_number__exact', 'refund_id__exact', 'gateway_reference__exact')
+    readonly_fields = ('order', 'payment', 'amount', 'refund_id', 'gateway_reference', 'created_at') 
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Payment gateway clients.
+
+The gateway used by the payment tasks is configured with the
+PAYMENT_GATEWAY setting. `FakeGateway` stands in for a real provider in
+development and tests, with configurable latency, decline and error rates.
+
+Gateways take an `idempotency_key` with every capture and refund: a
+retried call with the same key (say after a timeout whose request did go
+through) returns the first call's reference instead of charging or
+refunding twice.
+"""
+import random
+import time
+import uuid
+from threading import Lock
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class GatewayError(Exception):
+    """Transient gateway failure; the operation may be retried."""
+
+
+class PaymentDeclined(Exception):
+    """The gateway refused the operation; retrying will not help."""
+
+
+class FakeGateway:
+    """Local gateway that sleeps `latency` seconds and fails at the given rates."""
+    
+    # References by idempotency key, shared by the instances of the process
+    _references = {}
+    _references_lock = Lock()
+    
+    def __init__(self, latency=0.0, failure_rate=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+    
+    def _call(self, prefix, idempotency_key):
+        if self.latency:
+            time.sleep(self.latency)
+        key = (prefix, idempotency_key)
+        with self._references_lock:
+            if key in self._references:
+                return self._references[key]
+        roll = self._random.random()
+        if roll < self.error_rate:
+            raise GatewayError("Gateway timed out")
+        if roll < self.error_rate + self.failure_rate:
+            raise PaymentDeclined("Declined by gateway")
+        with self._references_lock:
+            return self._references.setdefault(key, f"{prefix}-{uuid.uuid4().hex[:16].upper()}")
+    
+    def capture(self, payment, idempotency_key):
+        """Capture `payment.amount`; returns the gateway transaction reference."""
+        return self._call('TXN', idempotency_key)
+    
+    def refund(self, refund, idempotency_key):
+        """Refund `refund.amount`; returns the gateway refund reference."""
+        return self._call('RFD', idempotency_key)
+
+
+def get_gateway():
+    config = getattr(settings, 'PAYMENT_GATEWAY', {})
+    backend = import_string(config.get('BACKEND', 'payments.gateway.FakeGateway'))
+    return backend(**config.get('OPTIONS', {}))
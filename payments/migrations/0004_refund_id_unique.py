@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refund',
+            name='refund_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
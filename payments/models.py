@@ -1,11 +1,18 @@
 from django.db import models
 from users.models import User
-from orders.models import Order
+from orders.models import ArchivedOrder, Order
+from ecommerce_api.ids import new_id
+from ecommerce_api.sharding import ShardedQuerySet
+from events.models import OutboxMixin
 
 
-class Payment(models.Model):
+class Payment(OutboxMixin, models.Model):
     """Payment model."""
     
+    outbox_aggregate = 'order'
+    # Stored on the user's shard, see ecommerce_api.sharding
+    shard_user = 'user'
+    
     PAYMENT_STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('completed', 'Completed'),
@@ -19,26 +26,45 @@ class Payment(models.Model):
         ('bank_transfer', 'Bank Transfer'),
     )
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name='payments')
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payments')
     payment_id = models.CharField(max_length=100, unique=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, default='USD')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
+    # The gateway's transaction reference, set once captured
+    gateway_reference = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['created_at'], name='payment_created_idx'),
+            models.Index(fields=['status', 'updated_at'], name='payment_status_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Payment {self.payment_id} - {self.status}"
+    
+    def save(self, *args, **kwargs):
+        if not self.payment_id:
+            self.payment_id = new_id('PAY')
+        super().save(*args, **kwargs)
+    
+    def outbox_aggregate_id(self):
+        return self.order_id
 
 
-class Refund(models.Model):
+class Refund(OutboxMixin, models.Model):
     """Refund model."""
     
+    outbox_aggregate = 'order'
+    shard_user = 'order__user'
+    
     REFUND_STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -51,9 +77,67 @@ class Refund(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reason = models.TextField()
     status = models.CharField(max_length=20, choices=REFUND_STATUS_CHOICES, default='pending')
-    refund_id = models.CharField(max_length=100, null=True, blank=True)
+    refund_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    # The gateway's refund reference, set once refunded
+    gateway_reference = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"Refund for Order #{self.order.order_number} - {self.status}"
+    
+    def save(self, *args, **kwargs):
+        if not self.refund_id:
+            self.refund_id = new_id('RFN')
+        super().save(*args, **kwargs)
+    
+    def outbox_aggregate_id(self):
+        return self.order_id 
+
+
+class ArchivedPayment(models.Model):
+    """Payment of an ArchivedOrder, see orders.archive."""
+    
+    is_archive = True
+    
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='payments')
+    payment_id = models.CharField(max_length=100, unique=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default='USD')
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHOD_CHOICES)
+    status = models.CharField(max_length=20, choices=Payment.PAYMENT_STATUS_CHOICES)
+    gateway_reference = models.CharField(max_length=100, null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ('-created_at',)
+    
+    def __str__(self):
+        return f"Archived payment {self.payment_id} - {self.status}"
+
+
+class ArchivedRefund(models.Model):
+    """Refund of an ArchivedOrder, see orders.archive."""
+    
+    is_archive = True
+    
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='refunds')
+    payment = models.ForeignKey(
+        ArchivedPayment, on_delete=models.CASCADE, related_name='refunds', null=True, blank=True
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    reason = models.TextField()
+    status = models.CharField(max_length=20, choices=Refund.REFUND_STATUS_CHOICES)
+    refund_id = models.CharField(max_length=100, null=True, blank=True)
+    gateway_reference = models.CharField(max_length=100, null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
     def __str__(self):
-        return f"Refund for Order #{self.order.order_number} - {self.status}" 
\ No newline at end of file
+        return f"Archived refund for order {self.order_id} - {self.status}"
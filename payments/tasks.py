@@ -0,0 +1,98 @@
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from ecommerce_api import sharding
+from events.outbox import record_instance
+from jobs.queue import enqueue, task
+from orders.models import Order
+from .gateway import PaymentDeclined, get_gateway
+from .models import Payment, Refund
+
+
+@task('payments.capture')
+def capture_payment(payment_id):
+    """Capture a pending payment with the gateway and mark the order paid."""
+    payment = Payment.objects.for_id(payment_id).get(pk=payment_id)
+    if payment.status != 'pending':
+        return {'status': payment.status}
+    
+    # Transient GatewayErrors propagate so the job is retried; the retry
+    # sends the same idempotency key, so the gateway captures only once
+    try:
+        reference = get_gateway().capture(payment, idempotency_key=payment.payment_id)
+    except PaymentDeclined as e:
+        with sharding.atomic(payment._state.db):
+            if Payment.objects.for_id(payment.pk).filter(pk=payment.pk, status='pending').update(status='failed'):
+                payment.status = 'failed'
+                record_instance(payment, 'updated')
+                # An order another payment has settled keeps its status
+                _update_order(payment, 'pending', payment_status='failed')
+        return {'status': 'failed', 'error': str(e)}
+    
+    with sharding.atomic(payment._state.db):
+        updated = Payment.objects.for_id(payment.pk).filter(pk=payment.pk, status='pending').update(
+            status='completed', gateway_reference=reference
+        )
+        if not updated:
+            return {'status': Payment.objects.for_id(payment.pk).get(pk=payment.pk).status}
+        payment.status = 'completed'
+        payment.gateway_reference = reference
+        record_instance(payment, 'updated')
+        # Only the payment status is expected to be unchanged; a cancelled
+        # or already shipped order keeps its order status
+        order = _update_order(
+            payment, 'pending', payment_status='paid',
+            order_status=Case(When(order_status='pending', then=Value('processing')), default=F('order_status')),
+        )
+        if order is not None:
+            enqueue('orders.order_paid', {'order_id': order.pk}, user=payment.user)
+    return {'status': 'completed', 'reference': reference}
+
+
+@task('payments.process_refund')
+def process_refund(refund_id):
+    """Send a pending refund to the gateway."""
+    refund = Refund.objects.for_id(refund_id).select_related('order').get(pk=refund_id)
+    if refund.status != 'pending':
+        return {'status': refund.status}
+    
+    try:
+        reference = get_gateway().refund(refund, idempotency_key=refund.refund_id)
+    except PaymentDeclined as e:
+        with sharding.atomic(refund._state.db):
+            if Refund.objects.for_id(refund.pk).filter(pk=refund.pk, status='pending').update(status='rejected'):
+                refund.status = 'rejected'
+                record_instance(refund, 'updated')
+        return {'status': 'rejected', 'error': str(e)}
+    
+    with sharding.atomic(refund._state.db):
+        updated = Refund.objects.for_id(refund.pk).filter(pk=refund.pk, status='pending').update(
+            status='completed', gateway_reference=reference
+        )
+        if not updated:
+            return {'status': Refund.objects.for_id(refund.pk).get(pk=refund.pk).status}
+        refund.status = 'completed'
+        refund.gateway_reference = reference
+        record_instance(refund, 'updated')
+        if refund.amount >= refund.order.total_price:
+            if refund.payment_id is not None:
+                payments = Payment.objects.using(refund._state.db).filter(pk=refund.payment_id, status='completed')
+                if payments.update(status='refunded', updated_at=timezone.now()):
+                    record_instance(Payment.objects.using(refund._state.db).get(pk=refund.payment_id), 'updated')
+            _update_order(refund, 'paid', payment_status='refunded', order_status='refunded')
+    return {'status': 'completed', 'refund_id': refund.refund_id, 'reference': reference}
+
+
+def _update_order(row, expected, **changes):
+    """
+    Apply `changes` to the order of `row` if its payment status is still `expected`.
+
+    A conditional update, so whatever was written to the order since the
+    job started is kept. Returns the updated order, or None if it had moved on.
+    """
+    orders = Order.objects.using(row._state.db).filter(pk=row.order_id, payment_status=expected)
+    if not orders.update(updated_at=timezone.now(), **changes):
+        return None
+    order = Order.objects.using(row._state.db).get(pk=row.order_id)
+    record_instance(order, 'updated')
+    return order
@@ -0,0 +1,41 @@
+from django.test import TestCase, override_settings
+
+from orders.models import Order
+from payments.models import Payment
+from payments.tasks import capture_payment
+from users.models import User
+
+
+class CapturePaymentTests(TestCase):
+    """Capturing a payment only moves its order on from a pending payment status."""
+
+    # Orders and payments are on the user's shard when SHARD_COUNT is set
+    databases = '__all__'
+
+    def setUp(self):
+        user = User.objects.create_user(email='buyer@example.com', password='pw123456')
+        self.order = Order.objects.create(user=user, total_price='10.00')
+        self.payment = Payment.objects.create(user=user, order=self.order, amount='10.00', payment_method='paypal')
+
+    def test_capture_keeps_order_changes_made_meanwhile(self):
+        Order.objects.for_id(self.order.pk).filter(pk=self.order.pk).update(
+            order_status='cancelled', tracking_number='TRACK-1'
+        )
+        self.assertEqual(capture_payment(self.payment.pk)['status'], 'completed')
+        order = Order.objects.for_id(self.order.pk).get(pk=self.order.pk)
+        self.assertEqual(
+            (order.payment_status, order.order_status, order.tracking_number), ('paid', 'cancelled', 'TRACK-1')
+        )
+
+    def test_capture_moves_pending_order_to_processing(self):
+        capture_payment(self.payment.pk)
+        order = Order.objects.for_id(self.order.pk).get(pk=self.order.pk)
+        self.assertEqual((order.payment_status, order.order_status), ('paid', 'processing'))
+
+    @override_settings(PAYMENT_GATEWAY={'OPTIONS': {'failure_rate': 1.0}})
+    def test_decline_leaves_a_paid_order_paid(self):
+        # Settled by another payment of the order
+        Order.objects.for_id(self.order.pk).filter(pk=self.order.pk).update(payment_status='paid')
+        self.assertEqual(capture_payment(self.payment.pk)['status'], 'failed')
+        self.assertEqual(Order.objects.for_id(self.order.pk).get(pk=self.order.pk).payment_status, 'paid')
+        self.assertEqual(Payment.objects.for_id(self.payment.pk).get(pk=self.payment.pk).status, 'failed')
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Category, Product, ProductImage, Review
+from api import deletion
+from ecommerce_api.admin import BackgroundDeletionAdmin, LargeTableAdmin
+from .models import Category, Product, ProductImage, RelatedProduct, Review, StockShard
 
 
 class ProductImageInline(admin.TabularInline):
@@ -7,6 +9,16 @@ class ProductImageInline(admin.TabularInline):
     extra = 1
 
 
+class StockShardInline(admin.TabularInline):
+    model = StockShard
+    extra = 0
+    readonly_fields = ('index', 'quantity')
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class ReviewInline(admin.TabularInline):
     model = Review
     extra = 0
@@ -15,29 +27,68 @@ class ReviewInline(admin.TabularInline):
     
     def has_add_permission(self, request, obj=None):
         return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug', 'is_active', 'created_at')
-    list_filter = ('is_active',)
+class CategoryAdmin(BackgroundDeletionAdmin):
+    list_display = ('name', 'slug', 'parent', 'depth', 'is_active', 'created_at')
+    list_filter = ('is_active', 'depth')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
+    deletion_steps = deletion.CATEGORY_STEPS
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).live()
+    
+    def mark_deleted(self, request, obj):
+        deletion.delete_category(obj, user=request.user)
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ('name', 'category', 'price', 'discount_price', 'stock', 'is_available', 'is_featured')
-    list_filter = ('category', 'is_available', 'is_featured')
-    search_fields = ('name', 'description')
+    list_filter = ('is_available', 'is_featured', 'stock_sharded')
+    list_select_related = ('category',)
+    # Exact and prefix lookups, which the name and slug indexes can serve
+    search_fields = ('name__startswith', 'slug__exact')
+    autocomplete_fields = ('category',)
     prepopulated_fields = {'slug': ('name',)}
-    inlines = [ProductImageInline, ReviewInline]
+    readonly_fields = ('stock_sharded',)
+    inlines = [ProductImageInline, StockShardInline, ReviewInline]
     list_editable = ('price', 'discount_price', 'stock', 'is_available', 'is_featured')
+    actions = ['enable_stock_sharding', 'disable_stock_sharding']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.stock_sharded and 'stock' in form.changed_data:
+            obj.set_stock(form.cleaned_data['stock'])
+    
+    @admin.action(description='Spread stock of selected products over shards')
+    def enable_stock_sharding(self, request, queryset):
+        for product in queryset:
+            product.enable_stock_sharding()
+    
+    @admin.action(description='Fold sharded stock of selected products back into one row')
+    def disable_stock_sharding(self, request, queryset):
+        for product in queryset:
+            product.disable_stock_sharding()
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ('product', 'user', 'rating', 'created_at')
     list_filter = ('rating',)
-    search_fields = ('product__name', 'user__email', 'comment')
-    readonly_fields = ('product', 'user', 'rating', 'comment') 
\ No newline at end of file
+    list_select_related = ('product', 'user')
+    search_fields = ('product__name__startswith', 'user__email__exact')
+    readonly_fields = ('product', 'user', 'rating', 'comment')
+
+
+@admin.register(RelatedProduct)
+class RelatedProductAdmin(LargeTableAdmin):
+    list_display = ('product', 'related', 'score', 'rank')
+    list_select_related = ('product', 'related')
+    search_fields = ('product__name__startswith', 'related__name__startswith')
+    raw_id_fields = ('product', 'related')
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'products' 
\ No newline at end of file
+    name = 'products'
+    
+    def ready(self):
+        from . import facets
+        from .models import Product
+        
+        pre_save.connect(facets.remember_facets, sender=Product, dispatch_uid='facets-pre-save')
+        post_save.connect(facets.update_facets, sender=Product, dispatch_uid='facets-post-save')
+        pre_delete.connect(facets.remember_deleted_facets, sender=Product, dispatch_uid='facets-pre-delete')
+        post_delete.connect(facets.remove_facets, sender=Product, dispatch_uid='facets-post-delete')
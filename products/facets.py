@@ -0,0 +1,212 @@
+"""
+Facet counts for catalog browsing.
+
+Counts for a filtered product queryset are computed with one grouped
+query. The unfiltered catalog is served from the FacetCount table, kept up
+to date by the product signal receivers below and rebuilt from scratch by
+`manage.py rebuild_facet_counts`. Set-based price changes, which bypass the
+receivers, move their products with `recounted()`.
+
+Like the API, the counts cover the live catalog only: products in a
+category marked for deletion are not counted.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .models import Category, FacetCount, Product, StockShard
+
+# Price buckets as (lower bound inclusive, upper bound exclusive); None is open-ended
+PRICE_BUCKETS = (
+    (0, 25),
+    (25, 50),
+    (50, 100),
+    (100, 250),
+    (250, 500),
+    (500, None),
+)
+
+
+def _bucket_label(low, high):
+    return f"{low}-{high}" if high is not None else f"{low}+"
+
+
+def _price_bucket(price):
+    for low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return _bucket_label(low, high)
+    return _bucket_label(*PRICE_BUCKETS[0])
+
+
+def _has_shard_stock():
+    return Exists(StockShard.objects.filter(product=OuterRef('pk'), quantity__gt=0))
+
+
+def facet_keys(product):
+    """The (facet, value) pairs a product is counted under."""
+    return {
+        ('all', 'all'),
+        ('category', str(product.category_id)),
+        ('price', _price_bucket(product.effective_price)),
+        ('in_stock', 'true' if product.available_stock > 0 else 'false'),
+        # Covers promotions as well as the product's own discount price
+        ('on_discount', 'true' if product.discount_percent > 0 else 'false'),
+    }
+
+
+def _is_live(product):
+    return Category.objects.filter(pk=product.category_id, deleted_at__isnull=True).exists()
+
+
+def compute_facets(queryset):
+    """Facet counts for `queryset` in a single query grouped by category."""
+    in_stock = Q(stock_sharded=False, stock__gt=0) | Q(stock_sharded=True, has_shard_stock=True)
+    aggregates = {
+        'total': Count('pk'),
+        'in_stock': Count('pk', filter=in_stock),
+        'on_discount': Count('pk', filter=Q(discount_percent__gt=0)),
+    }
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        bucket = Q(effective_price__gte=low)
+        if high is not None:
+            bucket &= Q(effective_price__lt=high)
+        aggregates[f'price_{index}'] = Count('pk', filter=bucket)
+
+    rows = (
+        queryset.order_by()
+        .annotate(has_shard_stock=_has_shard_stock())
+        .values('category_id')
+        .annotate(**aggregates)
+    )
+    counts = {}
+    for row in rows:
+        total = row['total']
+        _add(counts, ('all', 'all'), total)
+        _add(counts, ('category', str(row['category_id'])), total)
+        _add(counts, ('in_stock', 'true'), row['in_stock'])
+        _add(counts, ('in_stock', 'false'), total - row['in_stock'])
+        _add(counts, ('on_discount', 'true'), row['on_discount'])
+        _add(counts, ('on_discount', 'false'), total - row['on_discount'])
+        for index, (low, high) in enumerate(PRICE_BUCKETS):
+            _add(counts, ('price', _bucket_label(low, high)), row[f'price_{index}'])
+    return counts
+
+
+def stored_facets():
+    """Facet counts for the whole catalog from FacetCount, or None if never built."""
+    counts = {(row.facet, row.value): row.count for row in FacetCount.objects.all()}
+    if ('all', 'all') not in counts:
+        return None
+    return counts
+
+
+def _add(counts, key, amount):
+    counts[key] = counts.get(key, 0) + amount
+
+
+def format_facets(counts):
+    """Turn `{(facet, value): count}` into the API response shape."""
+    category_ids = [int(value) for facet, value in counts if facet == 'category']
+    categories = Category.objects.filter(pk__in=category_ids).values('pk', 'slug', 'name')
+    return {
+        'total': counts.get(('all', 'all'), 0),
+        'category': [
+            {'id': category['pk'], 'slug': category['slug'], 'name': category['name'],
+             'count': counts[('category', str(category['pk']))]}
+            for category in sorted(categories, key=lambda category: category['name'])
+            if counts.get(('category', str(category['pk'])))
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': counts.get(('price', _bucket_label(low, high)), 0)}
+            for low, high in PRICE_BUCKETS
+        ],
+        'in_stock': {value: counts.get(('in_stock', value), 0) for value in ('true', 'false')},
+        'on_discount': {value: counts.get(('on_discount', value), 0) for value in ('true', 'false')},
+    }
+
+
+def apply_delta(removed, added):
+    """Move one product from the `removed` facet keys to the `added` ones."""
+    apply_counts(dict.fromkeys(removed, 1), dict.fromkeys(added, 1))
+
+
+def apply_counts(before, after):
+    """Move products counted as `before` to `after`, both `{(facet, value): count}`."""
+    changes = {key: after.get(key, 0) - before.get(key, 0) for key in before.keys() | after.keys()}
+    changes = {key: change for key, change in changes.items() if change}
+    if not changes:
+        return
+    # Until the table has been built once, the live query serves every request
+    if not FacetCount.objects.filter(facet='all', value='all').exists():
+        return
+    with transaction.atomic():
+        for (facet, value), change in changes.items():
+            updated = FacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + change)
+            if not updated:
+                FacetCount.objects.get_or_create(facet=facet, value=value)
+                FacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + change)
+
+
+def _facets_of(pks, using, batch_size):
+    counts = {}
+    for start in range(0, len(pks), batch_size):
+        batch = Product.objects.using(using).live().filter(pk__in=pks[start:start + batch_size])
+        for key, count in compute_facets(batch).items():
+            _add(counts, key, count)
+    return counts
+
+
+@contextmanager
+def recounted(pks, using=None, batch_size=1000):
+    """
+    Move the products with ids `pks` to the facets they are counted under
+    once the block has run, e.g. around a set-based UPDATE of their prices.
+    """
+    with transaction.atomic(using=using):
+        before = _facets_of(pks, using, batch_size)
+        yield
+        apply_counts(before, _facets_of(pks, using, batch_size))
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute the whole FacetCount table from the live products."""
+    counts = compute_facets(Product.objects.live())
+    FacetCount.objects.all().delete()
+    FacetCount.objects.bulk_create(
+        FacetCount(facet=facet, value=value, count=count) for (facet, value), count in counts.items()
+    )
+    return counts
+
+
+# Signal receivers, connected in ProductsConfig.ready
+
+def remember_facets(sender, instance, raw=False, **kwargs):
+    """pre_save: note which facets the stored row was counted under."""
+    instance._facet_keys_before = set()
+    if raw or instance.pk is None:
+        return
+    stored = Product.objects.live().filter(pk=instance.pk).first()
+    if stored is not None:
+        instance._facet_keys_before = facet_keys(stored)
+
+
+def update_facets(sender, instance, raw=False, **kwargs):
+    """post_save: move the product to its new facets."""
+    if raw:
+        return
+    apply_delta(
+        getattr(instance, '_facet_keys_before', set()), facet_keys(instance) if _is_live(instance) else set()
+    )
+
+
+def remember_deleted_facets(sender, instance, **kwargs):
+    """pre_delete: note the facets while stock shards still exist, even in a cascade."""
+    # A purged category's products were uncounted when it was marked
+    instance._facet_keys_before = facet_keys(instance) if _is_live(instance) else set()
+
+
+def remove_facets(sender, instance, **kwargs):
+    """post_delete: stop counting the product."""
+    apply_delta(getattr(instance, '_facet_keys_before', set()), set())
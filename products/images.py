@@ -0,0 +1,110 @@
+"""
+Responsive image variants for product and category images.
+
+Each uploaded image is resized into width buckets and encoded as WebP and
+JPEG. Variant files are named after a hash of their content, so they
+never change once written and can be served with far-future cache headers.
+JPEG has no alpha channel, so transparent images are laid on white first.
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Width in pixels of each variant; images are never upscaled
+VARIANT_WIDTHS = {
+    'thumb': 150,
+    'card': 400,
+    'detail': 1024,
+}
+
+# Pillow format name, file extension and encoder options per output format
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def build_variants(field_file, directory):
+    """
+    Render every variant of `field_file` into `directory`.
+
+    Returns the map stored on the model:
+    `{'source': name, 'variants': {variant: {'width': w, 'height': h, fmt: name}}}`.
+    """
+    with field_file.open('rb') as f:
+        original = Image.open(f)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    variants = {}
+    for variant, width in VARIANT_WIDTHS.items():
+        image = original.copy()
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        entry = {'width': image.width, 'height': image.height}
+        for fmt, (pil_format, extension, params) in VARIANT_FORMATS.items():
+            entry[fmt] = _store(_encode(image, pil_format, params), directory, variant, extension)
+        variants[variant] = entry
+    return {'source': field_file.name, 'variants': variants}
+
+
+def _encode(image, pil_format, params):
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = _on_white(image)
+    elif image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **params)
+    return buffer.getvalue()
+
+
+def _on_white(image):
+    """`image` as RGB, with any transparent areas white rather than black."""
+    if image.mode not in ('RGBA', 'LA', 'PA') and 'transparency' not in image.info:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _store(data, directory, variant, extension):
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f"{directory}/{digest}-{variant}.{extension}"
+    # Same content, same name: an existing file is already correct
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def files(variants):
+    """The names of the files of a stored variant map."""
+    return {
+        entry[fmt]
+        for entry in (variants or {}).get('variants', {}).values()
+        for fmt in VARIANT_FORMATS
+        if fmt in entry
+    }
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def srcset(variants, build_url=None):
+    """`{format: 'url 150w, url 400w, ...'}` for a stored variant map."""
+    build_url = build_url or default_storage.url
+    entries = (variants or {}).get('variants', {})
+    return {
+        fmt: ', '.join(
+            f"{build_url(entry[fmt])} {entry['width']}w"
+            for entry in sorted(entries.values(), key=lambda entry: entry['width'])
+            if fmt in entry
+        )
+        for fmt in VARIANT_FORMATS
+    } if entries else {}
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from products.images import VARIANT_FORMATS
+from products.models import ProductImage, Product
+
+
+class Command(BaseCommand):
+    """
+    Compare image bytes per catalog page for originals and variants.
+
+    A catalog page shows PAGE_SIZE products with their primary image; this
+    sums what a client downloads for those images when it uses the original
+    upload versus each format of the chosen variant.
+    """
+
+    help = 'Report image bytes transferred per catalog page, originals vs responsive variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--variant', default='card', help='Variant a list page would use')
+
+    def handle(self, *args, **options):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        product_ids = list(Product.objects.values_list('pk', flat=True)[:page_size * options['pages']])
+        images = {}
+        for image in ProductImage.objects.filter(product_id__in=product_ids).order_by('-is_primary', 'pk'):
+            images.setdefault(image.product_id, image)
+
+        formats = list(VARIANT_FORMATS)
+        for page in range(options['pages']):
+            ids = product_ids[page * page_size:(page + 1) * page_size]
+            if not ids:
+                break
+            totals = {'original': 0, **{fmt: 0 for fmt in formats}}
+            missing = 0
+            for product_id in ids:
+                image = images.get(product_id)
+                if image is None:
+                    continue
+                totals['original'] += self._size(image.image.name)
+                entry = image.variants.get('variants', {}).get(options['variant'])
+                if entry is None:
+                    missing += 1
+                    continue
+                for fmt in formats:
+                    totals[fmt] += self._size(entry[fmt])
+            line = ', '.join(f"{name} {size / 1024:.1f} KiB" for name, size in totals.items())
+            note = f" ({missing} images without variants)" if missing else ''
+            self.stdout.write(f"page {page + 1}: {line}{note}")
+
+    def _size(self, name):
+        try:
+            return default_storage.size(name)
+        except OSError:
+            return 0
@@ -0,0 +1,58 @@
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+
+from products import recommendations
+
+
+class Command(BaseCommand):
+    """
+    Time the co-occurrence count on synthetic order history.
+
+    Baskets draw products from a skewed popularity curve, like a real
+    catalog. Only the counting is timed; no rows are read or written, so
+    the result is the build cost per million order lines independent of
+    the database.
+    """
+
+    help = 'Benchmark the "frequently bought together" build per million order lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1_000_000, help='Order lines to generate')
+        parser.add_argument('--products', type=int, default=50_000, help='Catalog size')
+        parser.add_argument('--basket-size', type=int, default=3, help='Average distinct products per order')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        lines = self._generate(options)
+        self.stdout.write(
+            f"{len(lines)} lines, {lines[-1][0]} orders, {options['products']} products"
+        )
+        engines = ['python'] + (['numpy'] if recommendations.np is not None else [])
+        for engine in engines:
+            started = time.perf_counter()
+            neighbours = recommendations.compute_neighbours(lines, use_numpy=engine == 'numpy')
+            elapsed = time.perf_counter() - started
+            per_million = elapsed * 1_000_000 / len(lines)
+            self.stdout.write(
+                f"{engine:>7}: {elapsed:.2f}s ({per_million:.2f}s per million lines), "
+                f"{sum(len(related) for related in neighbours.values())} neighbours"
+            )
+        if recommendations.np is None:
+            self.stdout.write('NumPy is not installed; only the pure Python builder was timed.')
+
+    def _generate(self, options):
+        rng = random.Random(options['seed'])
+        # Zipf-like popularity: a few products appear in most baskets
+        cum_weights = list(accumulate(1 / (rank + 1) for rank in range(options['products'])))
+        catalog = list(range(1, options['products'] + 1))
+        lines = []
+        order_id = 0
+        while len(lines) < options['lines']:
+            order_id += 1
+            size = max(1, int(rng.expovariate(1 / options['basket_size'])) + 1)
+            for product_id in rng.choices(catalog, cum_weights=cum_weights, k=size):
+                lines.append((order_id, product_id))
+        return lines[:options['lines']]
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    """
+    Compare stock decrement throughput for single-row and sharded stock.
+
+    Each mode creates a throwaway product, hammers it with decrements from
+    concurrent threads and removes it again. Point `--database` at a
+    PostgreSQL alias to measure row-lock contention; sqlite serializes all
+    writers, so there it mostly measures the per-decrement overhead.
+    """
+
+    help = 'Benchmark concurrent stock decrements for single-row and sharded products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to benchmark against')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--decrements', type=int, default=200, help='Decrements per thread')
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        if options['shards'] < 1:
+            raise CommandError('--shards must be at least 1')
+        alias = options['database']
+        category = Category.objects.using(alias).create(name='Stock benchmark', slug='stock-benchmark')
+        try:
+            for sharded in (False, True):
+                elapsed, succeeded = self._run(alias, category, sharded, options)
+                self.stdout.write(
+                    f"{'sharded' if sharded else 'single-row':>10}: "
+                    f"{succeeded} decrements in {elapsed:.2f}s "
+                    f"({succeeded / elapsed:.0f}/s, {options['threads']} threads, {alias})"
+                )
+        finally:
+            category.delete()
+
+    def _run(self, alias, category, sharded, options):
+        threads = options['threads']
+        per_thread = options['decrements']
+        product = Product.objects.using(alias).create(
+            category=category,
+            name=f"Stock benchmark {'sharded' if sharded else 'single-row'}",
+            description='Benchmark product',
+            price=1,
+            stock=threads * per_thread,
+        )
+        if sharded:
+            product.enable_stock_sharding(shards=options['shards'])
+
+        results = [0] * threads
+        errors = []
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(slot):
+            local = Product.objects.using(alias).get(pk=product.pk)
+            barrier.wait()
+            try:
+                for _ in range(per_thread):
+                    if local.decrement_stock(1):
+                        results[slot] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        remaining = product.available_stock
+        product.delete()
+        for error in errors[:3]:
+            self.stderr.write(f"worker error: {error}")
+        if remaining != threads * per_thread - sum(results):
+            self.stderr.write(f"stock mismatch: {remaining} left after {sum(results)} decrements")
+        return elapsed, sum(results)
@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from jobs.queue import enqueue
+from products.tasks import IMAGE_FIELDS, build_image_variants
+
+
+class Command(BaseCommand):
+    help = 'Queue (or build) responsive variants for images that do not have up-to-date ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true', help='Build in this process instead of queueing jobs')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that look current')
+
+    def handle(self, *args, **options):
+        count = 0
+        for label, (image_field, variants_field, _) in IMAGE_FIELDS.items():
+            Model = apps.get_model(label)
+            rows = (
+                Model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+                .values_list('pk', image_field, variants_field)
+                .iterator()
+            )
+            for pk, image, variants in rows:
+                if not options['force'] and (variants or {}).get('source') == image:
+                    continue
+                payload = {'model': label, 'pk': pk, 'force': options['force']}
+                if options['sync']:
+                    build_image_variants(**payload)
+                else:
+                    enqueue('products.build_image_variants', payload)
+                count += 1
+        action = 'Built' if options['sync'] else 'Queued'
+        self.stdout.write(f"{action} variants for {count} images")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products import facets
+
+
+class Command(BaseCommand):
+    """
+    Recompute the precomputed catalog facet counts.
+
+    Product saves and deletes keep the counts current incrementally; run this
+    periodically to fold in stock-only updates (decrements, shard changes)
+    that bypass the model signals.
+    """
+
+    help = 'Rebuild the FacetCount table from the product catalog'
+
+    def handle(self, *args, **options):
+        counts = facets.rebuild()
+        self.stdout.write(f"Rebuilt {len(counts)} facet counts over {counts.get(('all', 'all'), 0)} products")
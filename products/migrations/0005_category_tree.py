@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:30
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+import django.db.models.deletion
+
+
+def fill_paths(apps, schema_editor):
+    # Existing categories are all roots
+    Category = apps.get_model('products', 'Category')
+    Category.objects.update(path=Concat(Cast('pk', CharField()), Value('/')), depth=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_facet_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:31
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest, Round
+
+
+def fill_prices(apps, schema_editor):
+    # The stored prices as Product.refresh_prices() computes them, in one UPDATE
+    Product = apps.get_model('products', 'Product')
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    discounted = Q(discount_price__gt=0)
+    Product.objects.update(
+        effective_price=Case(When(discounted, then=F('discount_price')), default=F('price'), output_field=money),
+        discount_percent=Case(
+            When(discounted & Q(price__gt=0), then=Greatest(
+                Round((F('price') - F('discount_price')) / (F('price') * Value(Decimal('0.01')))), Value(0)
+            )),
+            default=Value(0),
+            output_field=models.PositiveSmallIntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
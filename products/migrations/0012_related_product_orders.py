@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_name_pattern_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductOrder',
+            fields=[
+                ('order_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('recorded_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -1,20 +1,61 @@
-from django.db import models
+import random
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Concat, Greatest, Round, Substr
+from django.db.models.lookups import GreaterThan
+from django.dispatch import Signal
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from users.models import User
+from events.models import OutboxMixin
+from jobs.models import Job
+from jobs.queue import enqueue
+
+# Number of sub-rows a product's stock is spread over when sharding is enabled
+STOCK_SHARD_COUNT = 8
+
+# Sent with `queryset`, the products concerned, when product rows or their
+# images change without a save(): set-based updates, stock decrements and
+# rendered image variants. Update-based changes send it inside the
+# transaction of the update, before it runs.
+products_changed = Signal()
+
+
+class CategoryQuerySet(models.QuerySet):
+    """Leaves out categories that are being deleted."""
+    
+    def live(self):
+        """Categories not marked for deletion, see api.deletion."""
+        return self.filter(deleted_at__isnull=True)
 
 
 class Category(models.Model):
-    """Category model for products."""
+    """
+    Category model for products.
+    
+    Categories nest through `parent`. `path` is the materialized chain of ids
+    from the root, e.g. "3/17/42/", so a whole subtree is one indexed prefix
+    match on `path`.
+    """
     
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
+    # Set when the category was deleted and its subtree is being removed in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CategoryQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ('name',)
@@ -25,10 +66,109 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        if self.parent_id and self.pk and self.is_ancestor_of(self.parent):
+            raise ValueError('A category cannot be moved under itself or one of its descendants')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path()
+        _queue_image_variants(self, self.image, self.image_variants)
+    
+    def is_ancestor_of(self, category):
+        """True if `category` is this category or lies in its subtree."""
+        return bool(self.path) and category.path.startswith(self.path)
+    
+    def _update_path(self):
+        """Recompute the path and rewrite the paths of the subtree in one UPDATE when moved."""
+        old_path, old_depth = self.path, self.depth
+        parent = Category.objects.only('path', 'depth').get(pk=self.parent_id) if self.parent_id else None
+        self.path = f"{parent.path if parent else ''}{self.pk}/"
+        self.depth = parent.depth + 1 if parent else 0
+        if self.path == old_path:
+            return
+        Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+
 
+def price_expressions(price=F('price'), discount_price=F('discount_price')):
+    """
+    SQL expressions for `effective_price` and `discount_percent`.
+    
+    Pass the new values when they are being assigned in the same UPDATE, since
+    F() on the right-hand side of an UPDATE still reads the old column value.
+    """
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    if not hasattr(price, 'resolve_expression'):
+        price = Value(price, output_field=money)
+    if not hasattr(discount_price, 'resolve_expression'):
+        discount_price = Value(discount_price, output_field=money)
+    # NULL > 0 is not true, so a missing discount falls through to the default
+    discounted = GreaterThan(discount_price, 0)
+    return {
+        'effective_price': Case(
+            When(discounted, then=discount_price),
+            default=price,
+            output_field=money,
+        ),
+        'discount_percent': Case(
+            # Divided by a hundredth of the price: SQLite would truncate the
+            # integer division of whole prices
+            When(discounted & GreaterThan(price, 0), then=Greatest(
+                Round((price - discount_price) / (price * Value(Decimal('0.01')))), Value(0)
+            )),
+            default=Value(0),
+            output_field=models.PositiveSmallIntegerField(),
+        ),
+    }
 
-class Product(models.Model):
+
+class ProductQuerySet(models.QuerySet):
+    """Keeps the stored price columns in step with set-based price changes."""
+    
+    def update(self, **kwargs):
+        if 'price' in kwargs or 'discount_price' in kwargs:
+            kwargs.update(price_expressions(
+                kwargs.get('price', F('price')), kwargs.get('discount_price', F('discount_price'))
+            ))
+        with transaction.atomic(using=self.db):
+            products_changed.send(sender=Product, queryset=self)
+            return super().update(**kwargs)
+    
+    update.alters_data = True
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'price' in fields or 'discount_price' in fields:
+            for obj in objs:
+                obj.refresh_price_fields()
+            fields = [*fields, 'effective_price', 'discount_percent']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+    
+    bulk_update.alters_data = True
+    
+    def refresh_prices(self):
+        """Recompute `effective_price` and `discount_percent` for every row in one UPDATE."""
+        with transaction.atomic(using=self.db):
+            products_changed.send(sender=Product, queryset=self)
+            return super().update(**price_expressions())
+    
+    refresh_prices.alters_data = True
+    
+    def live(self):
+        """Products whose category is not marked for deletion."""
+        return self.filter(category__deleted_at__isnull=True)
+    
+    def with_shard_stock(self):
+        """Annotate `shard_stock_total`, the stock of sharded products, read by `available_stock`."""
+        return self.annotate(shard_stock_total=Subquery(
+            StockShard.objects.filter(product=OuterRef('pk'))
+            .values('product').annotate(total=Sum('quantity')).values('total')
+        ))
+
+
+class Product(OutboxMixin, models.Model):
     """Product model."""
     
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
@@ -37,14 +177,26 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Price after discounts and running promotions, stored so the database can filter and sort on it
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, db_index=True)
+    discount_percent = models.PositiveSmallIntegerField(default=0, editable=False, db_index=True)
     stock = models.PositiveIntegerField(default=1)
+    # When set, `stock` is only a snapshot and the live count lives in StockShard rows
+    stock_sharded = models.BooleanField(default=False)
     is_available = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['created_at'], name='product_created_idx'),
+            # Pattern ops so PostgreSQL serves name__startswith (LIKE 'x%') from it under any collation
+            models.Index(fields=['name'], name='product_name_idx', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return self.name
@@ -52,20 +204,206 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.refresh_price_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'discount_price'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'effective_price', 'discount_percent'}
         super().save(*args, **kwargs)
     
+    def refresh_price_fields(self):
+        """Recompute the stored `effective_price` and `discount_percent` from the prices."""
+        # Assigned prices may still be strings or floats until the row is reloaded
+        price = Decimal(str(self.price))
+        discount_price = Decimal(str(self.discount_price)) if self.discount_price is not None else None
+        if discount_price:
+            self.effective_price = discount_price
+            # Half-up like SQL ROUND, so save() and refresh_prices() agree
+            percent = ((price - discount_price) / price * 100).quantize(Decimal('1'), ROUND_HALF_UP) if price else 0
+            self.discount_percent = max(0, int(percent))
+        else:
+            self.effective_price = price
+            self.discount_percent = 0
+    
     @property
     def get_discount_percent(self):
-        if self.discount_price:
-            discount_percent = ((self.price - self.discount_price) / self.price) * 100
-            return round(discount_percent)
-        return 0
+        return self.discount_percent
     
     @property
     def current_price(self):
-        if self.discount_price:
-            return self.discount_price
-        return self.price
+        # Stored so running promotions (see the promotions app) are included
+        return self.effective_price
+    
+    @property
+    def available_stock(self):
+        """Stock on hand, summed over the shards when sharding is enabled."""
+        if not self.stock_sharded:
+            return self.stock
+        total = getattr(self, 'shard_stock_total', None)
+        if total is None:
+            total = self.stock_shards.aggregate(total=Sum('quantity'))['total']
+        return total or 0
+    
+    def enable_stock_sharding(self, shards=STOCK_SHARD_COUNT):
+        """Split the current stock across `shards` sub-rows."""
+        if shards < 1:
+            raise ValueError("Stock must be split across at least one shard")
+        db = self._state.db
+        with transaction.atomic(using=db):
+            product = Product.objects.using(db).select_for_update().get(pk=self.pk)
+            if product.stock_sharded:
+                return
+            self.stock_shards.all().delete()
+            StockShard.objects.using(db).bulk_create(
+                StockShard(product=product, index=index, quantity=quantity)
+                for index, quantity in enumerate(_split_quantity(product.stock, shards))
+            )
+            Product.objects.using(db).filter(pk=self.pk).update(stock_sharded=True)
+        self.stock_sharded = True
+    
+    def disable_stock_sharding(self):
+        """Fold the shards back into the single `stock` column."""
+        db = self._state.db
+        with transaction.atomic(using=db):
+            product = Product.objects.using(db).select_for_update().get(pk=self.pk)
+            if not product.stock_sharded:
+                return
+            total = product.available_stock
+            self.stock_shards.all().delete()
+            Product.objects.using(db).filter(pk=self.pk).update(stock=total, stock_sharded=False)
+        self.stock = total
+        self.stock_sharded = False
+    
+    def set_stock(self, quantity):
+        """Overwrite the stock level, redistributing it over the shards if needed."""
+        db = self._state.db
+        with transaction.atomic(using=db):
+            if self.stock_sharded:
+                shards = list(self.stock_shards.select_for_update().order_by('index'))
+                for shard, shard_quantity in zip(shards, _split_quantity(quantity, len(shards))):
+                    shard.quantity = shard_quantity
+                StockShard.objects.using(db).bulk_update(shards, ['quantity'])
+            Product.objects.using(db).filter(pk=self.pk).update(stock=quantity)
+        self.stock = quantity
+        # Drop the sum annotated by the queryset, it no longer matches the shards
+        self.__dict__.pop('shard_stock_total', None)
+    
+    def decrement_stock(self, quantity=1):
+        """
+        Atomically take `quantity` units of stock.
+        
+        Returns False without changing anything when there is not enough stock.
+        Unsharded products decrement the `stock` column with a conditional
+        UPDATE; sharded products decrement a random shard that can cover the
+        whole quantity, so concurrent checkouts rarely touch the same row.
+        """
+        db = self._state.db
+        if not self.stock_sharded:
+            return bool(
+                Product.objects.using(db).filter(pk=self.pk, stock__gte=quantity)
+                .update(stock=F('stock') - quantity)
+            )
+        
+        candidates = list(
+            self.stock_shards.filter(quantity__gte=quantity).values_list('pk', flat=True)
+        )
+        random.shuffle(candidates)
+        shards = StockShard.objects.using(db)
+        for shard_id in candidates:
+            if shards.filter(pk=shard_id, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+                products_changed.send(sender=Product, queryset=Product.objects.using(db).filter(pk=self.pk))
+                return True
+        if not self._drain_stock_shards(quantity):
+            return False
+        products_changed.send(sender=Product, queryset=Product.objects.using(db).filter(pk=self.pk))
+        return True
+    
+    def _drain_stock_shards(self, quantity):
+        """Take `quantity` across several shards when no single shard has enough."""
+        db = self._state.db
+        with transaction.atomic(using=db):
+            shards = list(self.stock_shards.select_for_update().filter(quantity__gt=0).order_by('index'))
+            if sum(shard.quantity for shard in shards) < quantity:
+                return False
+            remaining = quantity
+            for shard in shards:
+                taken = min(shard.quantity, remaining)
+                shard.quantity -= taken
+                remaining -= taken
+                if not remaining:
+                    break
+            StockShard.objects.using(db).bulk_update(shards, ['quantity'])
+        return True
+
+
+class StockShard(models.Model):
+    """One of the sub-rows holding the stock of a sharded product."""
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('product', 'index')
+    
+    def __str__(self):
+        return f"{self.product.name} - shard {self.index} ({self.quantity})"
+
+
+class FacetCount(models.Model):
+    """Precomputed number of products under one facet value of the whole catalog."""
+    
+    facet = models.CharField(max_length=30)
+    value = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('facet', 'value')
+    
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+class RelatedProduct(models.Model):
+    """
+    One of the top neighbours of a product in the "frequently bought together" list.
+    
+    `score` is the number of paid orders containing both products. Built by
+    `manage.py build_related_products`, see products.recommendations.
+    """
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(default=0)
+    rank = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [models.Index(fields=['product', 'rank'], name='related_product_rank_idx')]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
+class RelatedProductOrder(models.Model):
+    """
+    A paid order counted into RelatedProduct between full builds.
+    
+    `record_order` counts each order once, so a retried job does not count
+    its basket again.
+    """
+    
+    # Orders live on their user's shard, so this is not a foreign key
+    order_id = models.BigIntegerField(primary_key=True)
+    recorded_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"Order {self.order_id}"
+
+
+def _split_quantity(quantity, shards):
+    """Split `quantity` into `shards` near-equal parts."""
+    base, extra = divmod(quantity, shards)
+    return [base + (1 if index < extra else 0) for index in range(shards)]
 
 
 class ProductImage(models.Model):
@@ -73,6 +411,8 @@ class ProductImage(models.Model):
     
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
+    # Resized copies built by the products.build_image_variants job, see products/images.py
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -81,6 +421,37 @@ class ProductImage(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - {'Primary' if self.is_primary else 'Secondary'}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _queue_image_variants(self, self.image, self.variants)
+
+
+def _queue_image_variants(instance, image, variants):
+    """Queue variant generation when the variants were not built from the current image."""
+    if image and variants.get('source') != image.name:
+        transaction.on_commit(lambda: _enqueue_image_variants(instance._meta.label, instance.pk))
+
+
+def _enqueue_image_variants(label, pk):
+    # A queued job renders whatever the image is when it runs, so saves
+    # before it starts do not need another one
+    queued = Job.objects.filter(
+        name='products.build_image_variants', status='queued', payload__model=label, payload__pk=pk
+    )
+    if not queued.exists():
+        enqueue('products.build_image_variants', {'model': label, 'pk': pk})
+
+
+class ReviewQuerySet(models.QuerySet):
+    """Reviews as the API lists them."""
+    
+    def for_listing(self):
+        """The columns ReviewSerializer reads, with the author joined in; deleted authors are left out."""
+        return self.filter(user__deleted_at__isnull=True).select_related('user').only(
+            'id', 'product_id', 'user_id', 'rating', 'comment', 'created_at',
+            'user__email', 'user__first_name', 'user__last_name',
+        )
 
 
 class Review(models.Model):
@@ -93,9 +464,16 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ReviewQuerySet.as_manager()
+    
     class Meta:
         ordering = ('-created_at',)
         unique_together = ('product', 'user')
+        # A product's reviews newest first, optionally for one rating
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='review_product_created_idx'),
+            models.Index(fields=['product', 'rating', 'created_at'], name='review_product_rating_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.product.name} - {self.rating}" 
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""
+"Frequently bought together" recommendations.
+
+The full build streams the lines of paid orders grouped by order, counts
+how often each pair of products shares an order and keeps the TOP_K
+strongest neighbours per product in RelatedProduct. Counting is
+vectorized with NumPy when it is installed and falls back to plain Python
+otherwise. Between builds, `record_order` adds newly paid orders to the
+stored neighbours, once per order.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain, groupby, islice, permutations
+from operator import itemgetter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RelatedProduct, RelatedProductOrder
+
+try:
+    import numpy as np
+except ImportError:  # optional, the pure Python builder is used instead
+    np = None
+
+# Neighbours kept per product
+TOP_K = 10
+
+# Order lines counted per vectorized chunk
+CHUNK_LINES = 200_000
+
+# Rows per INSERT when writing RelatedProduct
+BATCH_SIZE = 2000
+
+# How long a full build keeps the orders record_order counted, so a late
+# retry of one is still recognised
+RECORDED_ORDER_RETENTION = timedelta(days=7)
+
+
+def paid_order_lines():
+    """`(order_id, product_id)` for every line of a paid order, grouped by order."""
+    from orders.models import OrderItem
+
+    # An order's lines are all on its shard, so the shards are read one after the other
+    return chain.from_iterable(
+        lines.order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=CHUNK_LINES // 10)
+        for lines in OrderItem.objects.filter(order__payment_status='paid', product__isnull=False).scatter()
+    )
+
+
+def build(lines=None, top_k=TOP_K, use_numpy=None, progress=None):
+    """
+    Rebuild RelatedProduct from `lines` (all paid orders by default); returns rows written.
+
+    `progress({'lines': ...})` is called every CHUNK_LINES lines read.
+    """
+    started = timezone.now()
+    lines = paid_order_lines() if lines is None else lines
+    if progress:
+        lines = _reporting(lines, progress)
+    neighbours = compute_neighbours(lines, top_k, use_numpy)
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=related_id, score=score, rank=rank)
+        for product_id, related in neighbours.items()
+        for rank, (related_id, score) in enumerate(related)
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        RelatedProductOrder.objects.filter(recorded_at__lt=started - RECORDED_ORDER_RETENTION).delete()
+    return len(rows)
+
+
+def _reporting(lines, progress):
+    """`lines`, calling `progress` every CHUNK_LINES of them."""
+    count = 0
+    for line in lines:
+        yield line
+        count += 1
+        if not count % CHUNK_LINES:
+            progress({'lines': count})
+
+
+def compute_neighbours(lines, top_k=TOP_K, use_numpy=None):
+    """
+    `{product_id: [(related_id, score), ...]}` from `(order_id, product_id)` lines.
+
+    Lines must be grouped by order. Neighbours are sorted by score, ties by
+    the lower product id.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return _neighbours_numpy(lines, top_k)
+    return _neighbours_python(lines, top_k)
+
+
+def _neighbours_python(lines, top_k):
+    counts = defaultdict(Counter)
+    for _, group in groupby(lines, key=itemgetter(0)):
+        basket = {product_id for _, product_id in group}
+        for product_id, related_id in permutations(basket, 2):
+            counts[product_id][related_id] += 1
+    return {
+        product_id: heapq.nlargest(top_k, related.items(), key=lambda item: (item[1], -item[0]))
+        for product_id, related in counts.items()
+    }
+
+
+def _neighbours_numpy(lines, top_k):
+    # A pair of product ids packs into one int64: (a << 32) | b
+    pair_codes = np.empty(0, dtype=np.int64)
+    pair_counts = np.empty(0, dtype=np.int64)
+    for orders, items in _chunks(lines):
+        codes, counts = np.unique(_basket_pairs(orders, items), return_counts=True)
+        codes = np.concatenate([pair_codes, codes])
+        counts = np.concatenate([pair_counts, counts])
+        pair_codes, inverse = np.unique(codes, return_inverse=True)
+        pair_counts = np.bincount(inverse, weights=counts).astype(np.int64)
+    if not len(pair_codes):
+        return {}
+
+    left, right = pair_codes >> 32, pair_codes & 0xFFFFFFFF
+    order = np.lexsort((right, -pair_counts, left))
+    left, right, counts = left[order], right[order], pair_counts[order]
+    starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+    rank = np.arange(len(left)) - np.repeat(starts, np.diff(np.r_[starts, len(left)]))
+    keep = rank < top_k
+
+    neighbours = defaultdict(list)
+    for product_id, related_id, score in zip(left[keep].tolist(), right[keep].tolist(), counts[keep].tolist()):
+        neighbours[product_id].append((related_id, score))
+    return dict(neighbours)
+
+
+def _chunks(lines):
+    """Yield `(orders, items)` arrays of about CHUNK_LINES lines, never splitting an order."""
+    lines = iter(lines)
+    carry = np.empty((0, 2), dtype=np.int64)
+    while True:
+        batch = np.array(list(islice(lines, CHUNK_LINES)), dtype=np.int64).reshape(-1, 2)
+        batch = np.concatenate([carry, batch])
+        if not len(batch):
+            return
+        if len(batch) == len(carry):
+            yield batch[:, 0], batch[:, 1]
+            return
+        # The last order may continue in the next batch, so hold it back
+        other = batch[:, 0] != batch[-1, 0]
+        tail = len(batch) - int(np.argmax(other[::-1])) if other.any() else 0
+        carry = batch[tail:]
+        if tail:
+            yield batch[:tail, 0], batch[:tail, 1]
+
+
+def _basket_pairs(orders, items):
+    """Packed codes of every ordered pair of distinct products sharing an order."""
+    lines = np.unique(np.stack([orders, items], axis=1), axis=0)
+    orders, items = lines[:, 0], lines[:, 1]
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(items)])
+    # Pair each line with every line of its basket, then drop the line itself
+    line_sizes = np.repeat(sizes, sizes)
+    left = np.repeat(np.arange(len(items)), line_sizes)
+    offsets = np.arange(line_sizes.sum()) - np.repeat(np.cumsum(line_sizes) - line_sizes, line_sizes)
+    right = np.repeat(np.repeat(starts, sizes), line_sizes) + offsets
+    distinct = left != right
+    return (items[left[distinct]] << 32) | items[right[distinct]]
+
+
+def record_order(order_id, top_k=TOP_K):
+    """
+    Count a newly paid order into the stored neighbours.
+
+    Pairs already stored gain one; new pairs are added while a product has
+    fewer than `top_k` neighbours. Pairs that fell outside the top K are
+    not tracked, so the next full build corrects any drift. An order that
+    was already counted is skipped.
+    """
+    from orders.models import OrderItem
+
+    basket = set(
+        OrderItem.objects.for_id(order_id).filter(order_id=order_id, product__isnull=False)
+        .values_list('product_id', flat=True)
+    )
+    if len(basket) < 2:
+        return 0
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                RelatedProductOrder.objects.create(order_id=order_id)
+        except IntegrityError:
+            return 0
+        links = RelatedProduct.objects.select_for_update().filter(product_id__in=basket).order_by('product_id', 'rank')
+        stored = defaultdict(dict)
+        for link in links:
+            stored[link.product_id][link.related_id] = link
+        RelatedProduct.objects.filter(product_id__in=basket, related_id__in=basket).update(score=F('score') + 1)
+
+        new = []
+        for product_id in basket:
+            room = top_k - len(stored[product_id])
+            for related_id in sorted(basket - {product_id} - set(stored[product_id])):
+                if room <= 0:
+                    break
+                new.append(RelatedProduct(product_id=product_id, related_id=related_id, score=1))
+                room -= 1
+        RelatedProduct.objects.bulk_create(new, ignore_conflicts=True)
+        _rerank(basket)
+    return len(new)
+
+
+def _rerank(product_ids):
+    links = RelatedProduct.objects.filter(product_id__in=product_ids).order_by('product_id', '-score', 'related_id')
+    changed = []
+    for _, group in groupby(links, key=lambda link: link.product_id):
+        for rank, link in enumerate(group):
+            if link.rank != rank:
+                link.rank = rank
+                changed.append(link)
+    RelatedProduct.objects.bulk_update(changed, ['rank'], batch_size=BATCH_SIZE)
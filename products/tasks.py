@@ -0,0 +1,58 @@
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.db.models import Q, TextField
+from django.db.models.functions import Cast
+
+from jobs.queue import report_progress, task
+from . import images, recommendations
+from .models import Product, ProductImage, products_changed
+
+# Model label -> (image field, variants field, variant directory)
+IMAGE_FIELDS = {
+    'products.ProductImage': ('image', 'variants', 'products/variants'),
+    'products.Category': ('image', 'image_variants', 'categories/variants'),
+}
+
+
+@task('products.build_image_variants')
+def build_image_variants(model, pk, force=False):
+    """Render the responsive variants of an uploaded product or category image."""
+    image_field, variants_field, directory = IMAGE_FIELDS[model]
+    Model = apps.get_model(model)
+    instance = Model.objects.filter(pk=pk).first()
+    if instance is None:
+        return {'status': 'deleted'}
+    image = getattr(instance, image_field)
+    if not image or (not force and getattr(instance, variants_field).get('source') == image.name):
+        return {'status': 'unchanged'}
+    
+    superseded = getattr(instance, variants_field)
+    variants = images.build_variants(image, directory)
+    # Only store them if the image was not replaced while we were rendering
+    stored = Model.objects.filter(pk=pk, **{image_field: image.name}).update(**{variants_field: variants})
+    if not stored:
+        return {'status': 'superseded'}
+    images.delete_files(_unreferenced(Model, variants_field, images.files(superseded) - images.files(variants)))
+    if isinstance(instance, ProductImage):
+        products_changed.send(sender=Product, queryset=Product.objects.filter(pk=instance.product_id))
+    return {'status': 'built', 'variants': sorted(variants['variants'])}
+
+
+def _unreferenced(Model, variants_field, names):
+    """The variant files among `names` no row's variants refer to any more."""
+    if not names:
+        return set()
+    # Variant files are named by content, so identical uploads share them
+    text = Cast(variants_field, output_field=TextField())
+    rows = Model.objects.annotate(variants_text=text).filter(
+        reduce(or_, (Q(variants_text__contains=name) for name in names))
+    ).values_list('variants_text', flat=True)
+    return {name for name in names if not any(name in row for row in rows)}
+
+
+@task('products.build_related_products', max_attempts=1)
+def build_related_products():
+    """Rebuild the "frequently bought together" table from all paid orders."""
+    return {'rows': recommendations.build(progress=report_progress)}
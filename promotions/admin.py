@@ -0,0 +1,61 @@
+from django.contrib import admin, messages
+from django.db import transaction
+from ecommerce_api.admin import LargeTableAdmin
+from products.models import Product
+from .engine import refresh, run_scheduler, target_filter
+from .models import Promotion, PromotionPrice
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'product', 'category', 'kind', 'value', 'starts_at', 'ends_at', 'status', 'is_enabled')
+    list_filter = ('status', 'kind', 'is_enabled')
+    list_select_related = ('product', 'category')
+    search_fields = ('name__startswith', 'product__name__startswith', 'category__name__startswith')
+    raw_id_fields = ('product',)
+    autocomplete_fields = ('category',)
+    readonly_fields = ('status', 'created_at', 'updated_at')
+    actions = ['run_schedule']
+    
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            previous = Promotion.objects.filter(pk=obj.pk).select_related('category').first() if change else None
+            super().save_model(request, obj, form, change)
+            # Edits to a running promotion take effect immediately
+            if obj.status == 'active':
+                targets = target_filter(obj)
+                if previous is not None:
+                    targets |= target_filter(previous)
+                refresh(Product.objects.filter(targets))
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            active = list(queryset.filter(status='active').select_related('category'))
+            super().delete_queryset(request, queryset)
+            self._refresh_deleted(active)
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self._refresh_deleted([obj] if obj.status == 'active' else [])
+    
+    def _refresh_deleted(self, promotions):
+        for promotion in promotions:
+            refresh(Product.objects.filter(target_filter(promotion)))
+    
+    @admin.action(description='Start and end promotions that are due now')
+    def run_schedule(self, request, queryset):
+        result = run_scheduler()
+        self.message_user(
+            request,
+            f"{result['started']} started, {result['ended']} ended, {result['products']} products repriced.",
+            messages.SUCCESS,
+        )
+
+
+@admin.register(PromotionPrice)
+class PromotionPriceAdmin(LargeTableAdmin):
+    list_display = ('product', 'promotion', 'price', 'discount_percent')
+    list_select_related = ('product', 'promotion')
+    search_fields = ('product__name__startswith', 'promotion__name__startswith')
+    raw_id_fields = ('product', 'promotion')
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save
+
+
+class PromotionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'promotions'
+    
+    def ready(self):
+        from products.models import Product
+        from .engine import reapply_after_save
+        
+        post_save.connect(reapply_after_save, sender=Product, dispatch_uid='promotions-reapply')
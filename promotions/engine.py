@@ -0,0 +1,220 @@
+"""
+Promotion scheduler.
+
+At each window boundary the promotions that start or end are flipped in one
+UPDATE each, the best promotional price of every affected product is
+computed in SQL and written to PromotionPrice with one INSERT ... SELECT,
+and the stored prices on Product are rewritten with one set-based UPDATE.
+Activating a category-wide flash sale therefore costs a handful of
+statements however many products it covers. Every product whose price
+changes gets a `product.updated` outbox event and is moved to its new
+facet counts (see products.facets).
+
+`manage.py apply_promotions` runs the scheduler, once or in a loop.
+"""
+from decimal import Decimal
+
+from django.db import connections, models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, Round
+from django.db.models.lookups import GreaterThan, StartsWith
+from django.utils import timezone
+
+from events.outbox import record_many
+from products import facets
+from products.models import Product, price_expressions
+from .models import Promotion, PromotionPrice
+
+# Products per batch of outbox events
+BATCH_SIZE = 1000
+
+# Percentages are scaled by multiplying with this rather than dividing by
+# 100, which SQLite would do in integer arithmetic for whole prices
+CENT = Value(Decimal('0.01'))
+
+
+def target_filter(promotion):
+    """Q matching the products `promotion` applies to."""
+    if promotion.product_id:
+        return Q(pk=promotion.product_id)
+    return Q(category__path__startswith=promotion.category.path)
+
+
+def _targets(promotions):
+    q = Q(pk__in=[])
+    for promotion in promotions:
+        q |= target_filter(promotion)
+    return q
+
+
+def run_scheduler(now=None):
+    """
+    Start and end every promotion whose window boundary has passed.
+
+    Returns `{'started': n, 'ended': n, 'products': n}`.
+    """
+    now = now or timezone.now()
+    open_window = Q(ends_at__isnull=True) | Q(ends_at__gt=now)
+    with transaction.atomic():
+        starting = list(
+            Promotion.objects.select_for_update()
+            .filter(open_window, status='scheduled', is_enabled=True, starts_at__lte=now)
+        )
+        ending = list(
+            Promotion.objects.select_for_update()
+            .filter(Q(ends_at__lte=now) | Q(is_enabled=False), status='active')
+        )
+        # Windows that closed before the scheduler ever saw them are never applied
+        Promotion.objects.filter(status='scheduled', ends_at__lte=now).update(status='ended')
+        if not starting and not ending:
+            return {'started': 0, 'ended': 0, 'products': 0}
+
+        Promotion.objects.filter(pk__in=[p.pk for p in starting]).update(status='active', updated_at=now)
+        Promotion.objects.filter(pk__in=[p.pk for p in ending]).update(status='ended', updated_at=now)
+        products = refresh(Product.objects.filter(_targets(starting + ending)))
+        record_many(
+            [('promotion', p.pk, 'promotion.started', {'name': p.name}) for p in starting]
+            + [('promotion', p.pk, 'promotion.ended', {'name': p.name}) for p in ending]
+        )
+    return {'started': len(starting), 'ended': len(ending), 'products': products}
+
+
+def refresh(products):
+    """
+    Recompute the promotional prices of `products` from the active promotions.
+
+    Call this after changing list prices in bulk; single saves are handled by
+    the post_save receiver below. Returns the number of products repriced.
+    """
+    products = products.order_by()
+    with transaction.atomic(using=products.db):
+        PromotionPrice.objects.using(products.db).filter(product__in=products.values('pk')).delete()
+        _insert_best_prices(products)
+        return apply_prices(products)
+
+
+def apply_prices(products):
+    """
+    Fold the stored promotional prices into `effective_price` and `discount_percent`.
+
+    Products without a PromotionPrice go back to their own prices. One
+    UPDATE rewrites them all; returns the number of products updated.
+    """
+    prices = _prices()
+    changed = list(
+        products.annotate(new_effective_price=prices['effective_price'], new_discount_percent=prices['discount_percent'])
+        .exclude(effective_price=F('new_effective_price'), discount_percent=F('new_discount_percent'))
+        .values_list('pk', flat=True)
+    )
+    # The UPDATE bypasses the save receivers that keep the facet counts
+    with transaction.atomic(using=products.db), facets.recounted(changed, products.db, BATCH_SIZE):
+        updated = products.update(**prices)
+        _record_changed(products.model.objects.using(products.db), changed)
+    return updated
+
+
+def _prices():
+    promotion = PromotionPrice.objects.filter(product=OuterRef('pk'))
+    base = price_expressions()
+    # A manual discount below the promotional price still wins; LEAST and
+    # GREATEST are NULL on some databases when there is no promotion
+    return {
+        'effective_price': Coalesce(
+            Least(base['effective_price'], Subquery(promotion.values('price')[:1])), base['effective_price']
+        ),
+        'discount_percent': Coalesce(
+            Greatest(base['discount_percent'], Subquery(promotion.values('discount_percent')[:1])),
+            base['discount_percent'],
+        ),
+    }
+
+
+def _record_changed(products, pks):
+    for start in range(0, len(pks), BATCH_SIZE):
+        record_many([
+            ('product', product.pk, 'product.updated', product.outbox_payload())
+            for product in products.filter(pk__in=pks[start:start + BATCH_SIZE])
+        ])
+
+
+def reconcile():
+    """Reapply promotional prices that a plain price update has overwritten."""
+    return apply_prices(Product.objects.filter(effective_price__gt=Subquery(
+        PromotionPrice.objects.filter(product=OuterRef('pk')).values('price')[:1]
+    )))
+
+
+def _promotions_of_outer_product():
+    """
+    The active promotions of the outer query's product, with the
+    `promotional_price` each gives it: Promotion.apply_to in SQL.
+    """
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    list_price = OuterRef('price')
+    reduced = Case(
+        When(kind='percentage', then=list_price * (Value(100) - F('value')) * CENT),
+        default=list_price - F('value'),
+        output_field=money,
+    )
+    return (
+        Promotion.objects.filter(status='active')
+        .filter(Q(product=OuterRef('pk')) | Q(StartsWith(OuterRef('category__path'), F('category__path'))))
+        .annotate(promotional_price=Round(Greatest(reduced, Value(0, output_field=money)), 2, output_field=money))
+    )
+
+
+def _insert_best_prices(products):
+    """Write the PromotionPrice of every product in `products` on promotion, in one INSERT ... SELECT."""
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    promotions = _promotions_of_outer_product()
+    rows = (
+        products.annotate(best_price=Subquery(
+            promotions.order_by('promotional_price').values('promotional_price')[:1], output_field=money
+        ))
+        .filter(best_price__isnull=False)
+        # SQLite cannot order a subquery by an expression of the outer row, so
+        # the promotion is looked up by its price rather than sorted by it
+        .annotate(best_promotion=Subquery(
+            promotions.filter(promotional_price=OuterRef('best_price')).order_by('pk').values('pk')[:1]
+        ))
+        .annotate(best_percent=Case(
+            When(GreaterThan(F('price'), 0), then=Greatest(
+                Round((F('price') - F('best_price')) / (F('price') * CENT)), Value(0)
+            )),
+            default=Value(0),
+            output_field=models.PositiveSmallIntegerField(),
+        ))
+        .annotate(best_product=F('pk'))
+    )
+    # PromotionPrice field -> alias of the value selected for it
+    aliases = {
+        'product': 'best_product',
+        'promotion': 'best_promotion',
+        'price': 'best_price',
+        'discount_percent': 'best_percent',
+    }
+    sql, params = rows.values(*aliases.values()).query.sql_with_params()
+    connection = connections[products.db]
+    quote = connection.ops.quote_name
+    # The outer SELECT picks the values by alias, whatever order the query selects them in
+    columns = ', '.join(quote(PromotionPrice._meta.get_field(field).column) for field in aliases)
+    values = ', '.join(f'best.{quote(alias)}' for alias in aliases.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(PromotionPrice._meta.db_table)} ({columns}) SELECT {values} FROM ({sql}) best",
+            params,
+        )
+
+
+def reapply_after_save(sender, instance, raw=False, **kwargs):
+    """post_save receiver for Product: saving recomputes the prices without promotions."""
+    if raw:
+        return
+    ancestors = [int(pk) for pk in instance.category.path.split('/') if pk] or [instance.category_id]
+    promotions = Promotion.objects.filter(
+        Q(product=instance) | Q(category__in=ancestors), status='active'
+    )
+    if not promotions.exists() and not PromotionPrice.objects.filter(product=instance).exists():
+        return
+    refresh(Product.objects.filter(pk=instance.pk))
+    instance.refresh_from_db(fields=['effective_price', 'discount_percent'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from promotions.engine import reconcile, run_scheduler
+
+
+class Command(BaseCommand):
+    """Start and end promotions at their window boundaries."""
+    
+    help = 'Apply and revert scheduled promotions'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running instead of a single pass')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between passes with --loop')
+    
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            result = run_scheduler()
+            # Product saves outside the ORM save() path drop promotional prices; put them back
+            result['reconciled'] = reconcile()
+            elapsed = time.perf_counter() - started
+            if options['verbosity'] > 1 or result['started'] or result['ended'] or result['reconciled']:
+                self.stdout.write(
+                    f"{result['started']} started, {result['ended']} ended, "
+                    f"{result['products']} products repriced, {result['reconciled']} reconciled "
+                    f"in {elapsed:.2f}s"
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,84 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models
+from products.models import Category, Product
+
+
+class Promotion(models.Model):
+    """A time-windowed price reduction for a product or a whole category subtree."""
+    
+    KIND_CHOICES = (
+        ('percentage', 'Percentage'),
+        ('fixed', 'Fixed Amount'),
+    )
+    
+    STATUS_CHOICES = (
+        ('scheduled', 'Scheduled'),
+        ('active', 'Active'),
+        ('ended', 'Ended'),
+    )
+    
+    name = models.CharField(max_length=255)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, null=True, blank=True, related_name='promotions'
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name='promotions'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_enabled = models.BooleanField(default=True)
+    # Managed by the scheduler (manage.py apply_promotions)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled', editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ('-starts_at',)
+        indexes = [
+            models.Index(fields=['status', 'starts_at'], name='promotion_start_idx'),
+            models.Index(fields=['status', 'ends_at'], name='promotion_end_idx'),
+        ]
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        if bool(self.product_id) == bool(self.category_id):
+            raise ValidationError('A promotion applies to either a product or a category.')
+        if self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'The promotion must end after it starts.'})
+        if self.kind == 'percentage' and self.value > 100:
+            raise ValidationError({'value': 'A percentage cannot exceed 100.'})
+    
+    def apply_to(self, price):
+        """The promotional price for a product listed at `price`."""
+        if self.kind == 'percentage':
+            reduced = price * (100 - self.value) / 100
+        else:
+            reduced = price - self.value
+        return max(reduced, Decimal('0')).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+class PromotionPrice(models.Model):
+    """
+    Best promotional price currently in force for a product.
+    
+    Maintained by the promotion scheduler and folded into
+    Product.effective_price/discount_percent, which the serializers and
+    checkout read.
+    """
+    
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='promotion_price'
+    )
+    promotion = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name='prices')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_percent = models.PositiveSmallIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.price} ({self.promotion})"
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from products import facets
+from products.models import Category, Product
+from promotions.engine import run_scheduler
+from promotions.models import Promotion, PromotionPrice
+
+
+def nonzero(counts):
+    return {key: count for key, count in counts.items() if count}
+
+
+class PromotionFacetTests(TestCase):
+    """Repricing by the promotion engine keeps the stored facet counts in step."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            Product.objects.create(category=self.category, name=f'Book {n}', description='-', price=price, stock=1)
+            for n, price in enumerate(('30.00', '60.00', '120.00'))
+        ]
+        Promotion.objects.create(
+            name='Sale', category=self.category, kind='percentage', value='50',
+            starts_at=timezone.now() - timedelta(minutes=1),
+        )
+        facets.rebuild()
+
+    def assertFacetsInStep(self):
+        self.assertEqual(nonzero(facets.stored_facets()), nonzero(facets.compute_facets(Product.objects.live())))
+
+    def test_facets_after_promotion_starts(self):
+        run_scheduler()
+        self.assertEqual(facets.stored_facets()[('on_discount', 'true')], 3)
+        self.assertFacetsInStep()
+
+    def test_facets_after_saving_a_promoted_product(self):
+        run_scheduler()
+        product = Product.objects.get(pk=self.products[1].pk)
+        product.stock = 5
+        product.save()
+        self.assertEqual(product.effective_price, 30)
+        self.assertFacetsInStep()
+
+    def test_facets_after_promotion_ends(self):
+        run_scheduler()
+        Promotion.objects.update(ends_at=timezone.now())
+        run_scheduler()
+        self.assertEqual(facets.stored_facets()[('on_discount', 'true')], 0)
+        self.assertFacetsInStep()
+
+
+class PromotionPriceTests(TestCase):
+    """The scheduler stores the best price of every promoted product, with the rule that gives it."""
+
+    def test_each_price_comes_from_its_best_promotion(self):
+        parent = Category.objects.create(name='Media')
+        child = Category.objects.create(name='Books', parent=parent)
+        products = [
+            Product.objects.create(category=child, name=f'Book {n}', description='-', price=price, stock=1)
+            for n, price in enumerate(('3.00', '19.99', '40.00', '250.00'))
+        ]
+        started = timezone.now() - timedelta(minutes=1)
+        promotions = [
+            Promotion.objects.create(name='Parent', category=parent, kind='percentage', value='10', starts_at=started),
+            Promotion.objects.create(name='Child', category=child, kind='fixed', value='5', starts_at=started),
+            Promotion.objects.create(
+                name='One', product=products[2], kind='percentage', value='33', starts_at=started
+            ),
+        ]
+        run_scheduler()
+        products = Product.objects.filter(category=child)
+        promotions = Promotion.objects.all()
+
+        rows = {row.product_id: row for row in PromotionPrice.objects.all()}
+        self.assertEqual(set(rows), {product.pk for product in products})
+        for product in products:
+            row = rows[product.pk]
+            applicable = [p for p in promotions if p.product_id in (None, product.pk)]
+            best = min(applicable, key=lambda p: (p.apply_to(product.price), p.pk))
+            percent = round((product.price - row.price) / product.price * 100)
+            self.assertEqual(
+                (row.promotion_id, row.price, row.discount_percent),
+                (best.pk, best.apply_to(product.price), percent),
+                product.name,
+            )
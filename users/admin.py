@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
+from api import deletion
+from ecommerce_api.admin import (
+    BackgroundDeletionAdmin, EstimatedCountPaginator, LargeTableAdmin, register_user_owned, user_owned_inlines,
+)
 from .models import User, Address
 
 
@@ -9,9 +13,11 @@ class AddressInline(admin.TabularInline):
     extra = 0
 
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(BackgroundDeletionAdmin, BaseUserAdmin):
     """Define admin model for custom User model with no username field."""
     
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (_('Personal info'), {'fields': ('first_name', 'last_name', 'phone_number')}),
@@ -26,10 +32,24 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     list_display = ('email', 'first_name', 'last_name', 'is_staff')
-    search_fields = ('email', 'first_name', 'last_name')
+    search_fields = ('email__startswith',)
     ordering = ('email',)
-    inlines = [AddressInline]
+    inlines = user_owned_inlines(AddressInline)
+    deletion_steps = deletion.USER_STEPS
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(deleted_at__isnull=True)
+    
+    def mark_deleted(self, request, obj):
+        deletion.delete_user(obj, user=request.user)
+
+
+@register_user_owned(Address)
+class AddressAdmin(LargeTableAdmin):
+    list_display = ('user', 'address_type', 'city', 'country', 'is_default')
+    list_select_related = ('user',)
+    search_fields = ('user__email__exact',)
+    autocomplete_fields = ('user',)
 
 
-admin.site.register(User, UserAdmin)
-admin.site.register(Address) 
\ No newline at end of file
+admin.site.register(User, UserAdmin) 
\ No newline at end of file
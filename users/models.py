@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 
+from ecommerce_api.sharding import ShardedQuerySet
+
 
 class UserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
@@ -47,6 +49,8 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     date_joined = models.DateTimeField(_('date joined'), auto_now_add=True)
     is_active = models.BooleanField(_('active'), default=True)
+    # Set when the account was deleted and its data is being removed in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
@@ -69,7 +73,10 @@ class Address(models.Model):
         ('shipping', 'Shipping'),
     )
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='addresses')
+    # Stored on the user's shard, see ecommerce_api.sharding
+    shard_user = 'user'
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name='addresses')
     address_type = models.CharField(max_length=10, choices=ADDRESS_TYPES)
     street_address = models.CharField(max_length=255)
     apartment_address = models.CharField(max_length=255, blank=True, null=True)
@@ -79,6 +86,8 @@ class Address(models.Model):
     postal_code = models.CharField(max_length=20)
     is_default = models.BooleanField(default=False)
     
+    objects = ShardedQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = 'Addresses'
     